@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from corpus_generator import generate_corpus
+from fragments import FragmentIndex
+from io_handler import save_to_csv
+from mapper_reader import iter_mapper_statements
+from parser import parse_sql, parse_mybatis_xml, parse_normalized_sql
+
+
+def measure(func, repeat=3):
+    """
+    func を repeat 回実行して最短の実行時間(秒)を求め、
+    別途1回だけ tracemalloc を有効にして実行しピークメモリ(KB)を求める。
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1024
+
+
+def reference_workload(statements):
+    """
+    マシンの速度の基準にする、パーサーのコードに依存しない純Pythonの処理（文字の種類を数える）。
+    ベンチマークの時間はこの処理の時間との比で記録し、別のマシンで計測したベースラインとも比較できるようにする。
+    """
+    counts = {"alpha": 0, "digit": 0, "space": 0, "other": 0}
+    for sql in statements:
+        for char in sql:
+            if char.isalpha():
+                counts["alpha"] += 1
+            elif char.isdigit():
+                counts["digit"] += 1
+            elif char.isspace():
+                counts["space"] += 1
+            else:
+                counts["other"] += 1
+    return counts
+
+
+def load_workload(paths):
+    """
+    生成したコーパスから各ベンチマークの入力を作る。
+    expand_includes 用には、展開済みのカラムリストを <include refid="..." /> に戻した文の要素と、
+    入れ子の <sql> 定義だけを登録した FragmentIndex を使う。
+    """
+    fragment_index = FragmentIndex.from_files(paths)
+    statements = []
+    for path in paths:
+        for tag_name, _, variants in iter_mapper_statements(path, fragment_index):
+            if tag_name != "sql":
+                statements.append(variants[0])
+
+    include_index = FragmentIndex()
+    include_index.add("", "baseColumns", ET.fromstring('<sql id="baseColumns">t0.col_00, t0.col_01, t0.col_02</sql>'))
+    include_index.add("", "auditColumns", ET.fromstring(
+        '<sql id="auditColumns"><include refid="baseColumns" />, t0.col_03, t0.col_04</sql>'))
+    audit_columns = "t0.col_00, t0.col_01, t0.col_02, t0.col_03, t0.col_04"
+    include_statements = [
+        ET.fromstring("<sql>" + escape(sql).replace(audit_columns, '<include refid="auditColumns" />') + "</sql>")
+        for sql in statements
+    ]
+    return fragment_index, statements, include_statements, include_index
+
+
+def parse_statements(statements):
+    """
+    メモ化の影響を受けないよう、解析結果のメモを空にしてから全文を解析する。
+    """
+    parse_normalized_sql.cache_clear()
+    return [parse_sql(sql) for sql in statements]
+
+
+def parse_files(paths, fragment_index):
+    """
+    メモ化の影響を受けないよう、解析結果のメモを空にしてから全ファイルを解析する。
+    """
+    parse_normalized_sql.cache_clear()
+    return [parse_mybatis_xml(path, fragment_index) for path in paths]
+
+
+def run_benchmarks(paths, repeat=3):
+    """
+    parse_sql / expand_includes（FragmentIndex による <include> の展開）/ parse_mybatis_xml / save_to_csv のベンチマークを実行する。
+    戻り値は {ベンチマーク名: {"statements", "seconds", "statements_per_sec", "peak_kb", "relative"}}。
+    relative は同じ実行で計測した reference_workload の時間に対する比（マシンの速度に依存しない値）。
+    """
+    fragment_index, statements, include_statements, include_index = load_workload(paths)
+    reference_seconds, _ = measure(lambda: reference_workload(statements), repeat)
+    all_files_data = {os.path.basename(path): parse_mybatis_xml(path, fragment_index) for path in paths}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "bench.csv")
+        cases = {
+            "parse_sql": lambda: parse_statements(statements),
+            "expand_includes": lambda: [include_index.expand_element(element, "") for element in include_statements],
+            "parse_mybatis_xml": lambda: parse_files(paths, fragment_index),
+            "save_to_csv": lambda: save_to_csv(all_files_data, csv_path),
+        }
+
+        results = {}
+        for name, func in cases.items():
+            seconds, peak_kb = measure(func, repeat)
+            results[name] = {
+                "statements": len(statements),
+                "seconds": round(seconds, 6),
+                "statements_per_sec": round(len(statements) / seconds, 1) if seconds else 0.0,
+                "peak_kb": round(peak_kb, 1),
+                "relative": round(seconds / reference_seconds, 4) if reference_seconds else 0.0,
+            }
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    """
+    ベースラインと比較し、基準処理に対する時間の比 (relative) が tolerance を超えて悪化したベンチマーク名のリストを返す。
+    絶対時間はマシンによって変わるため比較に使わない。relative のないベンチマークは比較しない。
+    """
+    regressions = []
+    for name, result in results.items():
+        base_relative = baseline.get(name, {}).get("relative")
+        if not base_relative or not result["relative"]:
+            continue
+        ratio = base_relative / result["relative"]
+        status = "OK"
+        if ratio < 1 - tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        print(f"  {name}: {ratio:.2f}x (baseline {base_relative} x reference) {status}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<22}{'stmt/s':>12}{'seconds':>12}{'peak KB':>12}{'relative':>12}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['statements_per_sec']:>12}{result['seconds']:>12}{result['peak_kb']:>12}"
+              f"{result['relative']:>12}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="test01 パーサーのベンチマークを実行する。")
+    arg_parser.add_argument("--files", type=int, default=10, help="生成するマッパー数")
+    arg_parser.add_argument("--statements", type=int, default=20, help="1ファイルあたりの文の数")
+    arg_parser.add_argument("--join-depth", type=int, default=2, help="SELECT文で結合するテーブル数")
+    arg_parser.add_argument("--include-density", type=float, default=0.3, help="<include> を使うSELECT文の割合")
+    arg_parser.add_argument("--dynamic-density", type=float, default=0.3, help="動的タグを使う文の割合")
+    arg_parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    arg_parser.add_argument("--baseline", default="./sample/test01/test/benchmark_baseline.json", help="比較するベースラインJSON")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存する")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="許容する性能低下の割合")
+    arg_parser.add_argument("--check", action="store_true", help="性能低下があれば終了コード1で終了する")
+    args = arg_parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        paths = generate_corpus(
+            corpus_dir, args.files, args.statements, args.join_depth,
+            args.include_density, args.dynamic_density, args.seed,
+        )
+        results = run_benchmarks(paths, args.repeat)
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return 0
+
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"ベースラインとの比較: {args.baseline}")
+        if compare_with_baseline(results, baseline, args.tolerance) and args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class ParseCache:
+    """
+    parse_mybatis_xml() の結果をディスクに保存するキャッシュ。
+    キーはXMLファイル内容のハッシュとパーサーバージョンの組み合わせ。
+    合計サイズが max_bytes を超えた場合、最終アクセスが古いものから削除する(LRU)。
+    エントリは最終アクセス順に並べて合計サイズとともに保持し、追加・参照のたびに全体を集計・整列し直さない。
+    """
+
+    def __init__(self, cache_dir, parser_version, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.parser_version = parser_version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 既存エントリの {キー: サイズ}（最終アクセスが古い順）と合計サイズ
+        self._entries = OrderedDict()
+        self._total = 0
+        existing = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._total += size
+
+    def make_key(self, file_path, extra=""):
+        """
+        ファイル内容とパーサーバージョンからキャッシュキーを作成する。
+        extra には解析結果に影響する追加の情報（<sql> 定義索引のハッシュなど）を渡す。
+        """
+        digest = hashlib.sha256()
+        digest.update(self.parser_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(extra.encode("utf-8"))
+        digest.update(b"\0")
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def has(self, key):
+        """
+        キャッシュにエントリが存在するかを返す。存在しない場合はミスとして数える。
+        """
+        if key in self._entries:
+            return True
+        self.misses += 1
+        return False
+
+    def get(self, key):
+        """
+        キャッシュを参照する。存在しない場合は None を返す。
+        """
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # 壊れたエントリは削除してミス扱いにする
+            self._remove(key)
+            self.misses += 1
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """
+        解析結果を保存し、サイズ上限を超えていれば古いエントリを削除する。
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        self._total += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._evict()
+
+    def _remove(self, key):
+        self._total -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        # 最終アクセスが古い順に先頭から削除する
+        while self._total > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def summary(self):
+        """
+        ヒット数・ミス数・エントリ数を文字列で返す。
+        """
+        return f"cache hits: {self.hits}, misses: {self.misses}, entries: {len(self._entries)}"
@@ -0,0 +1,146 @@
+import os
+import random
+import argparse
+
+# 生成するテーブル・カラムの種類
+TABLE_COUNT = 50
+COLUMN_COUNT = 30
+
+
+def table_name(index):
+    return f"TABLE_{index:02d}"
+
+
+def column_name(index):
+    return f"col_{index:02d}"
+
+
+def generate_mapper(namespace, statements=20, join_depth=1, include_density=0.3, dynamic_density=0.3, seed=0):
+    """
+    ベンチマーク用のMyBatisマッパーXMLを文字列で生成する。
+    同じ引数からは常に同じ内容を生成する。
+
+    Args:
+        namespace (str): マッパーの namespace。
+        statements (int): 生成する <select>/<insert>/<update>/<delete> の数。
+        join_depth (int): SELECT文で結合するテーブル数（FROM句の先頭テーブルを除く）。
+        include_density (float): カラムリストを <include> で参照するSELECT文の割合。
+        dynamic_density (float): WHERE句を <if> などの動的タグで組み立てる文の割合。
+        seed (int): 乱数のシード。
+    """
+    rng = random.Random(f"{namespace}:{seed}")
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<mapper namespace="{namespace}">',
+        # 入れ子の include とプロパティを含む共通フラグメント
+        '    <sql id="baseColumns">${alias}.col_00, ${alias}.col_01, ${alias}.col_02</sql>',
+        '    <sql id="auditColumns"><include refid="baseColumns"><property name="alias" value="${alias}"/></include>, ${alias}.col_03, ${alias}.col_04</sql>',
+    ]
+
+    for i in range(statements):
+        kind = rng.choices(["select", "insert", "update", "delete"], weights=[6, 2, 1, 1])[0]
+        dynamic = rng.random() < dynamic_density
+        base = rng.randrange(TABLE_COUNT)
+        if kind == "select":
+            sql = generate_select(rng, base, join_depth, rng.random() < include_density, dynamic)
+        elif kind == "insert":
+            sql = generate_insert(rng, base)
+        elif kind == "update":
+            sql = generate_update(rng, base, dynamic)
+        else:
+            sql = generate_delete(rng, base, dynamic)
+        lines.append(f'    <{kind} id="{kind}{i:04d}">{sql}</{kind}>')
+
+    lines.append("</mapper>")
+    return "\n".join(lines) + "\n"
+
+
+def generate_select(rng, base, join_depth, use_include, dynamic):
+    aliases = [f"t{depth}" for depth in range(join_depth + 1)]
+    if use_include:
+        columns = '<include refid="auditColumns"><property name="alias" value="t0"/></include>'
+    else:
+        columns = ", ".join(f"t0.{column_name(c)}" for c in rng.sample(range(COLUMN_COUNT), 5))
+    for alias in aliases[1:]:
+        columns += ", " + ", ".join(f"{alias}.{column_name(c)}" for c in rng.sample(range(COLUMN_COUNT), 3))
+
+    sql = f"SELECT {columns} FROM {table_name(base)} t0"
+    for depth, alias in enumerate(aliases[1:], 1):
+        joined = (base + depth) % TABLE_COUNT
+        sql += f" JOIN {table_name(joined)} {alias} ON {alias}.col_00 = {aliases[depth - 1]}.col_00"
+    sql += generate_where(rng, aliases, dynamic)
+    # 動的な文は並び順も ${...} で差し込む
+    return sql + " ORDER BY ${orderBy}" if dynamic else sql
+
+
+def generate_insert(rng, base):
+    columns = [column_name(c) for c in sorted(rng.sample(range(COLUMN_COUNT), 6))]
+    values = ", ".join(f"#{{{c}}}" for c in columns)
+    return f"INSERT INTO {table_name(base)} ( {', '.join(columns)} ) VALUES ({values})"
+
+
+def generate_update(rng, base, dynamic):
+    columns = [column_name(c) for c in sorted(rng.sample(range(1, COLUMN_COUNT), 4))]
+    if dynamic:
+        sets = "".join(f'<if test="{c} != null">{c} = #{{{c}}},</if>' for c in columns)
+        sql = f"UPDATE {table_name(base)} <set>{sets}</set>"
+    else:
+        sql = f"UPDATE {table_name(base)} SET " + ", ".join(f"{c} = #{{{c}}}" for c in columns)
+    return sql + " WHERE col_00 = #{col_00}"
+
+
+def generate_delete(rng, base, dynamic):
+    return f"DELETE FROM {table_name(base)}" + generate_where(rng, [None], dynamic)
+
+
+def generate_where(rng, aliases, dynamic):
+    conditions = []
+    for c in rng.sample(range(COLUMN_COUNT), 3):
+        alias = rng.choice(aliases)
+        column = f"{alias}.{column_name(c)}" if alias else column_name(c)
+        conditions.append((column, column_name(c)))
+
+    if not dynamic:
+        return " WHERE " + " AND ".join(f"{column} = #{{{param}}}" for column, param in conditions)
+
+    parts = [f'<if test="{param} != null">AND {column} = #{{{param}}}</if>' for column, param in conditions]
+    column, param = conditions[0]
+    parts.append(
+        f'<choose><when test="{param}List != null">AND {column} IN '
+        f'<foreach collection="{param}List" item="item" open="(" separator="," close=")">#{{item}}</foreach>'
+        f"</when><otherwise>AND {column} IS NOT NULL</otherwise></choose>"
+    )
+    return " <where>" + "".join(parts) + "</where>"
+
+
+def generate_corpus(output_dir, files=10, statements=20, join_depth=1, include_density=0.3, dynamic_density=0.3, seed=0):
+    """
+    マッパーXMLを files 個生成して output_dir に保存し、ファイルパスのリストを返す。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i in range(files):
+        namespace = f"com.example.bench.Mapper{i:04d}"
+        path = os.path.join(output_dir, f"Mapper{i:04d}.xml")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_mapper(namespace, statements, join_depth, include_density, dynamic_density, seed))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="ベンチマーク用のMyBatisマッパーXMLを生成する。")
+    arg_parser.add_argument("output_dir", help="出力ディレクトリ")
+    arg_parser.add_argument("--files", type=int, default=10, help="生成するファイル数")
+    arg_parser.add_argument("--statements", type=int, default=20, help="1ファイルあたりの文の数")
+    arg_parser.add_argument("--join-depth", type=int, default=1, help="SELECT文で結合するテーブル数")
+    arg_parser.add_argument("--include-density", type=float, default=0.3, help="<include> を使うSELECT文の割合")
+    arg_parser.add_argument("--dynamic-density", type=float, default=0.3, help="動的タグを使う文の割合")
+    arg_parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    args = arg_parser.parse_args()
+
+    paths = generate_corpus(
+        args.output_dir, args.files, args.statements, args.join_depth,
+        args.include_density, args.dynamic_density, args.seed,
+    )
+    print(f"{len(paths)}件のマッパーを生成しました: {args.output_dir}")
@@ -0,0 +1,318 @@
+import re
+import hashlib
+import xml.etree.ElementTree as ET
+from mapper_reader import iter_mapper_elements
+
+# ${name} 形式のプロパティ参照
+PROPERTY_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+# 1つのSQL文から生成する動的SQLのバリエーション数の既定の上限
+DEFAULT_MAX_VARIANTS = 8
+
+# 出力に含めない要素
+IGNORED_TAGS = ("property", "bind", "selectKey")
+
+
+class IncludeCycleError(ValueError):
+    """
+    <include> が循環参照している場合に送出する。
+    """
+
+
+class FragmentIndex:
+    """
+    全マッパーの <sql> 定義を "namespace.id" をキーに保持する索引。
+    実行ごとに1回だけ構築し、<include> の展開に使う。
+    展開済みのフラグメントは (キー, プロパティ) ごとにメモ化するため、
+    同じフラグメントを何度参照しても展開は1回で済む。
+
+    <if>/<choose>/<where>/<set>/<trim>/<foreach> は解釈して具体的なSQLのバリエーションに展開する。
+    バリエーション数は max_variants で打ち切る。
+
+    索引の構築時にファイルごとの <include> の refid も記録し、
+    ファイルが参照するフラグメントだけのハッシュ（dependency_digest）をキャッシュキーに使えるようにする。
+    """
+
+    def __init__(self, max_variants=DEFAULT_MAX_VARIANTS):
+        self.max_variants = max_variants
+        self.fragments = {}
+        self._memo = {}
+        self._unresolved = set()
+        self._file_refs = {}            # ファイルのパス -> (namespace, <include> の refid のセット)
+        self._fragment_digests = {}     # 索引のキー -> フラグメントの内容ハッシュ
+
+    @classmethod
+    def from_files(cls, file_paths, max_variants=DEFAULT_MAX_VARIANTS):
+        """
+        XMLファイルのリストから索引を構築する。読めないファイルは無視する。
+        """
+        index = cls(max_variants)
+        for file_path in file_paths:
+            namespace = ""
+            refids = set()
+            try:
+                for namespace, element in iter_mapper_elements(file_path):
+                    if element.tag == "sql" and element.attrib.get("id"):
+                        index.add(namespace, element.attrib["id"], element)
+                    refids.update(include.attrib.get("refid", "") for include in element.iter("include"))
+            except ET.ParseError:
+                continue
+            index._file_refs[file_path] = (namespace, refids)
+        return index
+
+    def add(self, namespace, sql_id, element):
+        """
+        <sql> 要素を1件登録する。
+        """
+        key = make_fragment_key(namespace, sql_id)
+        self.fragments[key] = element
+        self._fragment_digests.pop(key, None)
+        self._memo.clear()
+
+    def digest(self):
+        """
+        索引全体の内容ハッシュを返す（キャッシュキーに使用）。
+        """
+        h = hashlib.sha256()
+        h.update(str(self.max_variants).encode("utf-8"))
+        for key in sorted(self.fragments):
+            h.update(key.encode("utf-8"))
+            h.update(ET.tostring(self.fragments[key]))
+        return h.hexdigest()
+
+    def dependency_digest(self, file_path):
+        """
+        file_path が <include> で（入れ子も含めて）参照するフラグメントだけの内容ハッシュを返す（キャッシュキーに使用）。
+        参照しないフラグメントが変わってもハッシュは変わらない。見つからない refid も含めるため、後から定義されると変わる。
+        refid が ${...} で決まる場合や、索引の構築時に読んでいないファイルは索引全体のハッシュを返す。
+        """
+        if file_path not in self._file_refs:
+            return self.digest()
+        namespace, refids = self._file_refs[file_path]
+        keys = set()
+        unresolved = set()
+        stack = [(refid, namespace) for refid in refids]
+        while stack:
+            refid, ref_namespace = stack.pop()
+            if "${" in refid:
+                return self.digest()
+            key = self.resolve(refid, ref_namespace)
+            if key is None:
+                unresolved.add(f"{ref_namespace}:{refid}")
+                continue
+            if key in keys:
+                continue
+            keys.add(key)
+            fragment_namespace = key.rsplit(".", 1)[0] if "." in key else ""
+            stack.extend((include.attrib.get("refid", ""), fragment_namespace) for include in self.fragments[key].iter("include"))
+
+        h = hashlib.sha256()
+        h.update(str(self.max_variants).encode("utf-8"))
+        for key in sorted(keys):
+            h.update(b"\0")
+            h.update(key.encode("utf-8"))
+            h.update(self._fragment_digest(key))
+        for refid in sorted(unresolved):
+            h.update(b"\0?")
+            h.update(refid.encode("utf-8"))
+        return h.hexdigest()
+
+    def _fragment_digest(self, key):
+        digest = self._fragment_digests.get(key)
+        if digest is None:
+            digest = self._fragment_digests[key] = hashlib.sha256(ET.tostring(self.fragments[key])).digest()
+        return digest
+
+    def resolve(self, refid, namespace):
+        """
+        refid を索引のキーに解決する。見つからない場合は None を返す。
+        ドットを含む refid は完全修飾名として先に探す。
+        """
+        if "." in refid and refid in self.fragments:
+            return refid
+        key = make_fragment_key(namespace, refid)
+        if key in self.fragments:
+            return key
+        return None
+
+    def expand_element(self, element, namespace, properties=None):
+        """
+        要素を展開した最初のバリエーション（<if> をすべて含み、<choose> は最初の分岐）を返す。
+        """
+        return self.expand_variants(element, namespace, properties)[0]
+
+    def expand_variants(self, element, namespace, properties=None):
+        """
+        要素内のテキストを連結し、<include> と動的SQLタグを展開したSQLのバリエーションを返す。
+        """
+        return [text.strip() for text in self._render(element, namespace, properties or {}, [])]
+
+    def expand_fragment(self, key, properties=None):
+        """
+        索引のキーで指定したフラグメントを展開した文字列を返す。
+        """
+        return self._expand(key, properties or {}, [])[0]
+
+    def _render(self, element, namespace, properties, stack):
+        # プロパティの置換は自要素のテキストのみに行い、展開済みのフラグメントには再適用しない
+        variants = [substitute_properties(element.text or "", properties)]
+        for child in element:
+            if child.tag == "include":
+                child_variants = self._include(child, namespace, properties, stack)
+            elif child.tag in IGNORED_TAGS:
+                child_variants = [""]
+            else:
+                child_variants = self._render_dynamic(child, namespace, properties, stack)
+            tail = substitute_properties(child.tail or "", properties)
+            variants = combine_variants(variants, child_variants, tail, self.max_variants)
+        return variants
+
+    def _render_dynamic(self, element, namespace, properties, stack):
+        """
+        動的SQLタグを解釈してバリエーションのリストを返す。
+        """
+        tag = element.tag
+        if tag == "choose":
+            variants = []
+            for branch in element:
+                if branch.tag in ("when", "otherwise"):
+                    variants.extend(self._render(branch, namespace, properties, stack))
+            if not any(branch.tag == "otherwise" for branch in element):
+                variants.append("")
+            return dedupe_variants(variants, self.max_variants)
+
+        body = [f" {text} " for text in self._render(element, namespace, properties, stack)]
+        if tag in ("if", "when"):
+            return dedupe_variants(body + [""], self.max_variants)
+        if tag == "where":
+            return [trim_text(text, " WHERE ", "", ["AND ", "OR "], []) for text in body]
+        if tag == "set":
+            return [trim_text(text, " SET ", "", [","], [","]) for text in body]
+        if tag == "trim":
+            attrib = element.attrib
+            prefix_overrides = split_overrides(attrib.get("prefixOverrides", ""))
+            suffix_overrides = split_overrides(attrib.get("suffixOverrides", ""))
+            return [
+                trim_text(text, f" {attrib.get('prefix', '')} ", f" {attrib.get('suffix', '')} ", prefix_overrides, suffix_overrides)
+                for text in body
+            ]
+        if tag == "foreach":
+            # 繰り返しは1回分として展開する
+            attrib = element.attrib
+            return [f" {attrib.get('open', '')}{text.strip()}{attrib.get('close', '')} " for text in body]
+        return body
+
+    def _include(self, include, namespace, properties, stack):
+        refid = substitute_properties(include.attrib.get("refid", ""), properties)
+        key = self.resolve(refid, namespace)
+        if key is None:
+            if refid not in self._unresolved:
+                self._unresolved.add(refid)
+                print(f"Warning: <include refid=\"{refid}\"> の定義が見つかりません (namespace: {namespace})")
+            return [""]
+
+        # <property> の値は呼び出し元のプロパティで展開してから引き継ぐ
+        child_properties = dict(properties)
+        for prop in include.iter("property"):
+            name = prop.attrib.get("name")
+            if name:
+                child_properties[name] = substitute_properties(prop.attrib.get("value", ""), properties)
+        return self._expand(key, child_properties, stack)
+
+    def _expand(self, key, properties, stack):
+        memo_key = (key, tuple(sorted(properties.items())))
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+        if key in stack:
+            cycle = " -> ".join(stack[stack.index(key):] + [key])
+            raise IncludeCycleError(f"<include> の循環参照: {cycle}")
+
+        namespace = key.rsplit(".", 1)[0] if "." in key else ""
+        stack.append(key)
+        try:
+            variants = [text.strip() for text in self._render(self.fragments[key], namespace, properties, stack)]
+        finally:
+            stack.pop()
+        self._memo[memo_key] = variants
+        return variants
+
+
+def combine_variants(heads, tails, suffix, max_variants):
+    """
+    heads と tails の全組み合わせを連結する（重複は除き、max_variants 件で打ち切る）。
+    """
+    if len(tails) == 1:
+        return [head + tails[0] + suffix for head in heads]
+    combined = []
+    seen = set()
+    for head in heads:
+        for tail in tails:
+            text = head + tail + suffix
+            if text in seen:
+                continue
+            seen.add(text)
+            combined.append(text)
+            if len(combined) >= max_variants:
+                return combined
+    return combined
+
+
+def dedupe_variants(variants, max_variants):
+    """
+    順序を保ったまま重複を除き、max_variants 件で打ち切る。
+    """
+    return list(dict.fromkeys(variants))[:max_variants]
+
+
+def split_overrides(overrides):
+    """
+    prefixOverrides / suffixOverrides の "AND |OR " 形式を分割する。
+    """
+    return [item for item in overrides.split("|") if item.strip()]
+
+
+def trim_text(text, prefix, suffix, prefix_overrides, suffix_overrides):
+    """
+    <trim> の規則で text を整形する。中身が空なら空文字を返す。
+    """
+    text = text.strip()
+    for override in prefix_overrides:
+        if starts_with_word(text, override.strip()):
+            text = text[len(override.strip()):].lstrip()
+            break
+    for override in suffix_overrides:
+        token = override.strip()
+        if text.upper().endswith(token.upper()):
+            text = text[:len(text) - len(token)].rstrip()
+            break
+    if not text:
+        return ""
+    return f"{prefix}{text}{suffix}"
+
+
+def starts_with_word(text, token):
+    """
+    text が token で始まるかを大文字小文字を区別せずに判定する（"AND" が "ANDROID" に一致しないようにする）。
+    """
+    if not token or not text.upper().startswith(token.upper()):
+        return False
+    if len(text) == len(token) or not token[-1].isalnum():
+        return True
+    following = text[len(token)]
+    return not (following.isalnum() or following == "_")
+
+
+def make_fragment_key(namespace, sql_id):
+    """
+    索引のキー "namespace.id" を作成する。namespace がない場合は id のみ。
+    """
+    return f"{namespace}.{sql_id}" if namespace else sql_id
+
+
+def substitute_properties(text, properties):
+    """
+    ${name} を properties の値で置き換える。未定義のものはそのまま残す。
+    """
+    if not properties or "${" not in text:
+        return text
+    return PROPERTY_PATTERN.sub(lambda m: properties.get(m.group(1), m.group(0)), text)
@@ -1,6 +1,7 @@
 import os
 import json
 import csv
+import profiler
 
 def read_xml_files(directory):
     """
@@ -13,32 +14,75 @@ def read_xml_files(directory):
     return xml_files
 
 
+CSV_HEADER = ["ファイル名", "タグ", "ID", "テーブル名", "カラム名", "条件式", "条件の出典"]
+
+# ストリーミング出力時の書き込みバッファサイズ
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def iter_csv_rows(file_name, tags):
+    """
+    1ファイル分の解析結果をCSVの行に変換して1行ずつ返す。
+    """
+    for tag, tables in tags.items():
+        if tag == "sql":  # <sql> 定義はSQL文ではないため出力しない
+            continue
+        for tag_id, details in tables.items():
+            if not details:  # データが空でも出力
+                yield [file_name, tag, tag_id, "", "", "", ""]
+                continue
+            for table_name, table_data in details.items():
+                columns = table_data.get("columns", [""])
+                parameters = table_data.get("parameters", [""])
+                for column in columns:
+                    yield [
+                        file_name, tag, tag_id, table_name, column,
+                        table_data.get("condition", ""),
+                        table_data.get("source", "")
+                    ]
+                for param in parameters:
+                    yield [
+                        file_name, tag, tag_id, table_name, "",
+                        table_data.get("condition", ""),
+                        table_data.get("source", "")
+                    ]
+
+
 def save_to_csv(data, output_path):
     """
     辞書をCSV形式で保存する。
     """
     with open(output_path, 'w', encoding='utf-8', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["ファイル名", "タグ", "ID", "テーブル名", "カラム名", "条件式", "条件の出典"])
+        writer.writerow(CSV_HEADER)
 
         for file_name, tags in data.items():
-            for tag, tables in tags.items():
-                for tag_id, details in tables.items():
-                    if not details:  # データが空でも出力
-                        writer.writerow([file_name, tag, tag_id, "", "", "", ""])
-                        continue
-                    for table_name, table_data in details.items():
-                        columns = table_data.get("columns", [""])
-                        parameters = table_data.get("parameters", [""])
-                        for column in columns:
-                            writer.writerow([
-                                file_name, tag, tag_id, table_name, column,
-                                table_data.get("condition", ""),
-                                table_data.get("source", "")
-                            ])
-                        for param in parameters:
-                            writer.writerow([
-                                file_name, tag, tag_id, table_name, "",
-                                table_data.get("condition", ""),
-                                table_data.get("source", "")
-                            ])
+            profiler.set_file(file_name)
+            with profiler.stage("csv_write"):
+                writer.writerows(iter_csv_rows(file_name, tags))
+
+
+def save_to_csv_stream(records, output_path, jsonl_path=None):
+    """
+    (ファイル名, 解析結果) を返すイテラブルを受け取り、届いた順にCSVへ書き出す。
+    jsonl_path を指定した場合、同じ内容を1ファイル1行のJSON Lines形式でも保存する。
+    全ファイル分の結果をメモリに保持しないため、ファイル数が増えてもメモリ使用量は一定。
+    """
+    jsonl_file = None
+    with open(output_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+        try:
+            if jsonl_path:
+                jsonl_file = open(jsonl_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+
+            for file_name, tags in records:
+                profiler.set_file(file_name)
+                with profiler.stage("csv_write"):
+                    writer.writerows(iter_csv_rows(file_name, tags))
+                    if jsonl_file:
+                        jsonl_file.write(json.dumps({file_name: tags}, ensure_ascii=False))
+                        jsonl_file.write("\n")
+        finally:
+            if jsonl_file:
+                jsonl_file.close()
@@ -1,25 +1,175 @@
 import os
-from io_handler import save_to_csv, read_xml_files
-from parser import parse_mybatis_xml
+import argparse
+import profiler
+from concurrent.futures import ProcessPoolExecutor
+from io_handler import save_to_csv, save_to_csv_stream, read_xml_files
+from parser import parse_mybatis_xml, set_engine, memo_stats, ENGINES, PARSER_VERSION
+from cache import ParseCache
+from fragments import FragmentIndex, DEFAULT_MAX_VARIANTS
 
-def main():
-    input_dir = "./sample/test01/input/mybatis_xml"  # XMLファイルのディレクトリ
-    csv_output_file = "./sample/test01/output/tables_columns.csv"
+# 全マッパー共通の <sql> 定義索引（ワーカープロセスには初期化時に1回だけ渡す）
+_fragment_index = None
+
+
+def init_worker(fragment_index, engine="sqlparse", profile_top=0):
+    """
+    ワーカープロセスの初期化。<sql> 定義索引とSQL解析エンジンを設定する。
+    profile_top が1以上の場合は計測を有効にする。
+    """
+    global _fragment_index
+    _fragment_index = fragment_index
+    set_engine(engine)
+    if profile_top:
+        profiler.enable(profile_top)
+
+
+def parse_file(file_name, file_path):
+    """
+    1ファイル分の解析を行い、(ファイル名, 解析結果, エラーメッセージ, 統計) を返す。
+    統計は {"memo": (メモのヒット数, ミス数), "profile": 計測結果} で、計測が無効な場合 profile は None。
+    例外は (ファイル名, None, エラーメッセージ, ...) として返し、他ファイルの処理は継続させる。
+    """
+    hits, misses = memo_stats()
+    try:
+        file_data, error = parse_mybatis_xml(file_path, _fragment_index), None
+    except Exception as e:
+        file_data, error = None, f"{type(e).__name__}: {e}"
+    after_hits, after_misses = memo_stats()
+    profile = profiler.drain() if profiler.is_enabled() else None
+    return file_name, file_data, error, {"memo": (after_hits - hits, after_misses - misses), "profile": profile}
+
+
+def iter_parsed_files(xml_files, workers=1, cache=None, errors=None, max_variants=DEFAULT_MAX_VARIANTS,
+                      engine="sqlparse", stats=None):
+    """
+    全XMLファイルを解析し、(ファイル名, tables_by_tag) をファイル名順に1件ずつ返すジェネレータ。
+    workers が2以上の場合はプロセスプールで並列に解析する。
+    cache が指定された場合、内容が変わっていないファイルはキャッシュの結果を使う。
+    解析に失敗したファイルは出力せず、errors に (ファイル名, エラー) を追加する。
+    max_variants は動的SQLから展開するSQLのバリエーション数の上限。
+    engine はSQL解析エンジン。stats を渡すと解析結果のメモのヒット数・ミス数を加算する。
+    profiler が有効な場合は、ワーカープロセスの計測結果も取り込む。
+    """
+    file_names = sorted(xml_files)
+
+    # 全マッパーの <sql> 定義を1回だけ索引化する
+    fragment_index = FragmentIndex.from_files([xml_files[name] for name in file_names], max_variants)
+    profile_top = profiler.top_n() if profiler.is_enabled() else 0
+    init_worker(fragment_index, engine, profile_top)
+
+    # キャッシュにヒットするファイルは解析対象から外す
+    cache_keys = {}
+    if cache:
+        # 他ファイルの <sql> 定義にも依存するため、ファイルが参照するフラグメントの内容もキーに含める
+        cache_keys = {
+            name: cache.make_key(xml_files[name], f"{engine}:{fragment_index.dependency_digest(xml_files[name])}")
+            for name in file_names
+        }
+    pending_names = [name for name in file_names if not (cache and cache.has(cache_keys[name]))]
+    pending_paths = [xml_files[name] for name in pending_names]
+    pending = set(pending_names)
+
+    if workers > 1 and len(pending_names) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(fragment_index, engine, profile_top))
+        results = executor.map(parse_file, pending_names, pending_paths)
+    else:
+        executor = None
+        results = map(parse_file, pending_names, pending_paths)
+
+    try:
+        for file_name in file_names:
+            if file_name in pending:
+                _, file_data, error, file_stats = next(results)
+            else:
+                file_data = cache.get(cache_keys[file_name])
+                if file_data is not None:
+                    yield file_name, file_data
+                    continue
+                # 読めないエントリはその場で解析し直す
+                _, file_data, error, file_stats = parse_file(file_name, xml_files[file_name])
+
+            profiler.merge(file_stats["profile"])
+            if stats is not None:
+                stats["memo_hits"] = stats.get("memo_hits", 0) + file_stats["memo"][0]
+                stats["memo_misses"] = stats.get("memo_misses", 0) + file_stats["memo"][1]
+
+            if error:
+                print(f"Error parsing file: {file_name} - {error}")
+                if errors is not None:
+                    errors.append((file_name, error))
+                continue
+            print(f"Parsing file: {file_name}")
+            if cache:
+                cache.put(cache_keys[file_name], file_data)
+            yield file_name, file_data
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def parse_all_files(xml_files, workers=1, cache=None, max_variants=DEFAULT_MAX_VARIANTS, engine="sqlparse", stats=None):
+    """
+    全XMLファイルを解析し、(all_files_data, errors) を返す。
+    """
+    errors = []
+    all_files_data = dict(iter_parsed_files(xml_files, workers, cache, errors, max_variants, engine, stats))
+    return all_files_data, errors
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="MyBatis XMLからテーブル・カラム情報を抽出する。")
+    arg_parser.add_argument("--input", default="./sample/test01/input/mybatis_xml", help="XMLファイルのディレクトリ")
+    arg_parser.add_argument("--output", default="./sample/test01/output/tables_columns.csv", help="出力CSVファイル")
+    arg_parser.add_argument("--workers", type=int, default=1, help="並列解析に使うプロセス数")
+    arg_parser.add_argument("--cache-dir", default="./sample/test01/.parse_cache", help="解析結果キャッシュのディレクトリ")
+    arg_parser.add_argument("--cache-max-mb", type=int, default=256, help="キャッシュの最大サイズ(MB)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="キャッシュを使わずに全ファイルを解析する")
+    arg_parser.add_argument("--stream", action="store_true", help="解析済みのファイルから順にCSVへ書き出す（メモリ使用量を抑える）")
+    arg_parser.add_argument("--jsonl-output", default="./sample/test01/output/tables_columns.jsonl", help="--stream 時に出力するJSON Linesファイル")
+    arg_parser.add_argument("--max-variants", type=int, default=DEFAULT_MAX_VARIANTS, help="動的SQLから展開するSQLのバリエーション数の上限")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="sqlparse", help="SQL解析エンジン")
+    arg_parser.add_argument("--profile", help="ステージ別・ファイル別の処理時間を出力するJSONファイル")
+    arg_parser.add_argument("--profile-top", type=int, default=20, help="--profile に記録する遅いSQL文の件数")
+    args = arg_parser.parse_args(argv)
+
+    input_dir = args.input  # XMLファイルのディレクトリ
+    csv_output_file = args.output
 
     # XMLファイルを読み取る
     xml_files = read_xml_files(input_dir)
-    
-    # 全ファイルの解析結果を格納
-    all_files_data = {}
-    for file_name, file_path in xml_files.items():
-        print(f"Parsing file: {file_name}")
-        file_data = parse_mybatis_xml(file_path)
-        all_files_data[file_name] = file_data
 
-    # 結果を保存
-    save_to_csv(all_files_data, csv_output_file)
+    if args.profile:
+        profiler.enable(args.profile_top)
+
+    cache = None
+    if not args.no_cache:
+        cache = ParseCache(args.cache_dir, PARSER_VERSION, args.cache_max_mb * 1024 * 1024)
+
+    stats = {}
+    if args.stream:
+        # 解析結果を保持せず、1ファイルずつCSV・JSON Linesへ書き出す
+        errors = []
+        records = iter_parsed_files(xml_files, args.workers, cache, errors, args.max_variants, args.engine, stats)
+        save_to_csv_stream(records, csv_output_file, args.jsonl_output)
+        print(f"JSON Linesファイルに保存しました: {args.jsonl_output}")
+    else:
+        # 全ファイルの解析結果を格納
+        all_files_data, errors = parse_all_files(xml_files, args.workers, cache, args.max_variants, args.engine, stats)
+
+        # 結果を保存
+        save_to_csv(all_files_data, csv_output_file)
 
     print(f"CSVファイルに保存しました: {csv_output_file}")
+    if cache:
+        print(cache.summary())
+    print(f"SQL解析のメモ: {stats.get('memo_hits', 0)}件の解析を省略 (解析: {stats.get('memo_misses', 0)}件)")
+    if errors:
+        print(f"解析に失敗したファイル: {len(errors)}件")
+        for file_name, error in errors:
+            print(f"  {file_name}: {error}")
+    if args.profile:
+        profiler.save(args.profile)
+        print(f"処理時間の計測結果を保存しました: {args.profile}")
 
 if __name__ == "__main__":
     main()
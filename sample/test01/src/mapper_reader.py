@@ -0,0 +1,47 @@
+import xml.etree.ElementTree as ET
+import profiler
+
+# 解析対象のSQL文タグ
+STATEMENT_TAGS = ("select", "insert", "update", "delete")
+
+
+def iter_mapper_elements(file_path):
+    """
+    ET.iterparse でXMLを1回だけ走査し、<mapper> 直下の要素を (namespace, 要素) で返す。
+    返した要素はマッパーから切り離すため、呼び出し側が参照を持たなければ順次解放される。
+    """
+    root = None
+    namespace = ""
+    depth = 0
+    for event, elem in ET.iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+                namespace = elem.attrib.get("namespace", "")
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            yield namespace, elem
+            # 処理済みの子要素をマッパーから外す（DOM全体を保持しない）
+            root.clear()
+
+
+def iter_mapper_statements(file_path, fragment_index):
+    """
+    <sql> と <select>/<insert>/<update>/<delete> を文書順に (タグ, id, SQL文のバリエーション) で返す。
+    SQL文は fragment_index を使って <include> と動的SQLタグを展開したもので、
+    先頭のバリエーションは <if> をすべて含み <choose> の最初の分岐を選んだもの。
+    """
+    elements = iter_mapper_elements(file_path)
+    while True:
+        with profiler.stage("xml_read"):
+            item = next(elements, None)
+        if item is None:
+            break
+        namespace, elem = item
+        if elem.tag in STATEMENT_TAGS or elem.tag == "sql" and elem.attrib.get("id"):
+            with profiler.stage("include_expansion"):
+                variants = fragment_index.expand_variants(elem, namespace)
+            yield elem.tag, elem.attrib.get("id", ""), variants
@@ -1,214 +1,469 @@
-import xml.etree.ElementTree as ET
 import re
+import time
+import xml.etree.ElementTree as ET
+from collections import ChainMap
+from functools import lru_cache
 import sqlparse
+import profiler
+from fragments import FragmentIndex
+from mapper_reader import iter_mapper_statements
+
+# 解析ロジックを変更した場合は更新する（キャッシュのキーに使用）
+PARSER_VERSION = "10"
+
+# SQL解析エンジン
+ENGINES = ("sqlparse", "sqlglot")
+_engine = "sqlparse"
+
+# 正規化したSQL文ごとの解析結果をメモ化する件数
+PARSE_MEMO_SIZE = 4096
+
+# MyBatisのパラメータ表記 #{...} / ${...}
+PARAMETER_PATTERN = re.compile(r"[#$]\{[^{}]*\}")
+
+# sqlparse に渡す前にパラメータを置き換えるプレースホルダー
+PLACEHOLDER_PREFIX = ":__p"
+PLACEHOLDER_PATTERN = re.compile(r":__p(\d+)")
+
+# 句の切り替えとなるキーワード
+CLAUSE_KEYWORDS = {
+    "WITH": "with",
+    "SELECT": "select",
+    "FROM": "from",
+    "USING": "from",
+    "ON": "on",
+    "INTO": "into",
+    "UPDATE": "update",
+    "SET": "set",
+    "VALUES": "values",
+    "WHERE": "where",
+    "GROUP BY": "other",
+    "ORDER BY": "other",
+    "HAVING": "other",
+    "LIMIT": "other",
+    "UNION": "other",
+    "UNION ALL": "other",
+    "RETURNING": "other",
+    "WHEN": "when",
+    "INSERT": "insert",
+}
+
+def set_engine(engine):
+    """
+    parse_sql() が使うSQL解析エンジン（"sqlparse" または "sqlglot"）を切り替える。
+    """
+    global _engine
+    if engine not in ENGINES:
+        raise ValueError(f"未対応の解析エンジン: {engine}")
+    _engine = engine
+
 
-def parse_sql(sql, sql_definitions=None):
+def parse_sql(sql, fragment_index=None, namespace=""):
     """
     SQL文を解析してテーブル名、カラム名、条件式、条件の出典を抽出する。
+    解析結果は正規化したSQL文ごとに実行全体でメモ化し、呼び出しごとにコピーを返す。
+    <include> を含むSQL文は fragment_index（FragmentIndex）で展開する。
+    その場合の sql はマッパーの要素の中身と同じくXMLとして解釈するため、< と & はエスケープしておくこと。
+    """
+    if fragment_index is not None and "<include" in sql:
+        sql = fragment_index.expand_element(ET.fromstring(f"<sql>{sql}</sql>"), namespace)
+    return merge_tables({}, parse_normalized_sql(normalize_sql(sql), _engine))
+
+
+def parse_sql_variants(variants):
+    """
+    動的SQLから展開したSQLのバリエーションをそれぞれ解析し、テーブル・カラムの結果をまとめる。
     """
     tables = {}
-    alias_map = {}
+    for sql in variants:
+        merge_tables(tables, parse_normalized_sql(normalize_sql(sql), _engine))
+    return tables
+
 
-    # SQL 文の展開
-    sql = expand_sql_includes(sql, sql_definitions)
+def normalize_sql(sql):
+    """
+    空白を1つにまとめ、末尾のセミコロンを除いたSQL文を返す。
+    """
+    return " ".join(sql.split()).rstrip(";").rstrip()
 
-    # SQL 文の解析
-    parsed = sqlparse.parse(sql)
-    for stmt in parsed:
-        tokens = sqlparse.sql.TokenList(stmt.tokens)
-        process_from_and_join(tokens, tables, alias_map)
-        select_columns = process_select_clause(tokens, alias_map, tables)
-        process_where_clause(tokens, alias_map, tables)
 
-        # SELECT句やWHERE句で未特定のカラムを処理
-        assign_columns_to_tables(select_columns, tables, alias_map)  # alias_map を渡す
+@lru_cache(maxsize=PARSE_MEMO_SIZE)
+def parse_normalized_sql(sql, engine="sqlparse"):
+    """
+    正規化済みのSQL文を解析する（結果はメモ化されるため呼び出し側で変更しないこと）。
+    """
+    tables = {}
+    sql, parameters = replace_parameters(sql)
 
+    with profiler.stage("sql_parse"):
+        if engine == "sqlglot":
+            # sqlglot は使う場合のみ読み込む
+            import sqlglot
+            from sqlglot_backend import visit_statements
+            try:
+                visitors = visit_statements(sql)
+            except sqlglot.errors.SqlglotError:
+                # sqlglot で解析できない文は sqlparse で解析する
+                visitors = visit_sqlparse_statements(sql)
+        else:
+            visitors = visit_sqlparse_statements(sql)
+
+    with profiler.stage("column_assignment"):
+        for visitor in visitors:
+            apply_statement_result(visitor, parameters, tables)
     return tables
 
 
-def expand_sql_includes(sql, sql_definitions):
+def visit_sqlparse_statements(sql):
     """
-    <sql> タグを展開する。
+    SQL文を sqlparse で解析し、文ごとにトークンツリーを1回だけ走査した ClauseVisitor のリストを返す。
     """
-    if sql_definitions:
-        for key, value in sql_definitions.items():
-            sql = sql.replace(f"<include refid=\"{key}\" />", value)
-    return sql
+    visitors = []
+    for stmt in sqlparse.parse(sql):
+        visitor = ClauseVisitor()
+        visitor.visit(stmt.tokens)
+        visitors.append(visitor)
+    return visitors
 
 
-def process_from_and_join(tokens, tables, alias_map):
+def memo_stats():
     """
-    FROM句とJOIN句を解析し、テーブルとエイリアスを抽出する。
+    解析結果のメモの (ヒット数, ミス数) を返す。ヒット数はメモにより省略できた解析の回数。
     """
-    from_found = False
-    join_found = False
+    info = parse_normalized_sql.cache_info()
+    return info.hits, info.misses
 
-    for token in tokens:
-        if token.ttype is sqlparse.tokens.Keyword and token.value.upper() == 'FROM':
-            from_found = True
-            continue
-        elif token.ttype is sqlparse.tokens.Keyword and token.value.upper() == 'JOIN':
-            join_found = True
-            continue
 
-        if from_found or join_found:
-            if isinstance(token, sqlparse.sql.Identifier):  # テーブル名単体
-                table_name = token.get_real_name()
-                alias = token.get_alias()
-                tables[table_name] = {"columns": [], "parameters": [], "condition": "", "source": ""}
-                if alias:
-                    alias_map[alias] = table_name
-                else:
-                    alias_map[table_name] = table_name  # エイリアスがない場合、テーブル名をキーにする
-            elif isinstance(token, sqlparse.sql.IdentifierList):  # 複数のテーブル
-                for identifier in token.get_identifiers():
-                    table_name = identifier.get_real_name()
-                    alias = identifier.get_alias()
-                    tables[table_name] = {"columns": [], "parameters": [], "condition": "", "source": ""}
-                    if alias:
-                        alias_map[alias] = table_name
-                    else:
-                        alias_map[table_name] = table_name
-            from_found = join_found = False
-
-
-def process_select_clause(tokens, alias_map, tables):
-    """
-    SELECT句を解析し、カラム情報を抽出する。
-    """
-    select_columns = []
-
-    for token in tokens:
-        if token.ttype is sqlparse.tokens.DML and token.value.upper() == "SELECT":
-            for next_token in tokens.tokens[tokens.token_index(token) + 1:]:
-                if next_token.ttype is sqlparse.tokens.Keyword and next_token.value.upper() == "FROM":
-                    break
-                if next_token.ttype is sqlparse.tokens.Punctuation:
-                    continue
-                if isinstance(next_token, sqlparse.sql.IdentifierList):  # 複数カラム
-                    for identifier in next_token.get_identifiers():
-                        real_name = identifier.get_real_name()
-                        alias = extract_alias(identifier)  # エイリアスを抽出
-                        select_columns.append((alias, real_name))
-                elif isinstance(next_token, sqlparse.sql.Identifier):  # 単一カラム
-                    real_name = next_token.get_real_name()
-                    alias = extract_alias(next_token)  # エイリアスを抽出
-                    select_columns.append((alias, real_name))
-                elif isinstance(next_token, sqlparse.sql.Function):  # 集約関数（例: NVL, MAX）
-                    func_name = next_token.get_name()
-                    arguments = []
-                    for arg_token in next_token.tokens:
-                        if isinstance(arg_token, sqlparse.sql.Identifier):
-                            real_name = arg_token.get_real_name()
-                            alias = extract_alias(arg_token)  # エイリアスを抽出
-                            arguments.append(f"{alias}.{real_name}" if alias else real_name)
-                        elif isinstance(arg_token, sqlparse.sql.Token) and arg_token.ttype is sqlparse.tokens.Name:
-                            arguments.append(arg_token.value)
-                    if func_name:
-                        select_columns.append((None, f"{func_name}({', '.join(arguments)})"))
-
-    return select_columns
-
-
-def extract_alias(identifier):
-    """
-    sqlparse.sql.Identifier からエイリアスを抽出する。
-    """
-    # "u.id" のような形式の場合
-    if "." in identifier.value:
-        return identifier.value.split(".")[0]
-    # エイリアスが含まれていない場合
-    return None
-
-
-def process_where_clause(tokens, alias_map, tables):
-    """
-    WHERE句を解析し、条件式とパラメータを抽出する。
-    """
-    for token in tokens:
-        if token.value.upper() == "WHERE":
-            # WHERE句全体を文字列化
-            condition = "".join(str(t) for t in tokens)
-            # #{param} または ${param} のパラメータを抽出
-            parameters = re.findall(r"[#|$]{\w+}", condition)
-            # エイリアス.カラム形式を抽出
-            columns_in_where = re.findall(r"(\w+)\.(\w+)", condition)
-
-            for alias, column in columns_in_where:
-                if alias in alias_map:  # エイリアスを解決
-                    actual_table = alias_map[alias]
-                    if actual_table not in tables:
-                        tables[actual_table] = {"columns": [], "parameters": [], "condition": "", "source": ""}
-                    tables[actual_table]["columns"].append(column)
-                    # 条件式を記録（既存条件に追記）
-                    if tables[actual_table]["condition"]:
-                        tables[actual_table]["condition"] += f" AND {condition}"
-                    else:
-                        tables[actual_table]["condition"] = condition
-
-            # テーブルにパラメータを追加
-            for table_name in tables:
-                tables[table_name]["parameters"].extend(parameters)
-
-
-def assign_columns_to_tables(select_columns, tables, alias_map):
-    """
-    SELECT句やWHERE句で特定されていないカラムをテーブルに割り当てる。
-    """
-    for alias, column in select_columns:
-        if alias and alias in alias_map:  # エイリアスがある場合
-            actual_table = alias_map[alias]
-            if actual_table not in tables:
-                tables[actual_table] = {"columns": [], "parameters": [], "condition": "", "source": ""}
-            tables[actual_table]["columns"].append(column)
-        elif len(tables) == 1:  # テーブルが1つしかない場合、それに割り当てる
-            table_name = list(tables.keys())[0]
-            tables[table_name]["columns"].append(column)
-        else:  # 不明なテーブルの場合
-            if "unknown_table" not in tables:
-                tables["unknown_table"] = {"columns": [], "parameters": [], "condition": "", "source": ""}
-            tables["unknown_table"]["columns"].append(column)
+def merge_tables(tables, parsed):
+    """
+    parse_sql() の結果を tables にマージする。カラムとパラメータは重複を除いて追加し、
+    条件式は最初に見つかったものを使う。tables を返す。
+    """
+    for table_name, data in parsed.items():
+        if table_name not in tables:
+            tables[table_name] = new_table_entry()
+        entry = tables[table_name]
+        for key in ("columns", "parameters"):
+            for value in data[key]:
+                if value not in entry[key]:
+                    entry[key].append(value)
+        if not entry["condition"]:
+            entry["condition"] = data["condition"]
+    return tables
+
+
+def new_table_entry():
+    """
+    テーブルごとの解析結果の初期値を返す。
+    """
+    return {"columns": [], "parameters": [], "condition": "", "source": ""}
+
+
+def replace_parameters(sql):
+    """
+    #{param} / ${param} をプレースホルダー(:__p0, :__p1, ...)に置き換える。
+    MyBatisのパラメータ表記のままだと sqlparse のトークン分割が崩れるため、解析前に行う。
+    戻り値は (置換後のSQL, 元のパラメータ表記のリスト)。
+    """
+    parameters = []
+
+    def replace(match):
+        parameters.append(match.group(0))
+        return f"{PLACEHOLDER_PREFIX}{len(parameters) - 1}"
+
+    return PARAMETER_PATTERN.sub(replace, sql), parameters
+
+
+def restore_parameters(text, parameters):
+    """
+    プレースホルダーを元のパラメータ表記に戻す。
+    """
+    return PLACEHOLDER_PATTERN.sub(lambda m: parameters[int(m.group(1))], text)
+
+
+class ClauseVisitor:
+    """
+    sqlparse でグループ化したトークンツリーを1回だけ走査し、
+    FROM/JOIN のエイリアス、SELECT のカラム、WHERE/ON のカラムとパラメータ、
+    INSERT/UPDATE/DELETE/MERGE の対象テーブルとカラムを集める。
+    エイリアスは括弧で囲まれたSELECTごとのスコープに記録し、カラムは参照したスコープで解決する。
+    テーブル名を付けないカラムは、参照したスコープのテーブルが1つだけならそのテーブルのカラムとする。
+    共通テーブル式（WITH句）の名前はテーブルとして記録せず、導出テーブルと同じくサブクエリのテーブルに置き換える。
+    """
+
+    def __init__(self):
+        self.kind = None            # 文の種類（SELECT/INSERT/UPDATE/DELETE/MERGE）
+        self.alias_map = ChainMap()  # 現在のスコープのエイリアスとテーブル（外側のスコープを親に持つ）
+        self.tables = []            # 出現順のテーブル名
+        self.dml_table = None       # INSERT/UPDATE/DELETE/MERGE の対象テーブル
+        self.ctes = {}              # 共通テーブル式の名前 -> サブクエリのテーブル名
+        self.select_columns = []    # (スコープ, エイリアス, カラム名)
+        self.where_columns = []     # (スコープ, エイリアス, カラム名)
+        self.dml_columns = []       # (スコープ, エイリアス, カラム名) INSERT のカラムリストと UPDATE の SET 句
+        self.where_parameters = []  # プレースホルダー番号
+        self.dml_parameters = []    # プレースホルダー番号
+        self.conditions = []        # WHERE句の条件式
+
+    def visit(self, tokens):
+        """
+        トークン列を先頭から走査し、直前のキーワードで決まる句に応じて情報を振り分ける。
+        """
+        clause = None
+        for token in tokens:
+            if token.is_whitespace or token.ttype in sqlparse.tokens.Comment:
+                continue
+            if token.is_keyword:
+                keyword = token.normalized
+                if keyword.endswith("JOIN"):
+                    clause = "from"
+                elif keyword in CLAUSE_KEYWORDS:
+                    clause = CLAUSE_KEYWORDS[keyword]
+                if self.kind is None and token.ttype is sqlparse.tokens.DML:
+                    self.kind = keyword
+                continue
+
+            if isinstance(token, sqlparse.sql.Where):
+                self.visit_where(token)
+            elif isinstance(token, sqlparse.sql.Values) or clause == "values":
+                self.collect(token, [], self.dml_parameters)
+            elif clause == "with":
+                self.visit_with(token)
+            elif clause == "when":
+                # MERGE の WHEN [NOT] MATCHED [AND 条件] THEN（MATCHED はカラムではない）
+                if not (isinstance(token, sqlparse.sql.Identifier) and token.normalized.upper() == "MATCHED"):
+                    self.collect(token, self.where_columns, self.where_parameters)
+            elif clause == "insert":
+                # MERGE の WHEN NOT MATCHED THEN INSERT (col1, col2) のカラムリスト
+                if isinstance(token, sqlparse.sql.Parenthesis):
+                    self.collect(token, self.dml_columns, self.dml_parameters)
+            elif clause == "select":
+                self.collect(token, self.select_columns, self.where_parameters)
+            elif clause == "from":
+                self.add_tables(token, is_target=self.kind == "DELETE" and self.dml_table is None)
+            elif clause == "update":
+                self.add_tables(token, is_target=True)
+            elif clause == "into":
+                self.visit_into(token)
+            elif clause == "set":
+                self.collect(token, self.dml_columns, self.dml_parameters)
+            elif clause == "on":
+                self.collect(token, self.where_columns, self.where_parameters)
+            elif clause == "other":
+                # ORDER BY/GROUP BY/HAVING/LIMIT はカラムを記録せず、パラメータ（${orderBy} など）だけを集める
+                self.collect(token, [], self.where_parameters)
+            elif isinstance(token, sqlparse.sql.Parenthesis):
+                self.collect(token, self.select_columns, self.where_parameters)
+
+    def visit_subquery(self, tokens):
+        """
+        サブクエリを新しいエイリアスのスコープで走査し、そのスコープ（エイリアスからテーブル名への辞書）を返す。
+        サブクエリ内のエイリアスは外側から参照できない。
+        """
+        self.alias_map = self.alias_map.new_child()
+        try:
+            self.visit(tokens)
+            return self.alias_map.maps[0]
+        finally:
+            self.alias_map = self.alias_map.parents
+
+    def visit_with(self, token):
+        """
+        WITH句の共通テーブル式をそれぞれ新しいスコープで走査し、名前とサブクエリのテーブルを記録する。
+        """
+        if isinstance(token, sqlparse.sql.IdentifierList):
+            identifiers = list(token.get_identifiers())
+        else:
+            identifiers = [token]
+        for identifier in identifiers:
+            query = identifier.tokens[-1] if isinstance(identifier, sqlparse.sql.Identifier) else None
+            if not isinstance(query, sqlparse.sql.Parenthesis):
+                continue
+            # 文の種類は WITH句の後のDMLで決める
+            kind = self.kind
+            scope = self.visit_subquery(query.tokens)
+            self.kind = kind
+            self.ctes[identifier.get_real_name()] = single_table(scope) or "unknown_table"
+
+    def visit_where(self, where):
+        """
+        WHERE句の条件式を記録し、カラムとパラメータを集める。
+        """
+        condition = str(where)[len(where.tokens[0].value):]
+        self.conditions.append(" ".join(condition.split()))
+        self.collect(sqlparse.sql.TokenList(where.tokens[1:]), self.where_columns, self.where_parameters)
 
+    def visit_into(self, token):
+        """
+        INSERT INTO の対象テーブルとカラムリストを記録する。
+        """
+        if isinstance(token, sqlparse.sql.Function):
+            # "TABLE (col1, col2)" は sqlparse では関数呼び出しとしてグループ化される
+            self.add_table(token.get_name(), None, is_target=True)
+            for child in token.tokens:
+                if isinstance(child, sqlparse.sql.Parenthesis):
+                    self.collect(child, self.dml_columns, self.dml_parameters)
+        elif isinstance(token, sqlparse.sql.Identifier):
+            self.add_tables(token, is_target=True)
 
-def process_insert_clause(tokens, tables):
+    def add_tables(self, token, is_target=False):
+        """
+        FROM/JOIN/UPDATE のテーブル（複数可）とエイリアスを記録する。
+        """
+        if isinstance(token, sqlparse.sql.IdentifierList):
+            for identifier in token.get_identifiers():
+                self.add_tables(identifier, is_target)
+        elif isinstance(token, sqlparse.sql.Identifier):
+            first = token.token_first()
+            if isinstance(first, sqlparse.sql.Parenthesis):  # 導出テーブル（サブクエリ）
+                scope = self.visit_subquery(first.tokens)
+                if token.get_alias():
+                    # 導出テーブルのエイリアスはサブクエリのテーブルが1つだけならそのテーブルとする
+                    self.alias_map[token.get_alias()] = single_table(scope) or "unknown_table"
+                return
+            self.add_table(token.get_real_name(), token.get_alias(), is_target)
+        elif isinstance(token, sqlparse.sql.Parenthesis):
+            self.collect(token, self.select_columns, self.where_parameters)
+
+    def add_table(self, table_name, alias, is_target=False):
+        if not table_name:
+            return
+        if table_name in self.ctes:
+            self.alias_map[table_name] = self.ctes[table_name]
+            if alias:
+                self.alias_map[alias] = self.ctes[table_name]
+            return
+        if table_name not in self.tables:
+            self.tables.append(table_name)
+        if not (is_target and self.kind == "INSERT"):
+            # INSERT の対象テーブルは SELECT 側のカラムの解決に使わない
+            self.alias_map[table_name] = table_name
+            if alias:
+                self.alias_map[alias] = table_name
+        if is_target:
+            self.dml_table = table_name
+
+    def collect(self, token, columns, parameters):
+        """
+        式の中のカラム参照とパラメータを再帰的に集める。サブクエリは visit で走査する。
+        """
+        if token.ttype in sqlparse.tokens.Name.Placeholder:
+            match = PLACEHOLDER_PATTERN.fullmatch(token.value)
+            if match:
+                parameters.append(int(match.group(1)))
+        elif isinstance(token, sqlparse.sql.Identifier):
+            first = token.token_first()
+            if first.is_group:  # 関数・式に別名を付けたもの
+                self.collect(first, columns, parameters)
+            elif first.ttype in sqlparse.tokens.Name.Placeholder:
+                self.collect(first, columns, parameters)
+            else:
+                columns.append((self.alias_map, token.get_parent_name(), token.get_real_name()))
+        elif isinstance(token, sqlparse.sql.Function):
+            for child in token.tokens:
+                # 引数と OVER (PARTITION BY ... ORDER BY ...) の中を集める（関数名はカラムではない）
+                if isinstance(child, (sqlparse.sql.Parenthesis, sqlparse.sql.Over)):
+                    self.collect(child, columns, parameters)
+        elif isinstance(token, sqlparse.sql.Parenthesis) and any(
+            child.ttype is sqlparse.tokens.DML for child in token.tokens
+        ):
+            self.visit_subquery(token.tokens)
+        elif token.is_group:
+            for child in token.tokens:
+                self.collect(child, columns, parameters)
+
+
+def single_table(scope):
     """
-    INSERT文を解析し、テーブル名とカラム名を抽出する。
+    スコープ（エイリアスからテーブル名への辞書）のテーブルが1つだけならその名前を、それ以外は None を返す。
     """
-    for token in tokens:
-        if token.ttype is sqlparse.tokens.Keyword and token.value.upper() == "INSERT":
-            table_token = tokens.token_next(tokens.token_index(token), skip_ws=True)
-            if isinstance(table_token, sqlparse.sql.Identifier):
-                table_name = table_token.get_real_name()
-                tables[table_name] = {"columns": [], "parameters": [], "condition": "", "source": ""}
-            # カラム名の抽出
-            column_list_token = tokens.token_next(tokens.token_index(token) + 1, skip_ws=True)
-            if isinstance(column_list_token, sqlparse.sql.Parenthesis):
-                columns = [col.get_real_name() for col in column_list_token.get_identifiers()]
-                tables[table_name]["columns"].extend(columns)
+    table_names = set(scope.values())
+    return table_names.pop() if len(table_names) == 1 else None
+
+
+def apply_statement_result(visitor, parameters, tables):
+    """
+    1文分の走査結果をテーブルごとの解析結果に反映する。
+    """
+    for table_name in visitor.tables:
+        if table_name not in tables:
+            tables[table_name] = new_table_entry()
+
+    def resolve(alias_map, alias):
+        if alias:
+            return alias_map.get(alias, "unknown_table")
+        # テーブルのない内側のスコープ（FROM のないサブクエリ）は外側のスコープで解決する
+        for scope in alias_map.maps:
+            if scope:
+                return single_table(scope) or "unknown_table"
+        return "unknown_table"
 
+    def add_column(table_name, column):
+        if table_name not in tables:
+            tables[table_name] = new_table_entry()
+        if column not in tables[table_name]["columns"]:
+            tables[table_name]["columns"].append(column)
+
+    for alias_map, alias, column in visitor.select_columns:
+        add_column(resolve(alias_map, alias), column)
+
+    for alias_map, alias, column in visitor.dml_columns:
+        add_column(visitor.dml_table or resolve(alias_map, alias), column)
+
+    where_tables = []
+    for alias_map, alias, column in visitor.where_columns:
+        table_name = resolve(alias_map, alias)
+        add_column(table_name, column)
+        if table_name not in where_tables:
+            where_tables.append(table_name)
+
+    # 条件式を記録（既存条件に追記）
+    for condition in visitor.conditions:
+        condition = restore_parameters(condition, parameters)
+        for table_name in where_tables:
+            if tables[table_name]["condition"]:
+                tables[table_name]["condition"] += f" AND {condition}"
+            else:
+                tables[table_name]["condition"] = condition
 
-def parse_mybatis_xml(file_path):
+    # WHERE句のパラメータは文中の全テーブル、INSERT/UPDATE のパラメータは対象テーブルに追加
+    targets = []
+    if visitor.dml_table:
+        targets.append((visitor.dml_parameters, [visitor.dml_table]))
+    targets.append((visitor.where_parameters, visitor.tables))
+    for indexes, table_names in targets:
+        for table_name in table_names:
+            for index in indexes:
+                if parameters[index] not in tables[table_name]["parameters"]:
+                    tables[table_name]["parameters"].append(parameters[index])
+
+
+def parse_mybatis_xml(file_path, fragment_index=None):
     """
     MyBatisのXMLファイルを解析する。
+    XMLは iterparse で1回だけ走査し、SQL文ごとに要素を解放するため巨大なマッパーでもDOM全体を保持しない。
+    fragment_index には全マッパーの <sql> 定義の索引を渡す。
+    省略した場合はこのファイル内の定義だけで <include> を展開する。
     """
-    tree = ET.parse(file_path)
-    root = tree.getroot()
+    profiler.set_file(file_path)
+    profiling = profiler.is_enabled()
+    if fragment_index is None:
+        fragment_index = FragmentIndex.from_files([file_path])
 
     sql_definitions = {}
-    for sql in root.findall(".//sql"):
-        sql_id = sql.attrib.get("id")
-        if sql_id:
-            sql_definitions[sql_id] = "".join(sql.itertext()).strip()
-
     tables_by_tag = {"select": {}, "insert": {}, "delete": {}, "update": {}, "sql": sql_definitions}
 
-    for tag_name in ["select", "insert", "delete", "update"]:
-        for tag in root.findall(f".//{tag_name}"):
-            tag_id = tag.attrib.get("id", "")
-            sql = "".join(tag.itertext()).strip()
-            parsed_data = parse_sql(sql, sql_definitions)
-            for table, data in parsed_data.items():
-                data["source"] = sql_definitions.get(tag_id, "")  # 出典を追跡
-            tables_by_tag[tag_name][tag_id] = parsed_data
+    for tag_name, tag_id, variants in iter_mapper_statements(file_path, fragment_index):
+        if tag_name == "sql":
+            sql_definitions[tag_id] = variants[0]
+            continue
+        if profiling:
+            start = time.perf_counter()
+            parsed_data = parse_sql_variants(variants)
+            profiler.record_statement(tag_name, tag_id, time.perf_counter() - start)
+        else:
+            parsed_data = parse_sql_variants(variants)
+        for table, data in parsed_data.items():
+            data["source"] = sql_definitions.get(tag_id, "")  # 出典を追跡
+        tables_by_tag[tag_name][tag_id] = parsed_data
 
     return tables_by_tag
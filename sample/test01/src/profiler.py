@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import heapq
+from contextlib import nullcontext
+
+# 計測が無効な場合に stage() が返す何もしないコンテキスト
+_NULL_CONTEXT = nullcontext()
+
+_enabled = False
+_top_n = 20
+_current_file = None
+_stages = {}      # {ステージ名: [秒, 呼び出し回数]}
+_files = {}       # {ファイル名: {ステージ名: [秒, 呼び出し回数]}}
+_statements = []  # (秒, ファイル名, タグ, id) のヒープ（遅い上位 _top_n 件）
+
+
+def enable(top_n=20):
+    """
+    計測を有効にする。top_n は記録する遅いSQL文の件数。
+    """
+    global _enabled, _top_n
+    _enabled = True
+    _top_n = top_n
+
+
+def is_enabled():
+    return _enabled
+
+
+def top_n():
+    return _top_n
+
+
+def set_file(file_path):
+    """
+    以降のステージの計測結果を file_path のファイルにも集計する。
+    """
+    global _current_file
+    if _enabled:
+        _current_file = os.path.basename(file_path) if file_path else None
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name):
+    """
+    with 文でステージの実行時間と呼び出し回数を計測する。無効な場合は何もしない。
+    """
+    if not _enabled:
+        return _NULL_CONTEXT
+    return _Stage(name)
+
+
+def add_stage(name, seconds, calls=1, file_name=None):
+    total = _stages.setdefault(name, [0.0, 0])
+    total[0] += seconds
+    total[1] += calls
+    file_name = file_name or _current_file
+    if file_name:
+        per_file = _files.setdefault(file_name, {}).setdefault(name, [0.0, 0])
+        per_file[0] += seconds
+        per_file[1] += calls
+
+
+def record_statement(tag, tag_id, seconds, file_name=None):
+    """
+    SQL文1件の解析時間を記録し、遅い上位 top_n 件だけを保持する。
+    """
+    if not _enabled:
+        return
+    item = (seconds, file_name or _current_file or "", tag, tag_id)
+    if len(_statements) < _top_n:
+        heapq.heappush(_statements, item)
+    elif item > _statements[0]:
+        heapq.heapreplace(_statements, item)
+
+
+def drain():
+    """
+    これまでの計測結果を返して初期化する（ワーカープロセスから親プロセスへ渡すために使う）。
+    """
+    global _stages, _files, _statements
+    snapshot = {"stages": _stages, "files": _files, "statements": _statements}
+    _stages, _files, _statements = {}, {}, []
+    return snapshot
+
+
+def merge(snapshot):
+    """
+    drain() で取得した計測結果を取り込む。
+    """
+    if not _enabled or not snapshot:
+        return
+    for name, (seconds, calls) in snapshot["stages"].items():
+        total = _stages.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += calls
+    for file_name, stages in snapshot["files"].items():
+        for name, (seconds, calls) in stages.items():
+            per_file = _files.setdefault(file_name, {}).setdefault(name, [0.0, 0])
+            per_file[0] += seconds
+            per_file[1] += calls
+    for seconds, file_name, tag, tag_id in snapshot["statements"]:
+        record_statement(tag, tag_id, seconds, file_name)
+
+
+def save(output_path):
+    """
+    計測結果をJSONで保存する。
+    """
+    def to_dict(stages):
+        return {name: {"seconds": round(seconds, 6), "calls": calls} for name, (seconds, calls) in stages.items()}
+
+    files = {
+        file_name: {"seconds": round(sum(seconds for seconds, _ in stages.values()), 6), "stages": to_dict(stages)}
+        for file_name, stages in _files.items()
+    }
+    profile = {
+        "stages": to_dict(_stages),
+        "files": dict(sorted(files.items(), key=lambda item: item[1]["seconds"], reverse=True)),
+        "slowest_statements": [
+            {"file": file_name, "tag": tag, "id": tag_id, "seconds": round(seconds, 6)}
+            for seconds, file_name, tag, tag_id in sorted(_statements, reverse=True)
+        ],
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=4)
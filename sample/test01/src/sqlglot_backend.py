@@ -0,0 +1,154 @@
+from collections import ChainMap
+import sqlglot
+from sqlglot import exp
+from parser import single_table
+
+# 子要素のキーごとの句（Select/Update/Insert で意味が変わるものは visit_children で判定する）
+KEY_CLAUSES = {
+    "from": "from",
+    "from_": "from",
+    "joins": "from",
+    "on": "on",
+    "using": "from",
+    "group": "other",
+    "order": "other",
+    "having": "other",
+    "limit": "other",
+}
+
+
+class SqlglotVisitor:
+    """
+    sqlglot のASTを1回だけ走査し、parser.ClauseVisitor と同じ属性に句ごとの情報を集める。
+    """
+
+    def __init__(self):
+        self.kind = None
+        self.alias_map = ChainMap()
+        self.tables = []
+        self.dml_table = None
+        self.ctes = {}
+        self.select_columns = []
+        self.where_columns = []
+        self.dml_columns = []
+        self.where_parameters = []
+        self.dml_parameters = []
+        self.conditions = []
+
+    def visit(self, node, clause=None):
+        if isinstance(node, exp.Table):
+            self.visit_table(node, clause)
+            return
+        if isinstance(node, exp.Column):
+            column = (self.alias_map, node.table or None, node.name)
+            if clause in ("set", "into"):
+                self.dml_columns.append(column)
+            elif clause in ("where", "on"):
+                self.where_columns.append(column)
+            elif clause == "select":
+                self.select_columns.append(column)
+            return
+        if isinstance(node, exp.Placeholder):
+            if str(node.name).startswith("__p"):
+                index = int(node.name[3:])
+                if clause in ("set", "values"):
+                    self.dml_parameters.append(index)
+                else:
+                    self.where_parameters.append(index)
+            return
+        if isinstance(node, exp.Identifier):
+            if clause == "into":  # INSERT のカラムリスト
+                self.dml_columns.append((self.alias_map, None, node.name))
+            elif clause == "using":  # JOIN ... USING (col) は ClauseVisitor と同じくSELECTのカラムとする
+                self.select_columns.append((self.alias_map, None, node.name))
+            return
+        if isinstance(node, exp.Where):
+            self.conditions.append(node.this.sql())
+            self.visit(node.this, "where")
+            return
+        if self.kind is None and isinstance(node, (exp.Select, exp.Insert, exp.Update, exp.Delete, exp.Merge)):
+            self.kind = node.key.upper()
+        if isinstance(node, exp.Subquery) or (isinstance(node, exp.Select) and isinstance(node.parent, exp.Exists)):
+            scope = self.visit_subquery(node, clause)
+            if clause == "from" and isinstance(node, exp.Subquery) and node.alias:
+                # 導出テーブルのエイリアスはサブクエリのテーブルが1つだけならそのテーブルとする
+                self.alias_map[node.alias] = single_table(scope) or "unknown_table"
+            return
+        self.visit_children(node, clause)
+
+    def visit_subquery(self, node, clause):
+        """
+        括弧で囲まれたSELECTを ClauseVisitor.visit_subquery と同じく新しいエイリアスのスコープで走査し、そのスコープを返す。
+        """
+        self.alias_map = self.alias_map.new_child()
+        try:
+            self.visit_children(node, clause)
+            return self.alias_map.maps[0]
+        finally:
+            self.alias_map = self.alias_map.parents
+
+    def visit_children(self, node, clause):
+        with_ = node.args.get("with_")
+        if with_ is not None:
+            # 共通テーブル式は参照より先に記録する（ClauseVisitor.visit_with と同じ）
+            for cte in with_.expressions:
+                scope = self.visit_subquery(cte, None)
+                self.ctes[cte.alias] = single_table(scope) or "unknown_table"
+        for key, value in node.args.items():
+            if key == "with_":
+                continue
+            child_clause = KEY_CLAUSES.get(key, clause)
+            if key == "expressions":
+                if isinstance(node, exp.Select):
+                    child_clause = "select"
+                elif isinstance(node, exp.Update):
+                    child_clause = "set"
+            elif key == "using" and isinstance(node, exp.Join):
+                child_clause = "using"
+            elif key == "condition" and isinstance(node, exp.When):  # MERGE の WHEN MATCHED AND 条件
+                child_clause = "on"
+            elif key == "this" and isinstance(node, (exp.Insert, exp.Update, exp.Delete, exp.Merge)):
+                child_clause = "into" if isinstance(node, exp.Insert) else "target"
+            elif key == "expression" and isinstance(node, exp.Insert):
+                child_clause = "values"
+
+            for child in value if isinstance(value, list) else [value]:
+                if isinstance(child, exp.Expression):
+                    self.visit(child, child_clause)
+
+    def visit_table(self, node, clause):
+        if isinstance(node.this, exp.Placeholder):
+            # FROM ${table} はテーブルとして扱わない（sqlparse と同じくパラメータとして記録する）
+            self.visit(node.this, clause)
+            return
+        table_name = node.name
+        if not table_name:
+            return
+        if table_name in self.ctes:
+            self.alias_map[table_name] = self.ctes[table_name]
+            if node.alias:
+                self.alias_map[node.alias] = self.ctes[table_name]
+            return
+        if table_name not in self.tables:
+            self.tables.append(table_name)
+        if clause != "into":
+            # INSERT の対象テーブルは SELECT 側のカラムの解決に使わない
+            self.alias_map[table_name] = table_name
+            if node.alias:
+                self.alias_map[node.alias] = table_name
+        if clause in ("into", "target"):
+            self.dml_table = table_name
+
+
+def visit_statements(sql):
+    """
+    SQL文を sqlglot で解析し、文ごとの SqlglotVisitor のリストを返す。
+    """
+    visitors = []
+    for tree in sqlglot.parse(sql):
+        if tree is None:
+            continue
+        visitor = SqlglotVisitor()
+        visitor.visit(tree)
+        visitors.append(visitor)
+    return visitors
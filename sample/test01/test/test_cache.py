@@ -0,0 +1,71 @@
+import os
+from cache import ParseCache
+from fragments import FragmentIndex
+
+
+def make_cache(tmp_path, max_bytes=1024 * 1024):
+    return ParseCache(str(tmp_path / "cache"), "1", max_bytes)
+
+
+def test_hits_and_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    assert not cache.has("a")
+    assert cache.get("a") is None
+    cache.put("a", {"select": {}})
+    assert cache.has("a")
+    assert cache.get("a") == {"select": {}}
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.summary() == "cache hits: 1, misses: 2, entries: 1"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    data = {"sql": "x" * 100}
+    probe = make_cache(tmp_path / "probe")
+    probe.put("probe", data)
+    size = os.path.getsize(probe._path("probe"))
+
+    cache = make_cache(tmp_path, max_bytes=size * 2)
+    cache.put("a", data)
+    cache.put("b", data)
+    cache.get("a")
+    cache.put("c", data)
+    # 最後に参照した a は残り、最も古い b が削除される
+    assert cache.has("a") and cache.has("c") and not cache.has("b")
+    assert not os.path.exists(cache._path("b"))
+
+    # 既存エントリの最終アクセス順はファイルの更新時刻から復元する
+    os.utime(cache._path("a"), (1, 1))
+    reopened = make_cache(tmp_path, max_bytes=size * 2)
+    reopened.put("d", data)
+    assert reopened.has("c") and reopened.has("d") and not reopened.has("a")
+
+
+def test_corrupt_entry_is_removed_and_counted_as_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("a", {"select": {}})
+    with open(cache._path("a"), "w", encoding="utf-8") as f:
+        f.write("{broken")
+
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert not os.path.exists(cache._path("a"))
+    cache.put("a", {"select": {}})
+    assert cache.get("a") == {"select": {}}
+
+
+def test_key_depends_only_on_referenced_fragments(tmp_path):
+    user = tmp_path / "UserMapper.xml"
+    other = tmp_path / "OtherMapper.xml"
+    user.write_text(
+        '<mapper namespace="com.User"><select id="find">SELECT <include refid="com.Common.cols"/> FROM users</select></mapper>',
+        encoding="utf-8")
+
+    def key(common, unrelated):
+        other.write_text(
+            f'<mapper namespace="com.Common"><sql id="cols">{common}</sql><sql id="unused">{unrelated}</sql></mapper>',
+            encoding="utf-8")
+        index = FragmentIndex.from_files([str(user), str(other)])
+        return make_cache(tmp_path).make_key(str(user), index.dependency_digest(str(user)))
+
+    assert key("id, name", "a") == key("id, name", "b")
+    assert key("id, name", "a") != key("id, email", "a")
@@ -0,0 +1,46 @@
+import json
+from io_handler import save_to_csv, save_to_csv_stream
+
+DATA = {
+    "file1.xml": {
+        "select": {
+            "findAll": {
+                "USER_DATA": {
+                    "columns": ["id", "name"],
+                    "parameters": ["#{id}"],
+                    "condition": "id = #{id}",
+                    "source": ""
+                }
+            }
+        },
+        "insert": {"create": {}},
+        "sql": {"cols": "id, name"},
+    },
+    "file2.xml": {
+        "delete": {"deleteById": {"USER_DATA": {"columns": ["id"], "parameters": [], "condition": "", "source": ""}}},
+    },
+}
+
+
+def test_save_to_csv(tmp_path):
+    output_path = tmp_path / "out.csv"
+    save_to_csv(DATA, str(output_path))
+
+    lines = output_path.read_text(encoding="utf-8").splitlines()
+    assert lines == [
+        "ファイル名,タグ,ID,テーブル名,カラム名,条件式,条件の出典",
+        "file1.xml,select,findAll,USER_DATA,id,id = #{id},",
+        "file1.xml,select,findAll,USER_DATA,name,id = #{id},",
+        "file1.xml,select,findAll,USER_DATA,,id = #{id},",
+        "file1.xml,insert,create,,,,",
+        "file2.xml,delete,deleteById,USER_DATA,id,,",
+    ]
+
+
+def test_save_to_csv_stream_matches_save_to_csv(tmp_path):
+    save_to_csv(DATA, str(tmp_path / "batch.csv"))
+    save_to_csv_stream(iter(DATA.items()), str(tmp_path / "stream.csv"), str(tmp_path / "out.jsonl"))
+
+    assert (tmp_path / "stream.csv").read_bytes() == (tmp_path / "batch.csv").read_bytes()
+    records = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert records == [{name: tags} for name, tags in DATA.items()]
@@ -0,0 +1,38 @@
+import csv
+import glob
+import os
+import shutil
+import pytest
+from corpus_generator import generate_corpus
+from main import main
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input", "mybatis_xml")
+
+
+@pytest.fixture
+def mapper_dir(tmp_path):
+    directory = tmp_path / "mappers"
+    directory.mkdir()
+    for path in glob.glob(os.path.join(INPUT_DIR, "*.xml")):
+        shutil.copy(path, directory)
+    generate_corpus(str(directory), files=4, statements=10, join_depth=2, include_density=0.5, dynamic_density=0.5)
+    return directory
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_workers_output_matches_serial(mapper_dir, tmp_path, stream):
+    def run(workers):
+        output = tmp_path / f"out_{workers}.csv"
+        jsonl = tmp_path / f"out_{workers}.jsonl"
+        argv = ["--input", str(mapper_dir), "--output", str(output), "--jsonl-output", str(jsonl),
+                "--workers", str(workers), "--no-cache"]
+        main(argv + ["--stream"] if stream else argv)
+        return output.read_bytes(), jsonl.read_bytes() if stream else b""
+
+    serial = run(1)
+    assert run(3) == serial
+
+    # 出力は入力ファイル名の順（解析の完了順ではない）
+    with open(tmp_path / "out_1.csv", encoding="utf-8-sig") as f:
+        file_names = list(dict.fromkeys(row[0] for row in list(csv.reader(f))[1:]))
+    assert file_names == sorted(os.listdir(mapper_dir))
@@ -0,0 +1,222 @@
+import os
+import glob
+import xml.etree.ElementTree as ET
+import pytest
+from corpus_generator import generate_corpus, generate_mapper
+from fragments import FragmentIndex, IncludeCycleError
+from mapper_reader import iter_mapper_statements
+from parser import parse_sql, parse_mybatis_xml, set_engine
+
+
+def test_parse_sql_basic():
+    sql = "SELECT id, name FROM USER_DATA WHERE id = #{id} AND name = #{name}"
+    expected_output = {
+        "USER_DATA": {
+            "columns": ["id", "name"],
+            "parameters": ["#{id}", "#{name}"],
+            "condition": "id = #{id} AND name = #{name}",
+            "source": ""
+        }
+    }
+    assert parse_sql(sql) == expected_output
+
+
+def test_parse_sql_with_join():
+    sql = """SELECT u.id, m.name
+             FROM USER_DATA u
+             JOIN META_DATA m ON u.meta_id = m.id
+             WHERE u.id = #{id}"""
+    result = parse_sql(sql)
+    assert result["USER_DATA"]["columns"] == ["id", "meta_id"]
+    assert result["META_DATA"]["columns"] == ["name", "id"]
+    assert result["USER_DATA"]["condition"] == "u.id = #{id}"
+    assert result["META_DATA"]["parameters"] == ["#{id}"]
+
+
+def test_parse_sql_insert_update_delete():
+    insert = parse_sql("INSERT INTO users (name, email) VALUES (#{name}, #{email})")
+    assert insert["users"]["columns"] == ["name", "email"]
+    assert insert["users"]["parameters"] == ["#{name}", "#{email}"]
+
+    update = parse_sql("UPDATE users SET name = #{name} WHERE id = #{id}")
+    assert update["users"]["columns"] == ["name", "id"]
+    assert update["users"]["parameters"] == ["#{name}", "#{id}"]
+
+    delete = parse_sql("DELETE FROM users WHERE id = #{id}")
+    assert delete == {"users": {"columns": ["id"], "parameters": ["#{id}"], "condition": "id = #{id}", "source": ""}}
+
+
+def test_parse_sql_expands_nested_includes():
+    index = FragmentIndex()
+    index.add("com.User", "a", ET.fromstring("<sql id='a'>x, <include refid='b'/></sql>"))
+    index.add("com.User", "b", ET.fromstring("<sql id='b'>y</sql>"))
+    result = parse_sql('SELECT <include refid="a" /> FROM t WHERE z &lt; 1', index, "com.User")
+    assert result["t"]["columns"] == ["x", "y", "z"]
+
+
+def test_parse_sql_include_cycle():
+    index = FragmentIndex()
+    index.add("", "a", ET.fromstring('<sql id="a"><include refid="b" /></sql>'))
+    index.add("", "b", ET.fromstring('<sql id="b"><include refid="a" /></sql>'))
+    with pytest.raises(IncludeCycleError):
+        parse_sql('SELECT <include refid="a" /> FROM t', index)
+
+
+def test_fragment_index_cross_namespace(tmp_path):
+    (tmp_path / "common.xml").write_text(
+        '<mapper namespace="com.Common">'
+        '<sql id="cols">${alias}.id, <include refid="more"><property name="p" value="${alias}"/></include></sql>'
+        '<sql id="more">${p}.name</sql>'
+        '</mapper>', encoding="utf-8")
+    (tmp_path / "user.xml").write_text(
+        '<mapper namespace="com.User"><select id="find">SELECT '
+        '<include refid="com.Common.cols"><property name="alias" value="u"/></include>'
+        ' FROM users u</select></mapper>', encoding="utf-8")
+    index = FragmentIndex.from_files([str(tmp_path / "common.xml"), str(tmp_path / "user.xml")])
+
+    result = parse_mybatis_xml(str(tmp_path / "user.xml"), index)
+    assert result["select"]["find"]["users"]["columns"] == ["id", "name"]
+
+
+def test_generate_mapper_is_deterministic():
+    first = generate_mapper("com.Bench", statements=30, join_depth=3, seed=1)
+    assert first == generate_mapper("com.Bench", statements=30, join_depth=3, seed=1)
+    assert first != generate_mapper("com.Bench", statements=30, join_depth=3, seed=2)
+
+
+def test_generated_corpus_parses(tmp_path):
+    paths = generate_corpus(str(tmp_path), files=2, statements=10, join_depth=2, include_density=1.0)
+    index = FragmentIndex.from_files(paths)
+    for path in paths:
+        result = parse_mybatis_xml(path, index)
+        assert sum(len(result[tag]) for tag in ("select", "insert", "update", "delete")) == 10
+
+
+@pytest.mark.parametrize("engine", ["sqlparse", "sqlglot"])
+def test_subquery_aliases_are_scoped(engine):
+    if engine == "sqlglot":
+        pytest.importorskip("sqlglot")
+    set_engine(engine)
+    try:
+        shadowed = parse_sql("SELECT a.id FROM users a WHERE EXISTS (SELECT 1 FROM orders a WHERE a.total > #{min})")
+        correlated = parse_sql("SELECT u.id FROM users u WHERE u.id IN (SELECT o.user_id FROM orders o WHERE o.uid = u.id)")
+    finally:
+        set_engine("sqlparse")
+    assert {table: data["columns"] for table, data in shadowed.items()} == {"users": ["id"], "orders": ["total"]}
+    assert {table: data["columns"] for table, data in correlated.items()} == {"users": ["id"], "orders": ["user_id", "uid"]}
+
+
+@pytest.mark.parametrize("engine", ["sqlparse", "sqlglot"])
+def test_cte_names_resolve_to_base_tables(engine):
+    if engine == "sqlglot":
+        pytest.importorskip("sqlglot")
+    set_engine(engine)
+    try:
+        result = parse_sql("WITH c AS (SELECT id FROM users WHERE active = #{active}) SELECT c.id FROM c")
+    finally:
+        set_engine("sqlparse")
+    assert {table: (data["columns"], data["parameters"]) for table, data in result.items()} == \
+        {"users": (["id", "active"], ["#{active}"])}
+
+
+@pytest.mark.parametrize("engine", ["sqlparse", "sqlglot"])
+@pytest.mark.parametrize("sql, expected", [
+    # INSERT の対象テーブルはSELECT側のテーブルを付けないカラムの解決に使わない
+    ("INSERT INTO t (a, b) SELECT c, d FROM u", {"t": ["a", "b"], "u": ["c", "d"]}),
+    # サブクエリのテーブルを付けないカラムはサブクエリのテーブルのカラム
+    ("SELECT u.name FROM users u WHERE u.id IN (SELECT user_id FROM orders)",
+     {"users": ["name", "id"], "orders": ["user_id"]}),
+    # 導出テーブルのエイリアスはサブクエリのテーブル
+    ("SELECT x.id, o.total FROM (SELECT id FROM users) x JOIN orders o ON o.user_id = x.id",
+     {"users": ["id"], "orders": ["total", "user_id"]}),
+])
+def test_unqualified_columns_resolve_per_scope(engine, sql, expected):
+    if engine == "sqlglot":
+        pytest.importorskip("sqlglot")
+    set_engine(engine)
+    try:
+        result = parse_sql(sql)
+    finally:
+        set_engine("sqlparse")
+    assert {table: data["columns"] for table, data in result.items()} == expected
+
+
+def test_parse_mybatis_xml_resolves_fragment_defined_later(tmp_path):
+    path = tmp_path / "mapper.xml"
+    path.write_text(
+        '<mapper namespace="com.User">'
+        '<select id="find">SELECT <include refid="cols"/> FROM users</select>'
+        '<sql id="cols">id, name</sql>'
+        '</mapper>', encoding="utf-8")
+
+    result = parse_mybatis_xml(str(path))
+    assert result["sql"] == {"cols": "id, name"}
+    assert result["select"]["find"]["users"]["columns"] == ["id", "name"]
+
+
+def test_dynamic_sql_variants_are_capped_and_merged(tmp_path):
+    conditions = "".join(f'<if test="c{i} != null">AND c{i} = #{{c{i}}}</if>' for i in range(12))
+    path = tmp_path / "mapper.xml"
+    path.write_text(
+        f'<mapper namespace="com.User"><select id="search">SELECT id FROM users <where>{conditions}</where></select></mapper>',
+        encoding="utf-8")
+    index = FragmentIndex.from_files([str(path)], max_variants=8)
+
+    records = list(iter_mapper_statements(str(path), index))
+    assert len(records[0][2]) == 8
+
+    result = parse_mybatis_xml(str(path), index)
+    assert result["select"]["search"]["users"]["columns"] == ["id"] + [f"c{i}" for i in range(12)]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT u.id, m.name FROM USER_DATA u JOIN META_DATA m ON u.meta_id = m.id WHERE u.id = #{id}",
+    "INSERT INTO users (name, email) VALUES (#{name}, #{email})",
+    "UPDATE users SET name = #{name} WHERE id = #{id}",
+    "DELETE FROM users WHERE id = #{id}",
+    "SELECT id FROM users WHERE name = #{name} ORDER BY ${orderBy} ${direction} LIMIT #{limit}",
+    "SELECT row_number() OVER (PARTITION BY dept ORDER BY ${sort}) AS rn FROM users",
+    "SELECT ${columns} FROM ${table}",
+    "SELECT a FROM t JOIN u USING (id)",
+    "WITH c AS (SELECT id, name FROM users WHERE active = #{active}) SELECT c.id, name FROM c WHERE id = #{id}",
+    "WITH c AS (SELECT id FROM users), d AS (SELECT user_id FROM orders) SELECT c.id FROM c JOIN d ON d.user_id = c.id",
+    "MERGE INTO users u USING staging s ON u.id = s.id WHEN MATCHED AND s.flag = #{flag} THEN UPDATE SET name = s.name "
+    "WHEN NOT MATCHED THEN INSERT (id, name) VALUES (s.id, #{name})",
+])
+def test_sqlglot_engine_matches_sqlparse(sql):
+    pytest.importorskip("sqlglot")
+    expected = parse_sql(sql)
+    set_engine("sqlglot")
+    try:
+        result = parse_sql(sql)
+    finally:
+        set_engine("sqlparse")
+    assert {table: data["columns"] for table, data in result.items()} == \
+        {table: data["columns"] for table, data in expected.items()}
+    assert {table: data["parameters"] for table, data in result.items()} == \
+        {table: data["parameters"] for table, data in expected.items()}
+
+
+def test_sqlglot_engine_matches_sqlparse_over_corpus(tmp_path):
+    pytest.importorskip("sqlglot")
+    input_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input", "mybatis_xml")
+    paths = generate_corpus(str(tmp_path), files=2, statements=30, join_depth=2, include_density=0.5, dynamic_density=0.5)
+    paths += sorted(glob.glob(os.path.join(input_dir, "*.xml")))
+    index = FragmentIndex.from_files(paths)
+
+    def parse_all(engine):
+        set_engine(engine)
+        try:
+            return [parse_mybatis_xml(path, index) for path in paths]
+        finally:
+            set_engine("sqlparse")
+
+    def summary(results):
+        return [
+            {table: (data["columns"], data["parameters"]) for table, data in result[tag][tag_id].items()}
+            for result in results for tag in ("select", "insert", "update", "delete") for tag_id in result[tag]
+        ]
+
+    expected = summary(parse_all("sqlparse"))
+    assert any("${orderBy}" in parameters for statement in expected for _, parameters in statement.values())
+    assert summary(parse_all("sqlglot")) == expected
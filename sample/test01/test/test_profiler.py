@@ -0,0 +1,43 @@
+import json
+import profiler
+from parser import parse_mybatis_xml
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<mapper namespace="com.example.UserMapper">
+    <select id="findAll">SELECT id, name FROM USER_DATA WHERE id = #{id}</select>
+    <delete id="deleteById">DELETE FROM USER_DATA WHERE id = #{id}</delete>
+</mapper>
+"""
+
+
+def test_stage_is_noop_when_disabled(monkeypatch):
+    monkeypatch.setattr(profiler, "_enabled", False)
+    monkeypatch.setattr(profiler, "_stages", {})
+    with profiler.stage("sql_parse"):
+        pass
+    profiler.record_statement("select", "findAll", 1.0)
+    assert profiler.drain() == {"stages": {}, "files": {}, "statements": []}
+
+
+def test_profile_stages_files_and_slowest_statements(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "_enabled", False)
+    monkeypatch.setattr(profiler, "_top_n", profiler.top_n())
+    profiler.enable(top_n=1)
+    xml_path = tmp_path / "UserMapper.xml"
+    xml_path.write_text(XML, encoding="utf-8")
+    try:
+        parse_mybatis_xml(str(xml_path))
+        # ワーカープロセスから受け取った結果と同じように取り込めること
+        snapshot = profiler.drain()
+        profiler.merge(snapshot)
+        profiler.save(str(tmp_path / "profile.json"))
+    finally:
+        profiler.drain()
+        profiler.set_file(None)
+
+    profile = json.loads((tmp_path / "profile.json").read_text(encoding="utf-8"))
+    assert {"xml_read", "include_expansion"} <= set(profile["stages"])
+    assert profile["stages"]["include_expansion"]["calls"] == 2
+    assert list(profile["files"]) == ["UserMapper.xml"]
+    assert len(profile["slowest_statements"]) == 1
+    assert profile["slowest_statements"][0]["file"] == "UserMapper.xml"
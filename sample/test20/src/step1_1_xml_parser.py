@@ -1,5 +1,64 @@
 import xml.etree.ElementTree as ET
 import os
+import sys
+
+# MyBatis マッパーの読み込みは test01 の mapper_reader と共通のものを使う
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test01", "src"))
+from mapper_reader import STATEMENT_TAGS, iter_mapper_elements
+
+
+def iter_mapper_statements(file_path):
+    """
+    XMLを1回だけ走査し、SQL文を1件ずつ返します。
+    <include refid> が後に定義された <sql> を参照するSQL文は保留し、ファイルの最後まで読んでから展開します
+    （保留したSQL文より後のSQL文も、出力の順序を保つため一緒に保留します）。
+
+    Args:
+        file_path (str): 解析対象のXMLファイルのパス。
+
+    Yields:
+        tuple: (namespace, タグ名, id, SQL文)
+    """
+    fragments = {}
+    pending = []
+    for namespace, elem in iter_mapper_elements(file_path):
+        namespace = namespace or "N/A"
+        if elem.tag == "sql" and elem.attrib.get("id"):
+            fragments[elem.attrib["id"]] = elem
+        elif elem.tag in STATEMENT_TAGS:
+            if not pending:
+                missing = []
+                sql = element_text(elem, fragments, missing=missing)
+                if not missing:
+                    yield namespace, elem.tag, elem.attrib.get("id", "N/A"), sql.strip()
+                    continue
+            pending.append((namespace, elem))
+
+    for namespace, elem in pending:
+        yield namespace, elem.tag, elem.attrib.get("id", "N/A"), element_text(elem, fragments).strip()
+
+
+def element_text(element, fragments, stack=(), missing=None):
+    """
+    要素内のテキストを連結します。<include> は同じファイルの <sql> の内容に置き換えます。
+    missing を渡すと、見つからなかった refid を追加します。
+    """
+    parts = [element.text or ""]
+    for child in element:
+        if child.tag == "include":
+            refid = child.attrib.get("refid", "")
+            # namespace 付きの refid は末尾の id で探す
+            fragment = fragments.get(refid) or fragments.get(refid.rsplit(".", 1)[-1])
+            if fragment is None:
+                if missing is not None:
+                    missing.append(refid)
+            elif refid not in stack:
+                parts.append(element_text(fragment, fragments, stack + (refid,), missing).strip())
+        else:
+            parts.append(element_text(child, fragments, stack, missing))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
 
 def analyze_xml(file_path):
     """
@@ -12,26 +71,19 @@ def analyze_xml(file_path):
         list: 抽出結果のリスト。各エントリは辞書形式。
     """
     results = []
+    file_name = os.path.basename(file_path)  # ファイル名を取得
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        file_name = os.path.basename(file_path)  # ファイル名を取得
-
-        # <mapper> タグの namespace 属性を取得
-        namespace = root.attrib.get("namespace", "N/A")
-
         # MyBatis タグを解析
-        for element in root.findall(".//"):
-            if element.tag in {"select", "insert", "update", "delete"}:
-                tag_info = {
-                    "file_name": file_name,
-                    "namespace": namespace,  # namespace を追加
-                    "tag": element.tag,
-                    "id": element.attrib.get("id", "N/A"),
-                    "sql": "".join(element.itertext()).strip()
-                }
-                results.append(tag_info)
+        for namespace, tag, tag_id, sql in iter_mapper_statements(file_path):
+            tag_info = {
+                "file_name": file_name,
+                "namespace": namespace,  # namespace を追加
+                "tag": tag,
+                "id": tag_id,
+                "sql": sql
+            }
+            results.append(tag_info)
     except ET.ParseError as e:
         print(f"XML解析エラー: {file_path} - {e}")
 
-    return results
\ No newline at end of file
+    return results
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# src 配下のモジュールは各スクリプトと同じくフラットに import する
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,43 @@
+import csv
+import glob
+import os
+import pytest
+from step1_1_xml_parser import analyze_xml
+
+SAMPLE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("xml_path", sorted(glob.glob(os.path.join(SAMPLE_DIR, "sample_project", "xml", "*.xml"))))
+def test_sample_mappers_match_recorded_output(xml_path):
+    name = os.path.splitext(os.path.basename(xml_path))[0]
+    with open(os.path.join(SAMPLE_DIR, "output", "MyBatis", f"{name}.csv"), encoding="utf-8") as f:
+        expected = list(csv.DictReader(f))
+    assert analyze_xml(xml_path) == expected
+
+
+def test_include_is_expanded_in_document_order(tmp_path):
+    path = tmp_path / "mapper.xml"
+    path.write_text(
+        '<mapper namespace="com.User">'
+        '<sql id="where">WHERE id = #{id}</sql>'
+        '<select id="find">SELECT <include refid="cols"/> FROM users <include refid="com.User.where"/></select>'
+        '<delete id="remove">DELETE FROM users <include refid="where"/></delete>'
+        '<sql id="cols">id, <include refid="more"/></sql>'
+        '<sql id="more">name</sql>'
+        '<update id="touch">UPDATE users SET name = #{name} <include refid="missing"/></update>'
+        '</mapper>', encoding="utf-8")
+
+    # 後に定義された <sql> も展開し、出力はXMLの記述順のまま
+    assert [(row["namespace"], row["tag"], row["id"], row["sql"]) for row in analyze_xml(str(path))] == [
+        ("com.User", "select", "find", "SELECT id, name FROM users WHERE id = #{id}"),
+        ("com.User", "delete", "remove", "DELETE FROM users WHERE id = #{id}"),
+        ("com.User", "update", "touch", "UPDATE users SET name = #{name}"),
+    ]
+
+
+def test_mapper_without_namespace(tmp_path):
+    path = tmp_path / "mapper.xml"
+    path.write_text('<mapper><select id="all">SELECT * FROM users</select></mapper>', encoding="utf-8")
+    assert analyze_xml(str(path)) == [
+        {"file_name": "mapper.xml", "namespace": "N/A", "tag": "select", "id": "all", "sql": "SELECT * FROM users"},
+    ]
@@ -1,65 +1,187 @@
 # aggregate_csv.py
 
+import numpy as np
 import pandas as pd
 import os
 import sys
 import argparse
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+# 文字列列の型（pyarrow がある場合は分割・展開を pyarrow で行う型にする）
+STRING_DTYPE = pd.ArrowDtype(pa.string()) if pa is not None else 'string'
+
+# 集計に使う列（SQL列などの大きな列は読み込まない）
+AGGREGATE_COLUMNS = ['DML', 'Tables', 'Columns']
+
+# parse_sql_queries.py --format parquet / arrow の出力（pyarrow が必要）
+COLUMNAR_EXTENSIONS = ('.parquet', '.arrow')
+
 def read_all_csvs(csv_dir):
     """
     指定されたディレクトリ内の全てのCSVファイルを読み込み、DataFrameのリストを返します。
+    集計に使う 'DML', 'Tables', 'Columns' 列だけを文字列型で読み込みます。
+    pyarrow がある場合は Parquet / Arrow ファイルも読み込みます。これらの 'Tables', 'Columns' はリスト型の列です。
     """
-    csv_files = [f for f in os.listdir(csv_dir) if f.endswith('.csv')]
+    extensions = ('.csv',) + (COLUMNAR_EXTENSIONS if pa is not None else ())
+    # 集計結果の同数の並びが実行ごとに変わらないよう、ファイル名順に読み込む
+    csv_files = sorted(f for f in os.listdir(csv_dir) if f.endswith(extensions))
+    engine = 'pyarrow' if pa is not None else 'c'
     dataframes = []
     for csv_file in csv_files:
         path = os.path.join(csv_dir, csv_file)
-        df = pd.read_csv(path)
+        if csv_file.endswith('.parquet'):
+            df = pq.read_table(path, columns=AGGREGATE_COLUMNS).to_pandas(types_mapper=pd.ArrowDtype)
+        elif csv_file.endswith('.arrow'):
+            df = feather.read_table(path, columns=AGGREGATE_COLUMNS).to_pandas(types_mapper=pd.ArrowDtype)
+        else:
+            df = pd.read_csv(path, usecols=AGGREGATE_COLUMNS, dtype=STRING_DTYPE, engine=engine)
         dataframes.append(df)
     return dataframes
 
+def is_list_column(values):
+    """
+    Parquet / Arrow から読み込んだリスト型の列かどうかを返します。
+    """
+    return isinstance(values.dtype, pd.ArrowDtype) and pa.types.is_list(values.dtype.pyarrow_dtype)
+
+def count_distinct_values(values):
+    """
+    値ごとの出現回数を {'value': 値, 'count': 回数} のDataFrameで返します。
+    欠損値は除き、値は最初に出現した順に並べます。
+    同じ値の行は多いため、以降の分割・展開は異なる値ごとに1回だけ行います。
+    """
+    counts = values.dropna().value_counts(sort=False)
+    return pd.DataFrame({'value': counts.index.to_series(index=range(len(counts))), 'count': counts.to_numpy()})
+
+def table_occurrences(df):
+    """
+    1つのDataFrameのテーブルの出現を {'table': テーブル名, 'count': 回数} のDataFrameで返します（同じテーブルが複数行になることがあります）。
+    """
+    if is_list_column(df['Tables']):
+        tables = df['Tables'].explode().dropna()
+        return pd.DataFrame({'table': tables.to_numpy(), 'count': 1})
+    if pa is not None:
+        values, counts = arrow_value_counts(df['Tables'])
+        items = pc.split_pattern(values, ';')
+        tables, counts = sum_by_value(pc.list_flatten(items), counts[pc.list_parent_indices(items).to_numpy()])
+        return pd.DataFrame({'table': pd.array(tables, dtype=STRING_DTYPE), 'count': counts})
+    tables = count_distinct_values(df['Tables'])
+    tables['value'] = tables['value'].str.split(';')
+    return tables.explode('value').rename(columns={'value': 'table'})
+
+def column_occurrences(df):
+    """
+    1つのDataFrameのカラムの出現を {'key': "テーブル.カラム", 'count': 回数} のDataFrameで返します（同じキーが複数行になることがあります）。
+    """
+    if is_list_column(df['Columns']):
+        pairs = df['Columns'].explode().dropna()
+        keys = pairs.struct.field('table') + '.' + pairs.struct.field('column')
+        return pd.DataFrame({'key': keys.to_numpy(), 'count': 1})
+    if pa is not None:
+        return split_column_values(*arrow_value_counts(df['Columns']))
+    columns = count_distinct_values(df['Columns'])
+    columns['value'] = columns['value'].str.split(';')
+    columns = columns.explode('value')
+    # "table:c1,c2" の最初の ':' で1回だけ分割し、前がテーブル名、後ろがカラムのリスト
+    parts = columns['value'].str.split(':', n=1, expand=True)
+    if parts.shape[1] < 2:
+        return pd.DataFrame({'key': pd.Series(dtype=object), 'count': pd.Series(dtype='int64')})
+    columns = pd.DataFrame({'table': parts[0], 'column': parts[1].str.split(','), 'count': columns['count']})
+    columns = columns.dropna(subset=['column']).explode('column')
+    return pd.DataFrame({'key': (columns['table'] + '.' + columns['column']).to_numpy(), 'count': columns['count'].to_numpy()})
+
+def arrow_value_counts(values):
+    """
+    文字列の列の値ごとの出現回数を (異なる値の pyarrow 配列, 回数の numpy 配列) で返します。欠損値は除きます。
+    同じ値の行は多いため、以降の分割は異なる値ごとに1回だけ行います。
+    """
+    counts = pc.value_counts(pa.array(values.dropna(), type=pa.string()))
+    return counts.field('values'), counts.field('counts').to_numpy()
+
+def sum_by_value(values, counts):
+    """
+    pyarrow 配列 values の値ごとに counts を合計し、(異なる値の pyarrow 配列, 合計の numpy 配列) で返します。
+    値を辞書エンコードした番号ごとに numpy で合計するため、文字列のままグループ化しません。
+    """
+    encoded = pc.dictionary_encode(values)
+    sums = np.bincount(encoded.indices.to_numpy(), weights=counts, minlength=len(encoded.dictionary))
+    return encoded.dictionary, sums.astype('int64')
+
+def split_column_values(values, counts):
+    """
+    "table:c1,c2;..." の異なる値の配列を pyarrow.compute で分割し、{'key': "テーブル.カラム", 'count': 回数} のDataFrameで返します。
+    counts は values の各値の出現回数です。分割後の各要素は list_parent_indices で元の値の回数を引き継ぎます。
+    テーブル名とカラム名をそれぞれ辞書エンコードし、(テーブル番号, カラム番号) の組ごとに回数を合計してから、
+    異なる組だけ "テーブル.カラム" の文字列にします。
+    """
+    items = pc.split_pattern(values, ';')
+    counts = counts[pc.list_parent_indices(items).to_numpy()]
+    pairs = pc.split_pattern(pc.list_flatten(items), ':', max_splits=1)
+    # ':' を含まない要素は除く
+    has_columns = pc.greater(pc.list_value_length(pairs), 1)
+    pairs = pairs.filter(has_columns)
+    counts = counts[has_columns.to_numpy(zero_copy_only=False)]
+    columns = pc.split_pattern(pc.list_element(pairs, 1), ',')
+    parents = pc.list_parent_indices(columns).to_numpy()
+    tables = pc.dictionary_encode(pc.list_element(pairs, 0))
+    names = pc.dictionary_encode(pc.list_flatten(columns))
+    n_names = len(names.dictionary)
+    codes = tables.indices.to_numpy().astype('int64')[parents] * n_names + names.indices.to_numpy()
+    counts = counts[parents]
+    n_codes = len(tables.dictionary) * n_names
+    if n_codes <= max(len(codes), 1 << 20):
+        # 組の番号の範囲が狭ければ、番号をそのまま添字にして合計する
+        sums = np.bincount(codes, weights=counts, minlength=n_codes)
+        codes = np.flatnonzero(sums)
+        counts = sums[codes].astype('int64')
+    else:
+        codes, counts = sum_by_value(pa.array(codes), counts)
+        codes = codes.to_numpy()
+    keys = pc.binary_join_element_wise(
+        tables.dictionary.take(codes // n_names), names.dictionary.take(codes % n_names), '.')
+    return pd.DataFrame({'key': pd.array(keys, dtype=STRING_DTYPE), 'count': counts})
+
 def aggregate_dml(dataframes):
     """
     全てのDataFrameからDML操作の統計を集計します。
     """
-    all_dml = []
-    for df in dataframes:
-        all_dml.extend(df['DML'].dropna().tolist())
-    dml_counts = pd.Series(all_dml).value_counts().reset_index()
-    dml_counts.columns = ['DML', 'Count']
-    return dml_counts
+    all_dml = pd.concat([df['DML'] for df in dataframes], ignore_index=True).dropna().astype(object)
+    dml_counts = all_dml.value_counts(sort=False)
+    return usage_dataframe(dml_counts.index, dml_counts.to_numpy(), 'DML', 'Count')
 
 def aggregate_tables(dataframes):
     """
     全てのDataFrameからテーブル使用状況を集計します。
+    'Tables' 列の "t1;t2"（またはテーブル名のリスト）を展開し、テーブルごとに出現回数を合計します。
     """
-    table_usage = {}
-    for df in dataframes:
-        for tables in df['Tables'].dropna().tolist():
-            table_list = tables.split(';')
-            for table in table_list:
-                table_usage[table] = table_usage.get(table, 0) + 1
-    table_usage_df = pd.DataFrame(list(table_usage.items()), columns=['Table', 'Usage_Count'])
-    table_usage_df = table_usage_df.sort_values(by='Usage_Count', ascending=False)
-    return table_usage_df
+    tables = pd.concat([table_occurrences(df) for df in dataframes], ignore_index=True)
+    table_usage = tables.groupby('table', sort=False)['count'].sum()
+    return usage_dataframe(table_usage.index.astype(object), table_usage.to_numpy(), 'Table')
 
 def aggregate_columns(dataframes):
     """
     全てのDataFrameからカラム使用状況を集計します。
+    'Columns' 列の "table:c1,c2;..."（または {table, column} のリスト）を展開し、"テーブル.カラム" ごとに出現回数を合計します。
+    """
+    columns = pd.concat([column_occurrences(df) for df in dataframes], ignore_index=True)
+    column_usage = columns.groupby('key', sort=False)['count'].sum()
+    return usage_dataframe(column_usage.index.astype(object), column_usage.to_numpy(), 'Table.Column')
+
+def usage_dataframe(names, counts, label, count_label='Usage_Count'):
+    """
+    名前と使用回数から、使用回数の多い順の {label, count_label} のDataFrameを作成します。
+    使用回数が同じ名前は名前の昇順に並べるため、ファイルの読み込み順・集計方法によらず同じ結果になります。
     """
-    column_usage = {}
-    for df in dataframes:
-        for columns in df['Columns'].dropna().tolist():
-            table_columns = columns.split(';')
-            for table_col in table_columns:
-                if ':' in table_col:
-                    table, cols = table_col.split(':', 1)
-                    col_list = cols.split(',')
-                    for col in col_list:
-                        key = f"{table}.{col}"
-                        column_usage[key] = column_usage.get(key, 0) + 1
-    column_usage_df = pd.DataFrame(list(column_usage.items()), columns=['Table.Column', 'Usage_Count'])
-    column_usage_df = column_usage_df.sort_values(by='Usage_Count', ascending=False)
-    return column_usage_df
+    usage_df = pd.DataFrame({label: names, count_label: counts})
+    usage_df = usage_df.sort_values(by=[count_label, label], ascending=[False, True], ignore_index=True)
+    return usage_df
 
 def save_aggregated_data(dml_df, tables_df, columns_df, output_dir='aggregated_results'):
     """
@@ -84,7 +206,7 @@ def main(csv_dir, output_dir='aggregated_results'):
     # 全てのCSVファイルを読み込む
     dataframes = read_all_csvs(csv_dir)
     if not dataframes:
-        print(f"No CSV files found in directory '{csv_dir}'.")
+        print(f"No parsed result files found in directory '{csv_dir}'.")
         sys.exit(1)
     
     # DML操作の集計
@@ -101,7 +223,7 @@ def main(csv_dir, output_dir='aggregated_results'):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Aggregate parsed SQL CSV files and generate summary reports.")
-    parser.add_argument('parsed_csv_directory', help="Path to the directory containing parsed CSV files.")
+    parser.add_argument('parsed_csv_directory', help="Path to the directory containing parsed CSV (or Parquet/Arrow) files.")
     parser.add_argument('--output', default='aggregated_results', help="Output directory for aggregated CSV files.")
     
     args = parser.parse_args()
@@ -5,73 +5,184 @@ from sqlglot import parse_one, exp
 import sys
 import os
 import json
+import hashlib
 import argparse
+from schema_catalog import save_schema_catalog
+from sql_splitter import CHUNK_SIZE, collapse_literal_lists, iter_sql_statements
+
+# マニフェストの形式・DDL解析処理を変更した場合に上げる（古いマニフェストは使わずに全ファイルを解析し直す）
+MANIFEST_VERSION = 3
 
 def read_sql_file(file_path):
     """
-    SQLファイルを読み込み、sqlglot.parseを使用してSQL文のリストを返します。
-    コメント行（-- で始まる行）は無視します。
+    SQLファイルを1文ずつ読み込み、sqlglot.parseで解析したSQL文を返すジェネレーターです。
+    コメント（-- と /* */）は無視し、初期データの INSERT などの長いリテラルの並びは1つにまとめてから解析します。
+    解析に失敗した文はエラーを表示して読み飛ばします。
     """
     if not os.path.isfile(file_path):
         print(f"Error: ファイル '{file_path}' が存在しません。")
-        return []
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # コメントを削除
-    lines = content.splitlines()
-    lines = [line for line in lines if not line.strip().startswith('--')]
-    content = '\n'.join(lines)
+        return
     
-    # sqlglot.parseを使用してステートメントを解析
-    try:
-        statements = sqlglot.parse(content, read='postgres')
-    except Exception as e:
-        print(f"Error parsing SQL file '{file_path}': {e}")
-        statements = []
-    
-    return statements
+    for offset, sql in iter_sql_statements(file_path):
+        try:
+            statements = sqlglot.parse(collapse_literal_lists(sql), read='postgres')
+        except Exception as e:
+            print(f"Error parsing SQL file '{file_path}' at byte {offset}: {e}")
+            continue
+        for statement in statements:
+            if statement is not None:
+                yield statement
+
+def file_digest(file_path):
+    """
+    ファイルの内容のSHA-256ハッシュ値をチャンク単位で読み込んで求めます。
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 def parse_ddl(statements):
     """
     DDL文を解析し、スキーマ情報を構築します。
     スキーマ情報は {テーブル名またはビュー名: [カラム名1, カラム名2, ...], ...} の形式で辞書として保持されます。
+    カラムリストのないビューは、同じ statements 内のテーブル・ビューを使って解決します。
+    """
+    schema, views = collect_ddl(statements)
+    return resolve_views(schema, views)
+
+def collect_ddl(statements):
+    """
+    DDL文からテーブル・ビューの定義を集めます。
+    戻り値は (スキーマ情報, カラム未解決のビュー) で、カラムリストのないビュー（CREATE TABLE ... AS SELECT を含む）は
+    スキーマ情報に None で登録し、{ビュー名: SELECT文の構文木} に加えます。
     """
     schema = {}
+    views = {}
     for tree in statements:
+        if not isinstance(tree, exp.Create):
+            continue
+        kind = (tree.args.get('kind') or '').upper()
+        if kind not in ('TABLE', 'VIEW'):
+            continue
+        # カラム定義・カラムリスト付きの場合、対象は Schema(テーブル, [カラム, ...]) になる
+        target = tree.this
+        definitions = []
+        if isinstance(target, exp.Schema):
+            definitions = target.expressions
+            target = target.this
+        name = target.name
+        views.pop(name, None)
+        
         # CREATE TABLE の処理
-        if isinstance(tree, exp.Create) and tree.args.get('kind') == 'table':
-            table_name = tree.this.name
+        if kind == 'TABLE' and definitions:
             columns = []
-            for column in tree.expressions:
+            for column in definitions:
                 if isinstance(column, exp.ColumnDef):
                     col_name = column.this.name
                     columns.append(col_name)
-            schema[table_name] = columns
+            schema[name] = columns
         
-        # CREATE VIEW の処理
-        elif isinstance(tree, exp.Create) and tree.args.get('kind') == 'view':
-            view_name = tree.this.name
-            columns = []
-            
-            # カラムリストが指定されている場合
-            if tree.args.get('columns'):
-                for col in tree.args['columns']:
-                    columns.append(col.name)
-            else:
-                # カラムリストが指定されていない場合、ビューのSELECT文を解析してカラム名を取得
-                select = tree.args.get('expression')
-                if select:
-                    for alias in select.find_all(exp.Alias):
-                        columns.append(alias.alias_or_name)
-                    # Aliasがない場合もカラム名を取得
-                    for column in select.find_all(exp.Column):
-                        if not any(alias.this == column for alias in select.find_all(exp.Alias)):
-                            columns.append(column.name)
-            schema[view_name] = columns
+        # CREATE VIEW でカラムリストが指定されている場合
+        elif definitions:
+            schema[name] = [col.name for col in definitions]
+        
+        # カラムリストが指定されていない場合、SELECT文の出力カラムを後で解決する
+        elif tree.args.get('expression'):
+            schema[name] = None
+            views[name] = tree.args['expression']
+        else:
+            schema[name] = []
+    return schema, views
+
+def resolve_views(schema, views):
+    """
+    カラム未解決のビューのカラムを求め、schema に設定して返します。
+    ビューが参照するテーブル・ビューを先に解決する順（トポロジカル順）で処理し、
+    解決済みのビューは schema に保持して再利用するため、各ビューのSELECT文は1回だけ処理します。
+    """
+    resolving = set()
+    
+    def lookup(name):
+        columns = schema.get(name)
+        if columns is not None or name not in views:
+            return columns
+        if name in resolving:
+            print(f"Warning: circular view dependency on '{name}'.")
+            return None
+        resolving.add(name)
+        columns = select_output_columns(views[name], lookup)
+        resolving.discard(name)
+        schema[name] = columns
+        return columns
+    
+    for name in views:
+        lookup(name)
+    # 循環参照などで解決できなかったビュー
+    for name, columns in schema.items():
+        if columns is None:
+            schema[name] = []
     return schema
 
+def select_output_columns(query, lookup):
+    """
+    SELECT文の出力カラム名のリストを返します。lookup(名前) はテーブル・ビューのカラムのリスト（不明な場合は None）を返す関数です。
+    SELECT句の各項目を1回だけ見て、別名があれば別名、カラムであればカラム名を使い、
+    * と テーブル.* は FROM句・JOIN句のテーブル・ビュー・サブクエリ・CTEのカラムに展開します。
+    出力カラムは項目ごとに1つで、式が参照するだけのカラム（a + b AS total の a, b など）は含めません。
+    別名のない式（upper(name) など）は名前が決まらないため出力カラムにしません。
+    UNION などの集合演算は左端のSELECT文のカラム名になります。
+    """
+    ctes = {}
+    while True:
+        # WITH句は集合演算の外側に付くこともあるため、左端のSELECT文に降りるまでに集める
+        for cte in getattr(query, 'ctes', None) or []:
+            ctes[cte.alias] = cte.this
+        if isinstance(query, exp.SetOperation):
+            query = query.this
+        elif isinstance(query, exp.Subquery):
+            query = query.this
+        else:
+            break
+    if not isinstance(query, exp.Select):
+        return []
+    
+    cte_columns = {}
+    
+    def scoped_lookup(name):
+        # CTEはテーブル・ビューより優先し、1回だけ解決する
+        if name in ctes:
+            if name not in cte_columns:
+                cte_columns[name] = None
+                cte_columns[name] = select_output_columns(ctes.pop(name), scoped_lookup)
+            return cte_columns[name]
+        if name in cte_columns:
+            return cte_columns[name]
+        return lookup(name)
+    
+    # FROM句・JOIN句の {エイリアス: カラムのリスト}（* の展開順を保つため出現順）
+    sources = {}
+    from_clause = query.args.get('from_') or query.args.get('from')
+    source_nodes = [from_clause.this] if from_clause else []
+    source_nodes += [join.this for join in query.args.get('joins') or []]
+    for source in source_nodes:
+        if isinstance(source, exp.Table):
+            sources[source.alias_or_name] = scoped_lookup(source.name)
+        elif isinstance(source, exp.Subquery):
+            sources[source.alias] = select_output_columns(source.this, scoped_lookup)
+    
+    columns = []
+    for projection in query.expressions:
+        if isinstance(projection, exp.Star):
+            for source_columns in sources.values():
+                columns.extend(source_columns or [])
+        elif isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star):
+            columns.extend(sources.get(projection.table) or [])
+        elif projection.alias_or_name:
+            columns.append(projection.alias_or_name)
+    return columns
+
 def save_schema_to_json(schema, output_file='schema.json'):
     """
     スキーマ情報をJSONファイルに保存します。
@@ -80,35 +191,137 @@ def save_schema_to_json(schema, output_file='schema.json'):
         json.dump(schema, f, ensure_ascii=False, indent=4)
     print(f"Schema information saved to '{output_file}'.")
 
-def main(ddl_dir, output_file='schema.json'):
+def load_manifest(manifest_file):
+    """
+    前回実行時のマニフェストを読み込み、{ファイル名: {'sha256': ハッシュ値, 'schema': スキーマ情報}} を返します。
+    存在しない・形式が異なる場合は空の辞書を返します（全ファイルを解析し直す）。
+    """
+    if not manifest_file or not os.path.isfile(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: マニフェスト '{manifest_file}' を読み込めません: {e}")
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+def save_manifest(files, manifest_file):
+    """
+    ファイルごとのハッシュ値とスキーマ情報をマニフェストとして保存します。
+    """
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': files}, f, ensure_ascii=False, indent=1)
+
+def collect_file_schemas(ddl_dir, ddl_names, previous_files):
+    """
+    DDLファイルごとのスキーマ情報を {ファイル名: {'sha256': ハッシュ値, 'schema': スキーマ情報, 'views': カラム未解決のビュー}} で返します。
+    カラム未解決のビューは他のファイルのテーブルを参照することがあるため、{ビュー名: SELECT文} で保持して統合後に解決します。
+    内容のハッシュ値が前回と同じファイルは解析せず、マニフェストのスキーマ情報を使います。
+    """
+    files = {}
+    for name in ddl_names:
+        ddl_file = os.path.join(ddl_dir, name)
+        digest = file_digest(ddl_file)
+        previous = previous_files.get(name)
+        if previous and previous.get('sha256') == digest:
+            print(f"\nUnchanged DDL file: {ddl_file}")
+            files[name] = previous
+            continue
+        
+        print(f"\nProcessing DDL file: {ddl_file}")
+        ddl_statements = read_sql_file(ddl_file)
+        schema, views = collect_ddl(ddl_statements)
+        files[name] = {
+            'sha256': digest,
+            'schema': schema,
+            'views': {view: select.sql(dialect='postgres') for view, select in views.items()},
+        }
+    return files
+
+def merge_file_schemas(files):
+    """
+    ファイルごとのスキーマ情報をファイル名順に統合し、カラムリストのないビューを統合後のスキーマ情報で解決します。
+    同じテーブル・ビューが複数のファイルで定義されている場合は後のファイルの定義を使い、
+    (テーブル名, 採用したファイル名, 上書きされたファイル名のリスト) を再定義として返します。
+    戻り値は (統合したスキーマ情報, 再定義のリスト) です。
+    """
+    all_schema = {}
+    views = {}
+    defined_in = {}
+    for name in sorted(files):
+        file_views = files[name].get('views', {})
+        for table, columns in files[name]['schema'].items():
+            all_schema[table] = columns
+            if columns is None:
+                views[table] = parse_one(file_views[table], read='postgres')
+            else:
+                views.pop(table, None)
+            defined_in.setdefault(table, []).append(name)
+    resolve_views(all_schema, views)
+    redefinitions = [
+        (table, names[-1], names[:-1])
+        for table, names in sorted(defined_in.items())
+        if len(names) > 1
+    ]
+    return all_schema, redefinitions
+
+def build_merged_schema(ddl_dir, ddl_names, manifest_file=None, incremental=True):
+    """
+    DDLファイルを解析・統合し、(統合したスキーマ情報, ファイルごとのスキーマ情報) を返します。
+    マニフェストがある場合は前回から変更・追加されたファイルだけを解析し、残りはマニフェストの結果を使います。
+    削除されたファイルで統合後のスキーマから外れたテーブルと、複数のファイルで定義されたテーブルを表示します。
+    parse_ddl.py と pipeline.py のどちらもこの関数でスキーマ情報を作成します。
+    """
+    previous_files = load_manifest(manifest_file) if incremental else {}
+    files = collect_file_schemas(ddl_dir, ddl_names, previous_files)
+    all_schema, redefinitions = merge_file_schemas(files)
+    
+    # 削除されたファイルのテーブルのうち、他のファイルでも定義されていないものだけが統合後のスキーマから外れる
+    for name in sorted(set(previous_files) - set(files)):
+        dropped = [table for table in previous_files[name].get('schema', {}) if table not in all_schema]
+        print(f"\nRemoved DDL file: {name} (dropped: {', '.join(dropped) or '-'})")
+    
+    for table, name, overridden in redefinitions:
+        print(f"Warning: '{table}' is defined in {', '.join(overridden + [name])}; using the definition in {name}.")
+    return all_schema, files
+
+def main(ddl_dir, output_file='schema.json', catalog_file=None, manifest_file=None, incremental=True):
     if not os.path.isdir(ddl_dir):
         print(f"Error: ディレクトリ '{ddl_dir}' が存在しません。")
         sys.exit(1)
     
     # ディレクトリ内の全てのSQLファイルを取得
-    ddl_files = [os.path.join(ddl_dir, f) for f in os.listdir(ddl_dir) if f.endswith('.sql')]
+    ddl_names = sorted(f for f in os.listdir(ddl_dir) if f.endswith('.sql'))
     
-    if not ddl_files:
+    if not ddl_names:
         print(f"No SQL files found in directory '{ddl_dir}'.")
         sys.exit(1)
     
-    all_schema = {}
-    for ddl_file in ddl_files:
-        print(f"\nProcessing DDL file: {ddl_file}")
-        ddl_statements = read_sql_file(ddl_file)
-        schema_info = parse_ddl(ddl_statements)
-        all_schema.update(schema_info)
+    # 前回から変更・追加されたファイルだけを解析し、残りはマニフェストの結果を使う
+    if manifest_file is None:
+        manifest_file = os.path.splitext(output_file)[0] + '.manifest.json'
+    all_schema, files = build_merged_schema(ddl_dir, ddl_names, manifest_file, incremental)
     
     print("\n--- Consolidated Schema Information ---")
     for name, columns in all_schema.items():
         print(f"{name}: {columns}")
     
     save_schema_to_json(all_schema, output_file)
+    if catalog_file:
+        # parse_sql_queries.py で高速に読み込めるバイナリカタログも出力する
+        save_schema_catalog(all_schema, catalog_file)
+    save_manifest(files, manifest_file)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Parse DDL files and extract schema information.")
     parser.add_argument('ddl_directory', help="Path to the directory containing DDL (.sql) files.")
     parser.add_argument('--output', default='schema.json', help="Output JSON file for schema information.")
+    parser.add_argument('--catalog', help="Output binary catalog file for fast loading in parse_sql_queries.py.")
+    parser.add_argument('--manifest', help="Manifest file of per-file hashes and schemas (default: <output>.manifest.json).")
+    parser.add_argument('--full', action='store_true', help="Re-parse all DDL files, ignoring the manifest.")
     
     args = parser.parse_args()
-    main(args.ddl_directory, args.output)
+    main(args.ddl_directory, args.output, args.catalog, args.manifest, not args.full)
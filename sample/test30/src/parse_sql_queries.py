@@ -2,133 +2,447 @@
 
 import sqlglot
 from sqlglot import parse_one, exp
+from sqlglot.dialects.dialect import Dialect
 import sys
 import os
+import re
 import json
 import csv
 import pandas as pd
 import argparse
+from collections import ChainMap
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from schema_catalog import build_column_index, is_schema_catalog, load_schema_catalog
+from sql_splitter import collapse_literal_lists, iter_sql_statements
+from supervised_parser import SupervisedParser
 
-def read_sql_file(file_path):
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+# 出力形式ごとの拡張子（parquet / arrow は pyarrow が必要）
+OUTPUT_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+# 解析できなかったSQL文の一覧のファイル名
+QUARANTINE_REPORT = 'quarantine.json'
+
+# 解析できなかったSQL文のトークン（文字列・引用符付きの識別子・ドル引用・単語・記号）
+_FALLBACK_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\$(\w*)\$.*?\$\1\$|[^\W\d][\w$]*|\d[\w.]*|\S", re.S)
+# テーブル名として扱わない単語
+_FALLBACK_NON_NAMES = {'SELECT', 'SET', 'VALUES', 'WITH', 'WHERE', 'DEFAULT'}
+
+# ワーカープロセスで共有するスキーマ情報と逆引き索引（初期化時に1回だけ受け取り、以降は変更しない）
+_schema_info = None
+_column_index = None
+# 1文ごとの解析の予算（秒・バイト）と、予算がある場合に解析を実行する監視付きワーカー（プロセスごとに1つ）
+_statement_timeout = None
+_statement_memory = None
+_supervised_parser = None
+
+def read_sql_file(file_path, errors=None, dialect='postgres', parser=None):
     """
-    SQLファイルを読み込み、sqlglot.parseを使用してSQL文のリストを返します。
-    コメント行（-- で始まる行）は無視します。
+    SQLファイルを1文ずつ読み込み、(文の先頭のバイト位置, 元のSQL文, 構文木, エラーメッセージ) を返すジェネレーターです。
+    parser（SupervisedParser）を渡すと、解析と抽出を監視付きのワーカープロセスで行い、構文木の代わりに抽出済みの結果を返します。
+    元のSQL文はファイル中のテキストからコメント（-- と /* */）を除いたもので、構文木から再生成はしません。
+    長いリテラルの並び（大量の VALUES の行・IN の値）は collapse_literal_lists() で1つにまとめ、件数をコメントで残します。
+    ファイル全体は読み込まず、文を切り出すたびにその文だけを解析して返します。
+    解析できない文は構文木を None、エラーメッセージを設定して返し、以降の文の解析を続けます。
+    errors を渡すと、ファイルの読み込みに失敗した場合のエラーメッセージを追加し、以降の文は返しません。
     """
     if not os.path.isfile(file_path):
         print(f"Error: ファイル '{file_path}' が存在しません。")
-        return []
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # コメントを削除
-    lines = content.splitlines()
-    lines = [line for line in lines if not line.strip().startswith('--')]
-    content = '\n'.join(lines)
+        return
     
-    # sqlglot.parseを使用してステートメントを解析
+    dialect = Dialect.get_or_raise(dialect)
+    offset = 0
     try:
-        statements = sqlglot.parse(content, read='postgres')
+        for offset, sql in iter_sql_statements(file_path):
+            # 長いリテラルの並びは1つにまとめてから解析する（テーブル・カラムの抽出には影響しない）
+            sql = collapse_literal_lists(sql)
+            if parser is not None:
+                # 時間・メモリの予算を超えた文はワーカープロセスごと打ち切り、エラーとして返す
+                extracted, error = parser.run(sql)
+                if error:
+                    yield offset, sql, None, error
+                for parsed in extracted or []:
+                    yield offset, sql, parsed, None
+                continue
+            try:
+                trees = [tree for tree in dialect.parse(sql) if tree is not None]
+            except Exception as e:
+                # エラーメッセージの2行目以降は強調表示付きのSQLのため、1行目だけを使う
+                yield offset, sql, None, f"{type(e).__name__}: {str(e).splitlines()[0]}"
+                continue
+            for tree in trees:
+                yield offset, sql, tree, None
     except Exception as e:
-        print(f"Error parsing SQL file '{file_path}': {e}")
-        statements = []
-    
-    return statements
+        print(f"Error reading SQL file '{file_path}' at byte {offset}: {e}")
+        if errors is not None:
+            errors.append(f"{type(e).__name__}: {e}")
+
+def fallback_extract(sql):
+    """
+    解析できなかったSQL文から、トークンだけを見てDMLとテーブル名を抽出します。
+    FROM・JOIN（SELECT・DELETE と同じ括弧の中にあるもの）、INTO、UPDATE の直後の名前をテーブル名とし、
+    FROM a, b のようなカンマ区切りのテーブルも抽出します。カラムは抽出しません。
+    戻り値は parse_sql() と同じ形式の辞書です。
+    """
+    tokens = [m.group() for m in _FALLBACK_TOKEN.finditer(sql)]
+    dml = 'UNKNOWN'
+    tables = set()
+    # 括弧の深さごとに SELECT・DELETE が現れたか（EXTRACT(YEAR FROM d) などの FROM を除くため）
+    queries = [True]
+    i = 0
+    while i < len(tokens):
+        word = tokens[i].upper()
+        i += 1
+        if word == '(':
+            queries.append(False)
+        elif word == ')':
+            if len(queries) > 1:
+                queries.pop()
+        elif word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            # DMLは文の先頭の単語（WITH句の場合は括弧の外の最初のDML）
+            if dml == 'UNKNOWN' and len(queries) == 1 and (i == 1 or tokens[0].upper() == 'WITH'):
+                dml = word
+            if word in ('SELECT', 'DELETE'):
+                queries[-1] = True
+        if word in ('INTO', 'UPDATE') or word in ('FROM', 'JOIN') and queries[-1]:
+            i = read_fallback_tables(tokens, i, tables, word == 'FROM')
+    return {'DML': dml, 'Tables': sorted(tables), 'Columns': {}}
+
+def read_fallback_tables(tokens, i, tables, allow_list=False):
+    """
+    tokens[i] から始まるテーブル名（スキーマ名付きを含む）を tables に加え、読み終えた位置を返します。
+    allow_list が True の場合は、エイリアスを読み飛ばしてカンマ区切りの次のテーブル名も読みます。
+    """
+    while i < len(tokens):
+        if tokens[i].upper() in ('ONLY', 'LATERAL', 'TABLE'):
+            i += 1
+        name = None
+        while i < len(tokens) and _is_fallback_name(tokens[i]):
+            name = tokens[i].strip('"`')
+            if tokens[i + 1:i + 2] != ['.']:
+                i += 1
+                break
+            i += 2
+        if name is None:
+            return i
+        tables.add(name)
+        if not allow_list:
+            return i
+        # FROM a AS x, b y の形式
+        j = i + 1 if tokens[i:i + 1] and tokens[i].upper() == 'AS' else i
+        if j < len(tokens) and _is_fallback_name(tokens[j]):
+            j += 1
+        if tokens[j:j + 1] != [',']:
+            return i
+        i = j + 1
+    return i
+
+def _is_fallback_name(token):
+    return (token[0] in '"`' or token[0].isalpha() or token[0] == '_') and token.upper() not in _FALLBACK_NON_NAMES
 
 def load_schema(schema_file='schema.json'):
     """
-    スキーマ情報をJSONファイルから読み込みます。
-    スキーマ情報は {テーブル名またはビュー名: [カラム名1, カラム名2, ...], ...} の形式で辞書として保持されます。
+    スキーマ情報をJSONファイルまたはバイナリカタログから読み込みます。
+    スキーマ情報は {テーブル名またはビュー名: {カラム名1, カラム名2, ...}, ...} の形式で辞書として保持されます。
+    """
+    return load_schema_with_index(schema_file)[0]
+
+def load_schema_with_index(schema_file='schema.json'):
+    """
+    スキーマ情報とカラム名→テーブル名の逆引き索引を (スキーマ情報, 逆引き索引) で返します。
+    どちらも値は frozenset で、解析中に変更せずに全てのSQL文・ワーカープロセスで共有します。
+    バイナリカタログ（parse_ddl.py --catalog で作成）の場合は、作成済みのセットと索引をそのまま使います。
     """
     if not os.path.isfile(schema_file):
         print(f"Error: スキーマファイル '{schema_file}' が存在しません。")
         sys.exit(1)
     
+    if is_schema_catalog(schema_file):
+        return load_schema_catalog(schema_file)
+    
     with open(schema_file, 'r', encoding='utf-8') as f:
         schema = json.load(f)
     
-    # カラムリストをセットに変換
-    schema = {table: set(columns) for table, columns in schema.items()}
-    return schema
+    # カラムリストを変更できないセットに変換
+    schema = {table: frozenset(columns) for table, columns in schema.items()}
+    return schema, build_column_index(schema)
 
-def extract_tables_aliases(tree):
+def resolve_column_table(column_name, column_index):
     """
-    FROM句やJOIN句からテーブル名とエイリアスを抽出します。
-    戻り値は {エイリアスまたはテーブル名: テーブル名} の辞書です。
+    テーブル指定のないカラムが属するテーブル名を逆引き索引から求めます。
+    複数のテーブルに存在する場合は 'AMBIGUOUS'、どのテーブルにも存在しない場合は 'UNKNOWN' を返します。
     """
-    tables = {}
-    for table in tree.find_all(exp.Table):
-        table_name = table.name
-        alias = table.alias_or_name
-        tables[alias] = table_name
-    return tables
+    tables = column_index.get(column_name)
+    if not tables:
+        return 'UNKNOWN'
+    if len(tables) > 1:
+        return 'AMBIGUOUS'
+    return next(iter(tables))
 
-def extract_columns_with_table(tree, tables, schema_info):
+class QueryScope:
     """
-    SELECT句からカラムとそれが属するテーブルを抽出します。
-    INSERT, UPDATE, DELETE 文の場合も関連するカラムを抽出します。
-    戻り値は {テーブル名: [カラム名, ...], ...} の辞書です。
+    SELECT文・UPDATE文などの1つのスコープです。
+    sources は FROM句・JOIN句などの {エイリアスまたはテーブル名: (テーブル名, カラムのセット)} で（カラムが不明な場合は None）、
+    CTEはCTE名を仮想テーブル名とし、カラムのセットには出力カラムを持ちます。
+    FROM句のサブクエリはカラムのセットの代わりに {出力カラム: (テーブル名, カラム名)} を持ち、参照を元のテーブルのカラムに置き換えます
+    （式の出力カラムは None で、元のテーブルのカラムはサブクエリの中で記録済みのため記録しません）。
+    schema はこのスコープから参照できる {テーブル名またはCTE名: カラムのセット} です（省略した場合は parent と同じ）。
+    基本のスキーマ情報を一番下の層とし、CTEを定義したスコープだけが自身の層を重ねる ChainMap のため、
+    基本のスキーマ情報は変更されず、CTEの層はSQL文の解析が終わると破棄されます。
+    """
+    
+    def __init__(self, parent=None, schema_info=None, schema=None):
+        self.parent = parent
+        self.sources = {}
+        if schema is None:
+            schema = parent.schema if parent is not None else ChainMap(schema_info)
+        self.schema = schema
+        self.owns_layer = False
+    
+    def define_cte(self, name, columns):
+        """
+        このスコープの層にCTEの出力カラムのセットを登録します。
+        """
+        if not self.owns_layer:
+            self.schema = self.schema.new_child()
+            self.owns_layer = True
+        self.schema[name] = columns
+    
+    def table_columns(self, name, qualified=False):
+        """
+        テーブル・CTEのカラムのセットを返します。スキーマ名付き（qualified）の場合はCTEを参照せず、基本のスキーマ情報だけを見ます。
+        """
+        if qualified:
+            return self.schema.maps[-1].get(name)
+        return self.schema.get(name)
+
+def iter_child_expressions(node, skip=()):
+    """
+    node の引数のうち skip 以外の構文木を順に返します。
+    """
+    for key, value in node.args.items():
+        if key in skip:
+            continue
+        for child in value if isinstance(value, list) else [value]:
+            if isinstance(child, exp.Expression):
+                yield child
+
+def resolve_query_columns(tree, schema_info, column_index=None):
     """
+    構文木を1回だけ走査し、(テーブル名のセット, {テーブル名: {カラム名, ...}}) を返します。
+    走査しながらスコープ（SELECT文・サブクエリ・CTE・UPDATE文など）の木を作り、各カラムは最も内側のスコープから順に解決します。
+    テーブル指定のあるカラムは、スコープのエイリアス・テーブル名・CTE名・サブクエリのエイリアスから特定します。
+    テーブル指定のないカラムは、スコープのソースのうちそのカラムを持つものが1つならそのテーブル、複数なら 'AMBIGUOUS' とし、
+    どのスコープでも見つからない場合は、カラムが不明なソース（スキーマにないテーブル）が1つならそのテーブル、複数なら 'AMBIGUOUS'、
+    なければ 'UNKNOWN' とします。column_index（カラム名→テーブル名の逆引き索引）はソースを持たない文でだけ使います。
+    UPDATE文の SET句のカラムは UPDATE 先のテーブルのカラムとします。
+    CTE名はテーブル名のセットに含めます（CTEを仮想テーブルとして扱うため）。FROM句のサブクエリのエイリアスは含めません。
+    """
+    if column_index is None:
+        column_index = build_column_index(schema_info)
+    tables = set()
     columns = {}
-    # SELECT文の場合
-    for column in tree.find_all(exp.Column):
-        table_alias = column.table
+    
+    def source_column(source, column_name):
+        # ソースのカラムを (テーブル名, カラム名) で返す（サブクエリの式の出力カラムは None）
+        name, cols = source
+        if isinstance(cols, dict):
+            return cols.get(column_name, ('UNKNOWN', column_name))
+        return name, column_name
+    
+    def resolve_column(column, scope):
+        # カラムを (テーブル名, カラム名) で返す（記録しないカラムは None）
         column_name = column.name
-        if table_alias:
-            table_name = tables.get(table_alias, 'UNKNOWN')
-            columns.setdefault(table_name, set()).add(column_name)
-        else:
-            # エイリアスが指定されていない場合、スキーマ情報を利用して特定
-            possible_tables = []
-            for table, cols in schema_info.items():
-                if column_name in cols:
-                    possible_tables.append(table)
-            if len(possible_tables) == 1:
-                columns.setdefault(possible_tables[0], set()).add(column_name)
-            elif len(possible_tables) > 1:
-                # 同名カラムが複数のテーブルに存在する場合、'AMBIGUOUS' に分類
-                columns.setdefault('AMBIGUOUS', set()).add(column_name)
-            else:
-                # スキーマに存在しないカラム
-                columns.setdefault('UNKNOWN', set()).add(column_name)
+        if column.table:
+            while scope is not None:
+                source = scope.sources.get(column.table)
+                if source:
+                    return source_column(source, column_name)
+                scope = scope.parent
+            return 'UNKNOWN', column_name
+        inner = scope
+        while scope is not None:
+            matches = {source_column(source, column_name) for source in scope.sources.values()
+                       if source[1] is not None and column_name in source[1]}
+            if len(matches) == 1:
+                return next(iter(matches))
+            if matches:
+                return 'AMBIGUOUS', column_name
+            scope = scope.parent
+        # どのソースのカラムにもない場合は、カラムが不明なソース（スキーマにないテーブル）のカラムとする
+        has_sources = False
+        scope = inner
+        while scope is not None:
+            unknown = {name for name, cols in scope.sources.values() if cols is None}
+            if len(unknown) == 1:
+                return next(iter(unknown)), column_name
+            if unknown:
+                return 'AMBIGUOUS', column_name
+            has_sources = has_sources or bool(scope.sources)
+            scope = scope.parent
+        if has_sources:
+            # SELECT句の別名など、文のソースのカラムではないものは他のテーブルに割り当てない
+            return 'UNKNOWN', column_name
+        # ソースを持たない文は逆引き索引を使う
+        return resolve_column_table(column_name, column_index), column_name
     
-    # INSERT文の場合
-    if isinstance(tree, exp.Insert):
-        table_name = tree.this.name
-        for column in tree.columns or []:
-            columns.setdefault(table_name, set()).add(column.name)
+    def add_column(column, scope):
+        resolved = resolve_column(column, scope)
+        if resolved is not None:
+            columns.setdefault(resolved[0], set()).add(resolved[1])
     
-    # UPDATE文の場合
-    if isinstance(tree, exp.Update):
-        table_name = tree.this.name
-        for set_expr in tree.find_all(exp.Set):
-            column = set_expr.this.name
-            columns.setdefault(table_name, set()).add(column)
+    def walk(node, scope):
+        # 入れ子のSELECT文は新しいスコープとして処理し、このスコープでは走査しない
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, exp.Column):
+                add_column(node, scope)
+            elif isinstance(node, exp.Query):
+                resolve_statement(node, scope)
+            elif isinstance(node, exp.Table):
+                tables.add(node.name)
+            else:
+                stack.extend(reversed(list(node.iter_expressions())))
     
-    # DELETE文の場合
-    # DELETE文では通常、直接的なカラム指定は少ないですが、WHERE句にカラムが含まれる場合があります
-    for condition in tree.find_all(exp.Column):
-        table_alias = condition.table
-        column_name = condition.name
-        if table_alias:
-            table_name = tables.get(table_alias, 'UNKNOWN')
-            columns.setdefault(table_name, set()).add(column_name)
+    def add_source(source, scope):
+        alias = source.args.get('alias')
+        alias_columns = alias.columns if isinstance(alias, exp.TableAlias) else None
+        if isinstance(source, exp.Table):
+            name = source.name
+            tables.add(name)
+            cols = scope.table_columns(name, qualified=bool(source.args.get('db')))
+            scope.sources[source.alias_or_name] = (name, cols)
+            return
+        if isinstance(source, exp.Subquery):
+            # FROM句のサブクエリは同じ FROM句のテーブルを参照できないため、ソースを持たないスコープを挟んで外側のスコープで解決する
+            # （このスコープで定義したCTEは参照できるよう、CTEの層を含む schema は引き継ぐ）
+            cols = resolve_statement(source, QueryScope(scope.parent, schema=scope.schema))
+            if alias_columns:
+                # 別名のカラムリストは出力カラムの順に対応させる
+                origins = list(cols.values()) if len(cols) == len(alias_columns) else [None] * len(alias_columns)
+                cols = {col.name: origin for col, origin in zip(alias_columns, origins)}
         else:
-            # エイリアスが指定されていない場合、スキーマ情報を利用して特定
-            possible_tables = []
-            for table, cols in schema_info.items():
-                if column_name in cols:
-                    possible_tables.append(table)
-            if len(possible_tables) == 1:
-                columns.setdefault(possible_tables[0], set()).add(column_name)
-            elif len(possible_tables) > 1:
-                # 同名カラムが複数のテーブルに存在する場合、'AMBIGUOUS' に分類
-                columns.setdefault('AMBIGUOUS', set()).add(column_name)
+            walk(source, scope)
+            cols = {col.name for col in alias_columns} if alias_columns else None
+        if source.alias:
+            scope.sources[source.alias] = (source.alias, cols)
+    
+    def resolve_statement(node, parent):
+        # 文の出力カラムを {出力カラム: (テーブル名, カラム名) または None} で返す
+        scope = QueryScope(parent)
+        with_ = node.args.get('with_')
+        if with_:
+            for cte in with_.expressions:
+                alias_columns = cte.args['alias'].columns if cte.args.get('alias') else None
+                if with_.args.get('recursive'):
+                    # WITH RECURSIVE のCTEは自身を参照できるため、先に登録しておく
+                    scope.define_cte(cte.alias, frozenset(col.name for col in alias_columns or ()))
+                cols = resolve_statement(cte.this, scope)
+                if alias_columns:
+                    cols = {col.name for col in alias_columns}
+                scope.define_cte(cte.alias, frozenset(cols))
+                tables.add(cte.alias)
+        
+        if isinstance(node, exp.Subquery):
+            return resolve_statement(node.this, scope)
+        
+        if isinstance(node, exp.SetOperation):
+            # UNION などは左端のSELECT文の出力カラムを使う
+            cols = resolve_statement(node.left, scope)
+            resolve_statement(node.right, scope)
+            for child in iter_child_expressions(node, ('with_', 'this', 'expression')):
+                walk(child, scope)
+            return cols
+        
+        if isinstance(node, exp.Select):
+            from_clause = node.args.get('from_')
+            if from_clause:
+                add_source(from_clause.this, scope)
+            for join in node.args.get('joins') or []:
+                add_source(join.this, scope)
+            for child in iter_child_expressions(node, ('with_', 'from_', 'joins')):
+                walk(child, scope)
+            for join in node.args.get('joins') or []:
+                for child in iter_child_expressions(join, ('this',)):
+                    walk(child, scope)
+            return select_output_columns(node, scope)
+        
+        if isinstance(node, (exp.Insert, exp.Update, exp.Delete)):
+            target = node.this
+            if isinstance(target, exp.Schema):
+                # カラムリスト付きの INSERT は Schema(テーブル, [カラム, ...]) になる
+                target = target.this
+                for column in node.this.expressions:
+                    columns.setdefault(target.name, set()).add(column.name)
+            if isinstance(node, exp.Insert):
+                # INSERT ... SELECT のSELECT文からはINSERT先のテーブルを参照できないため、INSERT先を登録する前に解決する
+                tables.add(target.name)
+                if isinstance(node.expression, exp.Query):
+                    resolve_statement(node.expression, scope)
+                elif node.expression is not None:
+                    walk(node.expression, scope)
+                skip = ('with_', 'this', 'expression')
             else:
-                # スキーマに存在しないカラム
-                columns.setdefault('UNKNOWN', set()).add(column_name)
+                skip = ('with_', 'this', 'from_', 'using', 'expressions')
+            add_source(target, scope)
+            if node.args.get('from_'):
+                add_source(node.args['from_'].this, scope)
+            for source in node.args.get('using') or []:
+                add_source(source, scope)
+            if isinstance(node, exp.Update):
+                # SET句のカラムは UPDATE 先のテーブルのカラムとする（スキーマにないテーブル・カラムでも他のテーブルに割り当てない）
+                for assignment in node.expressions:
+                    if isinstance(assignment, exp.EQ) and isinstance(assignment.this, exp.Column):
+                        columns.setdefault(target.name, set()).add(assignment.this.name)
+                        walk(assignment.expression, scope)
+                    else:
+                        walk(assignment, scope)
+            for child in iter_child_expressions(node, skip):
+                walk(child, scope)
+            return {}
+        
+        for child in iter_child_expressions(node, ('with_',)):
+            walk(child, scope)
+        return {}
     
-    return columns
+    def select_output_columns(select, scope):
+        cols = {}
+        for projection in select.expressions:
+            if isinstance(projection, exp.Star):
+                for source in scope.sources.values():
+                    cols.update(source_columns(source))
+            elif isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star):
+                source = scope.sources.get(projection.table)
+                if source:
+                    cols.update(source_columns(source))
+            elif isinstance(projection.unalias(), exp.Column):
+                cols[projection.alias_or_name] = resolve_column(projection.unalias(), scope)
+            elif projection.alias_or_name:
+                cols[projection.alias_or_name] = None
+        return cols
+    
+    def source_columns(source):
+        # ソースの全カラムを {カラム名: (テーブル名, カラム名)} で返す（* の展開）
+        name, cols = source
+        if isinstance(cols, dict):
+            return cols
+        return {column_name: (name, column_name) for column_name in cols or ()}
+    
+    # 一番外側のスコープ（ソースを持たず、基本のスキーマ情報だけを参照する）
+    root = QueryScope(schema_info=schema_info)
+    if isinstance(tree, (exp.Query, exp.Insert, exp.Update, exp.Delete)):
+        resolve_statement(tree, root)
+    else:
+        walk(tree, root)
+    return tables, columns
 
 def extract_dml(tree):
     """
@@ -145,44 +459,26 @@ def extract_dml(tree):
     else:
         return 'UNKNOWN'
 
-def parse_sql(sql, dialect='postgres', schema_info=None):
+def parse_sql(sql, dialect='postgres', schema_info=None, column_index=None):
     """
     単一のSQL文を解析し、DML、テーブル、カラムを抽出します。
+    sql には解析済みの構文木(exp.Expression)も指定でき、その場合は再解析しません。
+    column_index は schema_info の逆引き索引です（省略した場合は schema_info から作成します）。
     """
-    try:
-        tree = parse_one(sql, read=dialect)
-    except sqlglot.errors.ParseError as e:
-        print(f"ParseError in SQL: {e}")
-        return None
+    if isinstance(sql, exp.Expression):
+        tree = sql
+    else:
+        try:
+            tree = parse_one(sql, read=dialect)
+        except sqlglot.errors.ParseError as e:
+            print(f"ParseError in SQL: {e}")
+            return None
     
     dml = extract_dml(tree)
-    tables = extract_tables_aliases(tree)
-    columns = extract_columns_with_table(tree, tables, schema_info)
-    
-    # CTEの解析
-    for cte in tree.find_all(exp.CTE):
-        cte_alias = cte.alias
-        if isinstance(cte, exp.CTE):
-            cte_expression = cte.this
-            cte_tables = extract_tables_aliases(cte_expression)
-            cte_columns = extract_columns_with_table(cte_expression, cte_tables, schema_info)
-            # CTE内のテーブルとカラムを統合
-            tables[cte_alias] = cte_alias  # CTE自体を仮想テーブルとして登録
-            schema_info[cte_alias] = cte_columns.get(cte_alias, set())
-            for table, cols in cte_columns.items():
-                columns.setdefault(table, set()).update(cols)
-    
-    # サブクエリの解析
-    for subquery in tree.find_all(exp.Subquery):
-        sub_tables = extract_tables_aliases(subquery)
-        sub_columns = extract_columns_with_table(subquery, sub_tables, schema_info)
-        # テーブルとカラムを統合
-        tables.update(sub_tables)
-        for table, cols in sub_columns.items():
-            columns.setdefault(table, set()).update(cols)
+    tables, columns = resolve_query_columns(tree, schema_info, column_index)
     
     # 結果を整理
-    tables_list = sorted(set(tables.values()))  # 重複を排除
+    tables_list = sorted(tables)
     columns_dict = {table: sorted(cols) for table, cols in columns.items()}
     
     return {
@@ -191,41 +487,88 @@ def parse_sql(sql, dialect='postgres', schema_info=None):
         'Columns': columns_dict
     }
 
-def parse_queries(sql_queries, schema_info):
+class UnsupportedStatement(Exception):
+    """
+    sqlglot が構文を解釈できずに Command として返した文です。解析に失敗した文と同じく隔離します。
+    """
+
+def extract_tree(sql, tree, schema_info, column_index):
+    """
+    構文木からDML、テーブル、カラムを抽出します。
+    sqlglot が構文を解釈できずに Command として返した文は UnsupportedStatement を送出します
+    （呼び出し側で隔離し、トークンからテーブル名を抽出します）。
+    """
+    if isinstance(tree, exp.Command):
+        raise UnsupportedStatement(f"sqlglot が '{tree.name.upper()}' 文を解釈できず、Command として返しました")
+    return parse_sql(tree, schema_info=schema_info, column_index=column_index)
+
+def extract_statement(sql, dialect, schema_info, column_index):
+    """
+    監視付きワーカーで実行する処理。SQL文を解析し、文ごとの抽出結果のリストを返します。
+    """
+    trees = Dialect.get_or_raise(dialect).parse(sql)
+    return [extract_tree(sql, tree, schema_info, column_index) for tree in trees if tree is not None]
+
+def parse_queries(sql_queries, schema_info, column_index=None, failures=None, verbose=True):
     """
-    SQLクエリのリストを解析し、各クエリのDML、テーブル、カラムを抽出します。
-    結果をリストとして返します。
+    read_sql_file() が返す (バイト位置, 元のSQL文, 構文木, エラーメッセージ) を順に解析し、各クエリのDML、テーブル、カラムを抽出します。
+    構文木はそのまま使い、'SQL' には元のSQL文を設定します。監視付きワーカーで抽出済みの結果（辞書）はそのまま使います。
+    結果は {'SQL': SQL文, 'DML': DML, 'Tables': [テーブル名, ...], 'Columns': {テーブル名: [カラム名, ...]}} のリストです。
+    解析・抽出に失敗したSQL文は fallback_extract() でDMLとテーブル名だけを抽出して結果に含め、
+    failures を渡すと {'Statement': 番号, 'Offset': バイト位置, 'Error': エラーメッセージ, 'Tables': [...], 'SQL': SQL} で追加します。
+    verbose が False の場合は、SQL文ごとの解析結果を表示しません。
     """
+    if column_index is None:
+        column_index = build_column_index(schema_info)
     results = []
-    for idx, tree in enumerate(sql_queries, 1):
-        # SQL文を文字列に戻す
-        sql = tree.sql()
+    for idx, (offset, sql, tree, error) in enumerate(sql_queries, 1):
         sql = sql.strip()
         if not sql:
             continue
-        print(f"\n--- SQL Statement {idx} ---")
-        print(sql)
-        parsed = parse_sql(sql, schema_info=schema_info)
-        if parsed:
+        if verbose:
+            print(f"\n--- SQL Statement {idx} ---")
+            print(sql)
+        parsed = None
+        if isinstance(tree, dict):
+            parsed = tree
+        elif tree is not None:
+            try:
+                parsed = extract_tree(sql, tree, schema_info, column_index)
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+        if parsed is None:
+            # 解析できない文は隔離し、トークンから抽出できる範囲の結果を使う
+            parsed = fallback_extract(sql)
+            print(f"Failed to parse SQL statement {idx} (byte {offset}), quarantined: {error}")
+            if failures is not None:
+                failures.append({'Statement': idx, 'Offset': offset, 'Error': error, 'Tables': parsed['Tables'], 'SQL': sql})
+        if verbose:
             print("\nParsed Information:")
             print(f"DML: {parsed['DML']}")
             print(f"Tables: {parsed['Tables']}")
             print("Columns:")
             for table, cols in parsed['Columns'].items():
                 print(f"  {table}: {cols}")
-            # フォーマットを整えてCSV用に文字列に変換
-            tables_str = ";".join(parsed['Tables'])
-            columns_str = ";".join([f"{table}:{','.join(cols)}" for table, cols in parsed['Columns'].items()])
-            results.append({
-                'SQL': sql.replace('\n', ' ').strip(),
-                'DML': parsed['DML'],
-                'Tables': tables_str,
-                'Columns': columns_str
-            })
-        else:
-            print("Failed to parse the SQL statement.")
+        results.append({
+            'SQL': sql.replace('\n', ' ').strip(),
+            'DML': parsed['DML'],
+            'Tables': parsed['Tables'],
+            'Columns': parsed['Columns']
+        })
     return results
 
+def format_csv_row(result):
+    """
+    解析結果1件をCSV用の文字列に変換します。
+    'Tables' は "t1;t2"、'Columns' は "table:c1,c2;..." の形式にします。
+    """
+    return {
+        'SQL': result['SQL'],
+        'DML': result['DML'],
+        'Tables': ";".join(result['Tables']),
+        'Columns': ";".join([f"{table}:{','.join(cols)}" for table, cols in result['Columns'].items()])
+    }
+
 def save_results_to_csv(results, output_file):
     """
     解析結果をCSVファイルに保存します。
@@ -234,43 +577,205 @@ def save_results_to_csv(results, output_file):
     if not results:
         print(f"No results to save for '{output_file}'.")
         return
-    df = pd.DataFrame(results)
+    df = pd.DataFrame([format_csv_row(result) for result in results])
     df.to_csv(output_file, index=False, encoding='utf-8-sig')
     print(f"\nParsed results saved to '{output_file}'.")
 
-def main(schema_file, sql_dir, output_dir='parsed_csvs'):
-    # スキーマ情報の読み込み
-    schema_info = load_schema(schema_file)
+def columnar_schema():
+    """
+    Parquet / Arrow 形式で出力する解析結果のスキーマを返します。
+    'Tables' はテーブル名のリスト、'Columns' は {'table': テーブル名, 'column': カラム名} のリストです。
+    """
+    return pa.schema([
+        ('SQL', pa.string()),
+        ('DML', pa.string()),
+        ('Tables', pa.list_(pa.string())),
+        ('Columns', pa.list_(pa.struct([('table', pa.string()), ('column', pa.string())]))),
+    ])
+
+def save_results_to_columnar(results, output_file, output_format='parquet'):
+    """
+    解析結果を Parquet または Arrow IPC (Feather) ファイルに保存します。
+    テーブル名・カラム名は区切り文字で連結せず、リスト型の列として保存します。
+    """
+    if not results:
+        print(f"No results to save for '{output_file}'.")
+        return
+    table = pa.table({
+        'SQL': [result['SQL'] for result in results],
+        'DML': [result['DML'] for result in results],
+        'Tables': [result['Tables'] for result in results],
+        'Columns': [
+            [{'table': table_name, 'column': col} for table_name, cols in result['Columns'].items() for col in cols]
+            for result in results
+        ],
+    }, schema=columnar_schema())
+    if output_format == 'arrow':
+        feather.write_feather(table, output_file)
+    else:
+        pq.write_table(table, output_file)
+    print(f"\nParsed results saved to '{output_file}'.")
+
+def save_results(results, output_file, output_format='csv'):
+    """
+    解析結果を指定された形式で保存します。
+    """
+    if output_format == 'csv':
+        save_results_to_csv(results, output_file)
+    else:
+        save_results_to_columnar(results, output_file, output_format)
+
+def init_worker(schema_info, column_index, statement_timeout=None, statement_memory=None):
+    """
+    ワーカープロセスの初期化。スキーマ情報と逆引き索引、1文ごとの解析の予算（秒・バイト）を設定します。
+    """
+    global _schema_info, _column_index, _statement_timeout, _statement_memory
+    _schema_info = schema_info
+    _column_index = column_index
+    _statement_timeout = statement_timeout
+    _statement_memory = statement_memory
+
+def statement_parser():
+    """
+    1文ごとの解析の予算が設定されている場合に、このプロセスの監視付きワーカーを返します（最初の呼び出しで作成します）。
+    予算が設定されていない場合は None を返し、解析はこのプロセスで行います。
+    """
+    global _supervised_parser
+    if _statement_timeout is None and _statement_memory is None:
+        return None
+    if _supervised_parser is None:
+        _supervised_parser = SupervisedParser(extract_statement, ('postgres', _schema_info, _column_index),
+                                              _statement_timeout, _statement_memory)
+    return _supervised_parser
+
+def close_statement_parser():
+    """
+    このプロセスの監視付きワーカーを終了します。
+    """
+    global _supervised_parser
+    if _supervised_parser is not None:
+        _supervised_parser.close()
+        _supervised_parser = None
+
+def parsed_output_path(sql_file, output_dir, output_format='csv'):
+    """
+    SQLファイルの解析結果の出力先 '<出力ディレクトリ>/<ファイル名>_parsed.<拡張子>' を返します。
+    """
+    base_name = os.path.splitext(os.path.basename(sql_file))[0]
+    return os.path.join(output_dir, f"{base_name}_parsed{OUTPUT_EXTENSIONS[output_format]}")
+
+def parse_sql_file(sql_file, verbose=True):
+    """
+    1ファイル分のSQLを解析し、(SQLファイル, 解析結果のリスト, 隔離したSQL文のリスト, エラーメッセージ) を返します。
+    隔離したSQL文は parse_queries() の failures と同じ形式に 'File' を加えた辞書です。
+    スキーマ情報と逆引き索引は変更しないため、複製せずに全てのファイルで共有しても結果は処理順に左右されません。
+    """
+    print(f"\nProcessing SQL file: {sql_file}")
+    try:
+        errors = []
+        failures = []
+        # 文は読み込みながら1文ずつ解析し、ファイルの読み込みに失敗した場合だけファイル全体を失敗とする
+        results = parse_queries(read_sql_file(sql_file, errors, parser=statement_parser()), _schema_info, _column_index,
+                                failures, verbose)
+        if errors:
+            return sql_file, [], [], errors[0]
+    except Exception as e:
+        return sql_file, [], [], f"{type(e).__name__}: {e}"
+    return sql_file, results, [{'File': sql_file, **failure} for failure in failures], None
+
+def process_sql_file(sql_file, output_dir, output_format='csv'):
+    """
+    1ファイル分のSQLを解析して '<ファイル名>_parsed.csv'（output_format に応じた拡張子）に保存します。
+    戻り値は (SQLファイル, 保存した文の数, 隔離したSQL文のリスト, エラーメッセージ) です。
+    """
+    sql_file, results, quarantined, error = parse_sql_file(sql_file)
+    if error:
+        return sql_file, 0, [], error
+    try:
+        save_results(results, parsed_output_path(sql_file, output_dir, output_format), output_format)
+    except Exception as e:
+        return sql_file, 0, [], f"{type(e).__name__}: {e}"
+    return sql_file, len(results), quarantined, None
+
+def save_quarantine_report(quarantined, output_file):
+    """
+    解析できずに隔離したSQL文の一覧をJSONで保存します。
+    各要素はファイル・文の番号・バイト位置・エラーメッセージ・トークンから抽出したテーブル名・SQL文です。
+    """
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(quarantined, f, ensure_ascii=False, indent=4)
+    print(f"Quarantine report saved to '{output_file}' ({len(quarantined)} statements).")
+
+def print_failures(outcomes):
+    """
+    (SQLファイル, 文の数, 隔離したSQL文のリスト, エラーメッセージ) のリストから、失敗したファイル・SQL文をまとめて表示します。
+    """
+    failed = [outcome for outcome in outcomes if outcome[3] or outcome[2]]
+    if failed:
+        print(f"Failures: {len(failed)} files")
+        for sql_file, _, quarantined, error in failed:
+            if error:
+                print(f"  {sql_file}: {error.splitlines()[0]}")
+            else:
+                print(f"  {sql_file}: {len(quarantined)} statements failed to parse (tables extracted from tokens)")
+
+def main(schema_file, sql_dir, output_dir='parsed_csvs', jobs=1, output_format='csv', statement_timeout=None,
+         statement_memory=None):
+    if output_format != 'csv' and pa is None:
+        print(f"Error: '{output_format}' 形式で出力するには pyarrow が必要です。")
+        sys.exit(1)
+    
+    # スキーマ情報とカラム名→テーブル名の逆引き索引の読み込み（全SQLファイルで共有する）
+    schema_info, column_index = load_schema_with_index(schema_file)
     
     # 出力ディレクトリの作成
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
     # 指定ディレクトリ内の全てのSQLファイルを取得
-    sql_files = [os.path.join(sql_dir, f) for f in os.listdir(sql_dir) if f.endswith('.sql')]
+    sql_files = sorted(os.path.join(sql_dir, f) for f in os.listdir(sql_dir) if f.endswith('.sql'))
     
     if not sql_files:
         print(f"No SQL files found in directory '{sql_dir}'.")
         sys.exit(1)
     
-    # 各SQLファイルの解析
-    for sql_file in sql_files:
-        print(f"\nProcessing SQL file: {sql_file}")
-        sql_queries = read_sql_file(sql_file)
-        results = parse_queries(sql_queries, schema_info)
-        
-        # 出力CSVファイル名の決定
-        base_name = os.path.splitext(os.path.basename(sql_file))[0]
-        output_csv = os.path.join(output_dir, f"{base_name}_parsed.csv")
-        
-        # 結果をCSVに保存
-        save_results_to_csv(results, output_csv)
+    # 各SQLファイルの解析（jobs が2以上の場合はプロセスプールで並列に解析する）
+    # スキーマ情報はワーカーの初期化時に1回だけ渡し、ファイルごとには送らない
+    # 1文ごとの予算（--statement-timeout / --statement-memory）がある場合は、各プロセスが監視付きワーカーで解析する
+    budget = (statement_timeout, statement_memory * 1024 * 1024 if statement_memory else None)
+    init_worker(schema_info, column_index, *budget)
+    if jobs > 1 and len(sql_files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(schema_info, column_index, *budget)) as executor:
+            outcomes = list(executor.map(process_sql_file, sql_files, repeat(output_dir), repeat(output_format)))
+    else:
+        try:
+            outcomes = [process_sql_file(sql_file, output_dir, output_format) for sql_file in sql_files]
+        finally:
+            close_statement_parser()
+    
+    # 隔離したSQL文の一覧（集計の対象外にするため、拡張子は .json にする）
+    quarantined = [failure for outcome in outcomes for failure in outcome[2]]
+    if quarantined:
+        save_quarantine_report(quarantined, os.path.join(output_dir, QUARANTINE_REPORT))
+    
+    # 失敗したファイル・SQL文のまとめ
+    print(f"\nProcessed {len(sql_files)} SQL files ({sum(outcome[1] for outcome in outcomes)} statements).")
+    print_failures(outcomes)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Parse SQL files and extract DML, Tables, and Columns.")
-    parser.add_argument('schema_json', help="Path to the schema JSON file.")
+    parser.add_argument('schema_json', help="Path to the schema JSON or catalog file.")
     parser.add_argument('sql_directory', help="Path to the directory containing SQL (.sql) files.")
     parser.add_argument('--output', default='parsed_csvs', help="Output directory for parsed CSV files.")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of worker processes for parsing SQL files.")
+    parser.add_argument('--format', choices=list(OUTPUT_EXTENSIONS), default='csv',
+                        help="Output format. parquet/arrow store Tables and Columns as list columns (requires pyarrow).")
+    parser.add_argument('--statement-timeout', type=float,
+                        help="Parse each statement in a supervised worker and give up on it after this many seconds.")
+    parser.add_argument('--statement-memory', type=int,
+                        help="Parse each statement in a supervised worker and give up on it above this many MB.")
     
     args = parser.parse_args()
-    main(args.schema_json, args.sql_directory, args.output)
+    main(args.schema_json, args.sql_directory, args.output, args.jobs, args.format, args.statement_timeout,
+         args.statement_memory)
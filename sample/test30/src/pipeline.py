@@ -0,0 +1,137 @@
+# pipeline.py
+
+import os
+import sys
+import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from parse_ddl import build_merged_schema, save_manifest, save_schema_to_json
+from parse_sql_queries import (init_worker, close_statement_parser, parse_sql_file, parsed_output_path, save_results, save_quarantine_report,
+                               print_failures, OUTPUT_EXTENSIONS, QUARANTINE_REPORT, pa)
+from schema_catalog import build_column_index, save_schema_catalog
+from aggregate_csv import usage_dataframe, save_aggregated_data
+
+class RunningAggregates:
+    """
+    SQL文ごとの解析結果を受け取り、DML・テーブル・カラムの使用回数をその場で集計します。
+    各辞書は最初に出現した順を保つため、aggregate_csv.py と同じ並びの集計結果になります。
+    """
+    
+    def __init__(self):
+        self.dml_counts = {}
+        self.table_usage = {}
+        self.column_usage = {}
+    
+    def add(self, result):
+        """
+        parse_queries() の解析結果1件を集計に加えます。
+        """
+        dml = result['DML']
+        self.dml_counts[dml] = self.dml_counts.get(dml, 0) + 1
+        for table in result['Tables']:
+            self.table_usage[table] = self.table_usage.get(table, 0) + 1
+        for table, cols in result['Columns'].items():
+            for col in cols:
+                key = f"{table}.{col}"
+                self.column_usage[key] = self.column_usage.get(key, 0) + 1
+    
+    def to_dataframes(self):
+        """
+        集計結果を aggregate_csv.py と同じ形式の (DML, テーブル, カラム) のDataFrameで返します。
+        """
+        dml_counts = usage_dataframe(list(self.dml_counts), list(self.dml_counts.values()), 'DML', 'Count')
+        table_usage = usage_dataframe(list(self.table_usage), list(self.table_usage.values()), 'Table')
+        column_usage = usage_dataframe(list(self.column_usage), list(self.column_usage.values()), 'Table.Column')
+        return dml_counts, table_usage, column_usage
+
+def build_schema(ddl_dir, schema_output=None, catalog_output=None):
+    """
+    DDLファイルを解析してスキーマ情報 {テーブル名: [カラム名, ...]} を返します。
+    schema_output を指定した場合はJSONとマニフェストを保存し、次回は変更されたDDLファイルだけを解析します。
+    """
+    ddl_names = sorted(f for f in os.listdir(ddl_dir) if f.endswith('.sql'))
+    manifest_file = os.path.splitext(schema_output)[0] + '.manifest.json' if schema_output else None
+    all_schema, files = build_merged_schema(ddl_dir, ddl_names, manifest_file)
+    
+    if schema_output:
+        save_schema_to_json(all_schema, schema_output)
+        save_manifest(files, manifest_file)
+    if catalog_output:
+        save_schema_catalog(all_schema, catalog_output)
+    return all_schema
+
+def main(ddl_dir, sql_dir, output_dir='aggregated_results', jobs=1, schema_output=None, catalog_output=None,
+         parsed_output=None, output_format='csv', verbose=False, statement_timeout=None, statement_memory=None):
+    for directory in (ddl_dir, sql_dir):
+        if not os.path.isdir(directory):
+            print(f"Error: ディレクトリ '{directory}' が存在しません。")
+            sys.exit(1)
+    if parsed_output and output_format != 'csv' and pa is None:
+        print(f"Error: '{output_format}' 形式で出力するには pyarrow が必要です。")
+        sys.exit(1)
+    
+    # DDLからスキーマ情報を作成し、ファイルを介さずにそのまま使う（解析中は変更しないため frozenset にする）
+    all_schema = build_schema(ddl_dir, schema_output, catalog_output)
+    schema_info = {table: frozenset(columns) for table, columns in all_schema.items()}
+    column_index = build_column_index(schema_info)
+    
+    sql_files = sorted(os.path.join(sql_dir, f) for f in os.listdir(sql_dir) if f.endswith('.sql'))
+    if not sql_files:
+        print(f"No SQL files found in directory '{sql_dir}'.")
+        sys.exit(1)
+    if parsed_output and not os.path.exists(parsed_output):
+        os.makedirs(parsed_output)
+    
+    # SQLファイルの解析結果をファイル名順に受け取り、集計に加える（中間ファイルは指定された場合だけ出力する）
+    aggregates = RunningAggregates()
+    summaries = []
+    quarantined = []
+    budget = (statement_timeout, statement_memory * 1024 * 1024 if statement_memory else None)
+    init_worker(schema_info, column_index, *budget)
+    executor = None
+    if jobs > 1 and len(sql_files) > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                       initargs=(schema_info, column_index, *budget))
+        outcomes = executor.map(parse_sql_file, sql_files, repeat(verbose))
+    else:
+        outcomes = map(parse_sql_file, sql_files, repeat(verbose))
+    try:
+        for sql_file, results, file_quarantined, error in outcomes:
+            summaries.append((sql_file, len(results), file_quarantined, error))
+            quarantined.extend(file_quarantined)
+            for result in results:
+                aggregates.add(result)
+            if parsed_output and results:
+                save_results(results, parsed_output_path(sql_file, parsed_output, output_format), output_format)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        close_statement_parser()
+    
+    dml_counts, table_usage, column_usage = aggregates.to_dataframes()
+    save_aggregated_data(dml_counts, table_usage, column_usage, output_dir)
+    if quarantined:
+        save_quarantine_report(quarantined, os.path.join(output_dir, QUARANTINE_REPORT))
+    
+    print(f"\nProcessed {len(sql_files)} SQL files ({sum(summary[1] for summary in summaries)} statements).")
+    print_failures(summaries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run DDL parsing, SQL parsing and aggregation in one process.")
+    parser.add_argument('ddl_directory', help="Path to the directory containing DDL (.sql) files.")
+    parser.add_argument('sql_directory', help="Path to the directory containing SQL (.sql) files.")
+    parser.add_argument('--output', default='aggregated_results', help="Output directory for aggregated CSV files.")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of worker processes for parsing SQL files.")
+    parser.add_argument('--schema-output', help="Also write the schema JSON (and its manifest for incremental runs).")
+    parser.add_argument('--catalog', help="Also write the binary schema catalog.")
+    parser.add_argument('--parsed-output', help="Also write per-file parsed results to this directory.")
+    parser.add_argument('--format', choices=list(OUTPUT_EXTENSIONS), default='csv', help="Format of --parsed-output files.")
+    parser.add_argument('--verbose', action='store_true', help="Print the parsed information of every SQL statement.")
+    parser.add_argument('--statement-timeout', type=float,
+                        help="Parse each statement in a supervised worker and give up on it after this many seconds.")
+    parser.add_argument('--statement-memory', type=int,
+                        help="Parse each statement in a supervised worker and give up on it above this many MB.")
+    
+    args = parser.parse_args()
+    main(args.ddl_directory, args.sql_directory, args.output, args.jobs, args.schema_output, args.catalog,
+         args.parsed_output, args.format, args.verbose, args.statement_timeout, args.statement_memory)
@@ -0,0 +1,118 @@
+# schema_catalog.py
+
+import gc
+import os
+import sys
+import json
+import marshal
+import argparse
+
+# バイナリカタログの先頭に付ける識別子（JSONと見分けるため）と、その直後の1バイトのバージョン
+CATALOG_MAGIC = b'T30CATALOG'
+CATALOG_VERSION = 2
+
+def build_column_index(schema_info):
+    """
+    スキーマ情報からカラム名→テーブル名のセットの逆引き索引を作成します。
+    戻り値は {カラム名: frozenset(テーブル名), ...} の辞書です。
+    """
+    column_index = {}
+    for table, cols in schema_info.items():
+        for column_name in cols:
+            column_index.setdefault(column_name, set()).add(table)
+    return {column_name: frozenset(tables) for column_name, tables in column_index.items()}
+
+def save_schema_catalog(schema, output_file='schema.catalog'):
+    """
+    スキーマ情報 {テーブル名: [カラム名, ...]} をバイナリカタログとして保存します。
+    中身は組み込み型（辞書・タプル・frozenset・文字列）だけを marshal で書き込んだもので、読み込み時にコードは実行されません。
+    名前は sys.intern で1つの文字列オブジェクトにまとめるため、marshal には各名前が1回だけ書き込まれます。
+    カラムの並びと、カラム名→テーブル名の逆引き索引を作成済みの状態で保存します。
+    """
+    tables = {}
+    for table, columns in schema.items():
+        tables[sys.intern(table)] = tuple(sys.intern(column) for column in columns)
+    catalog = {
+        'tables': tables,
+        'column_index': build_column_index(tables),
+    }
+    with open(output_file, 'wb') as f:
+        f.write(CATALOG_MAGIC + bytes([CATALOG_VERSION]))
+        marshal.dump(catalog, f)
+    print(f"Schema catalog saved to '{output_file}'.")
+
+def is_schema_catalog(schema_file):
+    """
+    ファイルがバイナリカタログかどうかを先頭の識別子で判定します。
+    """
+    with open(schema_file, 'rb') as f:
+        return f.read(len(CATALOG_MAGIC)) == CATALOG_MAGIC
+
+def read_schema_catalog(schema_file):
+    """
+    バイナリカタログを読み込み、保存時の辞書をそのまま返します。
+    先頭の識別子とバージョンが一致しない場合（旧形式の pickle のカタログを含む）は、中身を読まずに ValueError を送出します。
+    marshal は不正なデータに対して堅牢ではないため、このツールで作成したカタログだけを読み込んでください。
+    """
+    with open(schema_file, 'rb') as f:
+        header = f.read(len(CATALOG_MAGIC) + 1)
+        if header[:len(CATALOG_MAGIC)] != CATALOG_MAGIC:
+            raise ValueError(f"'{schema_file}' はスキーマカタログではありません。")
+        if header[len(CATALOG_MAGIC):] != bytes([CATALOG_VERSION]):
+            raise ValueError(f"'{schema_file}' のカタログのバージョン {header[len(CATALOG_MAGIC):].hex() or 'なし'} には対応していません。"
+                             "parse_ddl.py --catalog で作成し直してください。")
+        data = f.read()
+    # 大量のセットを生成する間は循環参照GCを止める（読み込み時間の大半がGCの走査になるため）
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        catalog = marshal.loads(data)
+    except (EOFError, ValueError, TypeError) as e:
+        raise ValueError(f"'{schema_file}' のカタログが壊れています: {e}") from None
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if not (isinstance(catalog, dict) and isinstance(catalog.get('tables'), dict)
+            and isinstance(catalog.get('column_index'), dict)):
+        raise ValueError(f"'{schema_file}' のカタログの形式が正しくありません。")
+    return catalog
+
+def load_schema_catalog(schema_file):
+    """
+    バイナリカタログを読み込み、(スキーマ情報, 逆引き索引) を返します。
+    スキーマ情報は {テーブル名: frozenset(カラム名)}、逆引き索引は {カラム名: frozenset(テーブル名)} です。
+    逆引き索引は保存時に作成済みで、カラムのセットは保存されたカラムの並びから作成します。
+    """
+    catalog = read_schema_catalog(schema_file)
+    return {table: frozenset(columns) for table, columns in catalog['tables'].items()}, catalog['column_index']
+
+def read_schema(schema_file):
+    """
+    JSONまたはバイナリカタログのスキーマ情報を {テーブル名: [カラム名, ...]} の形式で返します。
+    """
+    if is_schema_catalog(schema_file):
+        return {table: list(columns) for table, columns in read_schema_catalog(schema_file)['tables'].items()}
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main(schema_file, output_file, output_format='catalog'):
+    if not os.path.isfile(schema_file):
+        print(f"Error: スキーマファイル '{schema_file}' が存在しません。")
+        sys.exit(1)
+    
+    schema = read_schema(schema_file)
+    if output_format == 'json':
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=4)
+        print(f"Schema information saved to '{output_file}'.")
+    else:
+        save_schema_catalog(schema, output_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert schema information between JSON and the binary catalog format.")
+    parser.add_argument('schema_file', help="Path to the schema JSON or catalog file.")
+    parser.add_argument('--output', required=True, help="Output file.")
+    parser.add_argument('--format', choices=['catalog', 'json'], default='catalog', help="Output format.")
+    
+    args = parser.parse_args()
+    main(args.schema_file, args.output, args.format)
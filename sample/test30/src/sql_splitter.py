@@ -0,0 +1,218 @@
+# sql_splitter.py
+
+import re
+
+# 1回に読み込むバイト数
+CHUNK_SIZE = 1 << 20
+
+# 通常の状態で意味を持つ文字（文の区切り・引用符・コメント・ドル引用）
+_SPECIAL = re.compile(rb"[;'\"`$]|--|/\*")
+# ドル引用の開始・終了タグ（$$ または $タグ$）
+_DOLLAR_TAG = re.compile(rb"\$(?:[A-Za-z_\x80-\xff][A-Za-z0-9_\x80-\xff]*)?\$")
+# チャンクの末尾で途切れている可能性のあるドル引用タグ
+_PARTIAL_DOLLAR_TAG = re.compile(rb"\$(?:[A-Za-z_\x80-\xff][A-Za-z0-9_\x80-\xff]*)?")
+# E'...' 文字列の終わり（バックスラッシュでエスケープされた文字を読み飛ばす）
+_ESCAPE_STRING_END = re.compile(rb"(?:[^'\\]|\\.)*'", re.S)
+# ブロックコメントの入れ子（PostgreSQL の /* */ は入れ子にできる）
+_BLOCK_COMMENT = re.compile(rb"/\*|\*/")
+
+def _is_identifier_byte(byte):
+    return byte == 0x5f or byte >= 0x80 or 0x30 <= byte <= 0x39 or 0x41 <= byte <= 0x5a or 0x61 <= byte <= 0x7a
+
+def _scan_end(buf, i, token, eof):
+    """
+    buf[i] から始まる引用符・コメント・ドル引用の終わりの位置を返します。
+    終わりがまだ読み込まれていない場合は None を返します（ファイルの終わりでは buf の末尾を返します）。
+    """
+    end = None
+    if token == b"'":
+        if i > 0 and buf[i - 1] in b'eE' and not (i > 1 and _is_identifier_byte(buf[i - 2])):
+            m = _ESCAPE_STRING_END.match(buf, i + 1)
+            end = m.end() if m else None
+        else:
+            end = buf.find(b"'", i + 1) + 1 or None
+    elif token in (b'"', b'`'):
+        end = buf.find(token, i + 1) + 1 or None
+    elif token == b'--':
+        # 改行は文の一部として残す
+        end = buf.find(b'\n', i + 2)
+        end = None if end < 0 else end
+    elif token == b'/*':
+        depth = 0
+        for m in _BLOCK_COMMENT.finditer(buf, i):
+            depth += 1 if m.group() == b'/*' else -1
+            if depth == 0:
+                end = m.end()
+                break
+    if end is None and eof:
+        return len(buf)
+    return end
+
+def split_sql_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    バイナリストリームからSQL文を1文ずつ読み出し、(文の先頭のバイト位置, SQL文) を返すジェネレーターです。
+    ストリームはチャンク単位で読み込み、保持するのは読み込み中のチャンクと解析中の1文だけです。
+    文字列（'...'、E'...'）・引用符付きの識別子・ドル引用（$$...$$、$タグ$...$タグ$）の中のセミコロンでは区切りません。
+    コメント（-- と /* */）は取り除き、ブロックコメントは空白1つに置き換えます。空の文は返しません。
+    """
+    buf = b''
+    base = 0        # buf[0] のストリーム中の位置
+    pos = 0         # 走査を再開する位置
+    seg = 0         # 解析中の文のうち、まだ pieces に移していない部分の先頭
+    pieces = []     # 解析中の文の (ストリーム中の位置, バイト列)
+    eof = False
+
+    while True:
+        m = _SPECIAL.search(buf, pos)
+        i = m.start() if m else len(buf)
+        token = m.group() if m else None
+        end = i
+        if token == b'$':
+            tag = _DOLLAR_TAG.match(buf, i)
+            if i > 0 and _is_identifier_byte(buf[i - 1]):
+                # 識別子の途中の $ はドル引用ではない
+                end = i + 1
+            elif tag:
+                close = buf.find(tag.group(), tag.end())
+                end = close + len(tag.group()) if close >= 0 else (len(buf) if eof else None)
+            elif not eof and _PARTIAL_DOLLAR_TAG.fullmatch(buf, i):
+                end = None
+            else:
+                end = i + 1
+        elif token is not None and token != b';':
+            end = _scan_end(buf, i, token, eof)
+
+        # 区切り・引用の終わりが見つからなければ、次のチャンクを読み込んで同じ位置から走査し直す
+        if m is None or end is None:
+            if eof:
+                break
+            # 末尾の '-' や '/' は次のチャンクの先頭とつながる可能性があるため、もう一度走査する
+            pos = i if end is None else max(len(buf) - 1, pos)
+            buf = buf[seg:]
+            base += seg
+            pos -= seg
+            seg = 0
+            # 1つの文字列が長い場合に走査し直す量が増えないよう、読み込む量を倍にしていく
+            data = stream.read(max(chunk_size, len(buf)))
+            if not data:
+                eof = True
+            buf += data
+            continue
+
+        if token == b';':
+            pieces.append((base + seg, buf[seg:i]))
+            statement = _join_statement(pieces)
+            if statement:
+                yield statement
+            pieces = []
+            seg = pos = i + 1
+        elif token in (b'--', b'/*'):
+            pieces.append((base + seg, buf[seg:i]))
+            if token == b'/*':
+                pieces.append((base + i, b' '))
+            seg = pos = end
+        else:
+            pos = end
+
+    pieces.append((base + seg, buf[seg:]))
+    statement = _join_statement(pieces)
+    if statement:
+        yield statement
+
+def _join_statement(pieces, encoding='utf-8'):
+    """
+    文の断片をつないで (文の先頭のバイト位置, SQL文) を返します。空白だけの場合は None を返します。
+    文ごとにデコードし、文字コードとして不正なバイトは置換文字（U+FFFD）にするため、以降の文の読み込みを続けられます。
+    """
+    offset = None
+    for piece_offset, piece in pieces:
+        stripped = piece.lstrip()
+        if stripped:
+            offset = piece_offset + len(piece) - len(stripped)
+            break
+    if offset is None:
+        return None
+    return offset, b''.join(piece for _, piece in pieces).decode(encoding, errors='replace').strip()
+
+def iter_sql_statements(file_path, chunk_size=CHUNK_SIZE):
+    """
+    SQLファイルを先頭から順に読み込み、(文の先頭のバイト位置, SQL文) を1文ずつ返すジェネレーターです。
+    """
+    with open(file_path, 'rb') as f:
+        yield from split_sql_stream(f, chunk_size)
+
+# 値の並びを1つにまとめる最小の件数（VALUES の行数・IN の値の数）
+COLLAPSE_MIN_ITEMS = 100
+
+# リテラル（文字列・数値・NULL・真偽値。'...'::型 のキャストを含む）
+_LITERAL = r"(?:[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|NULL|TRUE|FALSE)(?:\s*::\s*\w+(?:\[\])?)?"
+_LITERAL_RE = re.compile(_LITERAL, re.I)
+# リテラルだけの組 (1, 'a', NULL)
+_LITERAL_TUPLE_RE = re.compile(r"\(\s*" + _LITERAL + r"(?:\s*,\s*" + _LITERAL + r")*\s*\)", re.I)
+_SEPARATOR_RE = re.compile(r"\s*,\s*")
+_OPEN_RE = re.compile(r"\s*\(\s*")
+_CLOSE_RE = re.compile(r"\s*\)")
+_SPACE_RE = re.compile(r"\s*")
+# 文字列・引用符付きの識別子・ドル引用を読み飛ばしながら VALUES と IN を探す
+_COLLAPSE_SCAN = re.compile(r"[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(\w*)\$.*?\$\1\$|\b(VALUES|IN)\b", re.I | re.S)
+
+def _match_list(item_re, sql, pos):
+    """
+    sql[pos] から item_re がカンマ区切りで並ぶ範囲を (最初の項目, 件数, 終わりの位置) で返します。
+    並び全体を1つの正規表現で照合すると件数に比例してメモリを使うため、1項目ずつ照合します。
+    """
+    m = item_re.match(sql, pos)
+    if m is None:
+        return None, 0, pos
+    first = m.group()
+    count = 1
+    end = m.end()
+    while True:
+        separator = _SEPARATOR_RE.match(sql, end)
+        m = item_re.match(sql, separator.end()) if separator else None
+        if m is None:
+            return first, count, end
+        count += 1
+        end = m.end()
+
+def collapse_literal_lists(sql, min_items=COLLAPSE_MIN_ITEMS):
+    """
+    SQL文の長いリテラルの並びを1つにまとめ、元の件数をコメントで残したSQL文を返します。
+    VALUES (1, 'a'), (2, 'b'), ... は最初の組だけの VALUES (1, 'a') /* 50000 rows */ に、
+    IN (1, 2, 3, ...) は IN (1 /* 10000 values */) にします。
+    リテラルだけの並びが min_items 件以上の場合だけまとめるため、テーブル・カラムの抽出結果は変わりません。
+    """
+    # カンマの数が足りない文は並びを含まないため、走査しない
+    if sql.count(',') < min_items - 1:
+        return sql
+    pieces = []
+    last = 0
+    pos = 0
+    while True:
+        m = _COLLAPSE_SCAN.search(sql, pos)
+        if m is None:
+            break
+        pos = m.end()
+        keyword = m.group(2)
+        if not keyword:
+            continue
+        if keyword.upper() == 'VALUES':
+            # 途中にリテラル以外の組があれば、その手前までをまとめる
+            first, count, end = _match_list(_LITERAL_TUPLE_RE, sql, _SPACE_RE.match(sql, pos).end())
+            replacement = f" {first} /* {count} rows */"
+        else:
+            opening = _OPEN_RE.match(sql, pos)
+            first, count, end = _match_list(_LITERAL_RE, sql, opening.end()) if opening else (None, 0, pos)
+            closing = _CLOSE_RE.match(sql, end)
+            if closing is None:
+                continue
+            end = closing.end()
+            replacement = f" ({first} /* {count} values */)"
+        if count >= min_items:
+            pieces.append(sql[last:pos])
+            pieces.append(replacement)
+            last = pos = end
+    if not pieces:
+        return sql
+    pieces.append(sql[last:])
+    return ''.join(pieces)
@@ -0,0 +1,121 @@
+# supervised_parser.py
+
+import os
+import multiprocessing as mp
+
+try:
+    import resource
+except ImportError:
+    # Windows では resource がないため、メモリの上限は設定しない
+    resource = None
+
+def address_space_size():
+    """
+    現在のプロセスの仮想メモリのサイズ（バイト）を返します。取得できない場合は 0 を返します。
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _worker_loop(conn, func, args, memory_limit, parent_conn=None):
+    """
+    ワーカープロセスの処理。受け取ったSQL文ごとに func(SQL文, *args) を実行し、('ok', 結果) または ('error', メッセージ) を返します。
+    """
+    if parent_conn is not None:
+        # fork で引き継いだ親プロセス側の端を閉じる（閉じないと親プロセスが close() しても EOF にならない）
+        parent_conn.close()
+    if memory_limit and resource is not None:
+        # 起動時の使用量に1文分の上限を加えた値をアドレス空間の上限にする
+        limit = address_space_size() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        try:
+            sql = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            reply = ('ok', func(sql, *args))
+        except MemoryError:
+            # 上限を超えた後のプロセスは状態が不確かなため、結果を返して終了し、親プロセスに再起動させる
+            conn.send(('error', f"MemoryError: 1文の解析が {memory_limit // (1024 * 1024)} MB を超えました"))
+            break
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+        conn.send(reply)
+    conn.close()
+
+class SupervisedParser:
+    """
+    SQL文の解析を監視付きのワーカープロセスで1文ずつ実行します。
+    func(SQL文, *args) はワーカープロセスで実行する関数で、モジュールの関数である必要があります（spawn の場合に渡せるように）。
+    timeout（秒）を超えた文と、memory_limit（バイト）を超えるメモリを使った文はエラーとし、
+    ワーカープロセスを終了して次の文で起動し直すため、1文が他の文の解析を止めることはありません。
+    """
+
+    def __init__(self, func, args=(), timeout=None, memory_limit=None):
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+
+    def start(self):
+        parent_conn, child_conn = mp.Pipe()
+        self.process = mp.Process(target=_worker_loop,
+                                  args=(child_conn, self.func, self.args, self.memory_limit, parent_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def close(self):
+        """
+        ワーカープロセスを終了します。
+        """
+        if self.process is None:
+            return
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.process = None
+        self.conn = None
+
+    def kill(self):
+        """
+        予算を超えたワーカープロセスを強制終了します。次の run() で起動し直します。
+        """
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+        self.restarts += 1
+
+    def run(self, sql):
+        """
+        ワーカープロセスで func(sql, *args) を実行し、(結果, None) または (None, エラーメッセージ) を返します。
+        """
+        if self.process is None:
+            self.start()
+        try:
+            self.conn.send(sql)
+            if not self.conn.poll(self.timeout):
+                self.kill()
+                return None, f"Timeout: 解析が {self.timeout} 秒を超えました"
+            status, value = self.conn.recv()
+        except (EOFError, OSError):
+            # ワーカープロセスが異常終了した（メモリ不足でOSに終了させられた場合など）
+            self.process.join()
+            exitcode = self.process.exitcode
+            self.kill()
+            return None, f"WorkerError: ワーカープロセスが終了しました (exit code {exitcode})"
+        if status == 'ok':
+            return value, None
+        if not self.process.is_alive() or value.startswith('MemoryError'):
+            self.kill()
+        return None, value
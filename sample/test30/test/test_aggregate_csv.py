@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+import aggregate_csv
+from aggregate_csv import aggregate_columns, aggregate_dml, aggregate_tables, read_all_csvs
+
+
+def write_parsed(csv_dir, name, rows):
+    pd.DataFrame(rows, columns=['DML', 'Tables', 'Columns']).to_csv(csv_dir / name, index=False)
+
+
+@pytest.fixture(params=['pyarrow', 'pandas'])
+def dataframes(request, tmp_path, monkeypatch):
+    if request.param == 'pandas':
+        monkeypatch.setattr(aggregate_csv, 'pa', None)
+    elif aggregate_csv.pa is None:
+        pytest.skip('pyarrow is not installed')
+    write_parsed(tmp_path, 'b_parsed.csv', [
+        ('SELECT', 'users;orders', 'users:name,id;orders:id'),
+        ('UPDATE', 'orders', 'orders:status'),
+    ])
+    write_parsed(tmp_path, 'a_parsed.csv', [
+        ('SELECT', 'users', 'users:name'),
+        ('DELETE', 'orders', 'orders:id'),
+        ('SELECT', None, 'nocolumns'),
+    ])
+    dataframes = read_all_csvs(str(tmp_path))
+    if request.param == 'pandas':
+        dataframes = [df.astype(object) for df in dataframes]
+    return dataframes
+
+
+def rows(df):
+    return [tuple(row) for row in df.astype(object).itertuples(index=False)]
+
+
+def test_ties_are_sorted_by_name(dataframes):
+    # 使用回数の多い順、同数は名前の昇順（ファイルの読み込み順や集計方法によらない）
+    assert rows(aggregate_dml(dataframes)) == [('SELECT', 3), ('DELETE', 1), ('UPDATE', 1)]
+    assert rows(aggregate_tables(dataframes)) == [('orders', 3), ('users', 2)]
+    assert rows(aggregate_columns(dataframes)) == [
+        ('orders.id', 2), ('users.name', 2), ('orders.status', 1), ('users.id', 1)]
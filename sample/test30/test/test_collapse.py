@@ -0,0 +1,44 @@
+import pytest
+from parse_sql_queries import parse_sql
+from sql_splitter import collapse_literal_lists
+
+SCHEMA = {'t': frozenset({'id', 'a', 'b'})}
+
+ROWS = ', '.join(f"({i}, 'x{i}', NULL, -1.5e3, '2024-01-01'::date)" for i in range(150))
+IDS = ', '.join(str(i) for i in range(120))
+
+
+def test_collapse_values_rows():
+    sql = f'INSERT INTO t (id, a, b, c, d) VALUES {ROWS} ON CONFLICT DO NOTHING'
+    assert collapse_literal_lists(sql) == \
+        "INSERT INTO t (id, a, b, c, d) VALUES (0, 'x0', NULL, -1.5e3, '2024-01-01'::date) /* 150 rows */ ON CONFLICT DO NOTHING"
+
+
+def test_collapse_in_list():
+    sql = f'SELECT a FROM t WHERE id IN ({IDS}) AND b = 1'
+    assert collapse_literal_lists(sql) == 'SELECT a FROM t WHERE id IN (0 /* 120 values */) AND b = 1'
+
+
+@pytest.mark.parametrize('sql', [
+    # 件数が min_items に満たない
+    'SELECT a FROM t WHERE id IN (' + ', '.join(str(i) for i in range(99)) + ')',
+    # リテラル以外の組・値を含む
+    'INSERT INTO t VALUES (1, now()), ' + ', '.join('(2, 3)' for _ in range(150)),
+    'SELECT a FROM t WHERE id IN (' + ', '.join(f'b + {i}' for i in range(150)) + ')',
+    # 文字列・ドル引用の中の VALUES / IN
+    "SELECT 'VALUES " + ', '.join('(1)' for _ in range(150)) + "' FROM t",
+    'SELECT $$ IN (' + ', '.join('1' for _ in range(150)) + ') $$ FROM t',
+])
+def test_collapse_leaves_other_statements_unchanged(sql):
+    assert collapse_literal_lists(sql) == sql
+
+
+@pytest.mark.parametrize('sql', [
+    f'INSERT INTO t (id, a) VALUES {ROWS}',
+    f'SELECT a FROM t WHERE id IN ({IDS}) OR b NOT IN ({IDS})',
+    f'UPDATE t SET a = 1 WHERE id IN ({IDS})',
+])
+def test_collapse_keeps_extracted_tables_and_columns(sql):
+    collapsed = collapse_literal_lists(sql)
+    assert len(collapsed) < len(sql)
+    assert parse_sql(collapsed, schema_info=SCHEMA) == parse_sql(sql, schema_info=SCHEMA)
@@ -0,0 +1,60 @@
+import json
+import sqlglot
+import parse_ddl
+from parse_ddl import build_merged_schema, save_manifest
+
+
+def write_ddl(ddl_dir, name, sql):
+    (ddl_dir / name).write_text(sql, encoding='utf-8')
+
+
+def run(ddl_dir, manifest_file):
+    names = sorted(path.name for path in ddl_dir.iterdir())
+    all_schema, files = build_merged_schema(str(ddl_dir), names, str(manifest_file))
+    save_manifest(files, str(manifest_file))
+    return all_schema
+
+
+def test_manifest_reuses_unchanged_files(tmp_path, monkeypatch):
+    ddl_dir = tmp_path / 'ddl'
+    ddl_dir.mkdir()
+    manifest = tmp_path / 'schema.manifest.json'
+    write_ddl(ddl_dir, '1.sql', 'CREATE TABLE users (id int, name text);')
+    write_ddl(ddl_dir, '2.sql', 'CREATE VIEW v AS SELECT name FROM users;')
+    assert run(ddl_dir, manifest) == {'users': ['id', 'name'], 'v': ['name']}
+
+    parsed = []
+    read_sql_file = parse_ddl.read_sql_file
+    monkeypatch.setattr(parse_ddl, 'read_sql_file', lambda path: parsed.append(path) or read_sql_file(path))
+    write_ddl(ddl_dir, '1.sql', 'CREATE TABLE users (id int, name text, email text);')
+    # 変更したファイルだけを解析し、未変更のファイルのビューは統合後のスキーマで解決し直す
+    assert run(ddl_dir, manifest) == {'users': ['id', 'name', 'email'], 'v': ['name']}
+    assert parsed == [str(ddl_dir / '1.sql')]
+    assert set(json.loads(manifest.read_text(encoding='utf-8'))['files']) == {'1.sql', '2.sql'}
+
+
+def test_removed_file_reports_only_tables_that_leave_the_schema(tmp_path, capsys):
+    ddl_dir = tmp_path / 'ddl'
+    ddl_dir.mkdir()
+    manifest = tmp_path / 'schema.manifest.json'
+    write_ddl(ddl_dir, '1.sql', 'CREATE TABLE a (id int); CREATE TABLE b (id int);')
+    write_ddl(ddl_dir, '2.sql', 'CREATE TABLE b (id int, x int);')
+    run(ddl_dir, manifest)
+    assert "Warning: 'b' is defined in 1.sql, 2.sql; using the definition in 2.sql." in capsys.readouterr().out
+
+    (ddl_dir / '1.sql').unlink()
+    assert run(ddl_dir, manifest) == {'b': ['id', 'x']}
+    assert 'Removed DDL file: 1.sql (dropped: a)' in capsys.readouterr().out
+
+
+def test_view_columns_are_one_per_projection():
+    statements = sqlglot.parse(
+        'CREATE TABLE t (a int, b int, name text);'
+        'CREATE VIEW v AS SELECT a + b AS total, upper(name), a, (SELECT max(z) FROM q) AS mz, count(*) AS n FROM t;'
+        'CREATE VIEW w AS SELECT * FROM v;',
+        read='postgres')
+    assert parse_ddl.parse_ddl(statements) == {
+        't': ['a', 'b', 'name'],
+        'v': ['total', 'a', 'mz', 'n'],
+        'w': ['total', 'a', 'mz', 'n'],
+    }
@@ -0,0 +1,82 @@
+import json
+import pytest
+import parse_sql_queries
+from parse_sql_queries import fallback_extract, parse_queries, read_sql_file, main
+
+SCHEMA = {
+    'users': frozenset({'id', 'name'}),
+    'orders': frozenset({'id', 'user_id'}),
+}
+
+SQL = """SELECT id, name FROM users;
+VACUUM users;
+SELEC broken FROM orders o JOIN users u ON u.id = o.user_id;
+DELETE FROM orders WHERE id = 1;
+"""
+
+
+@pytest.fixture
+def sql_dir(tmp_path):
+    directory = tmp_path / 'sql'
+    directory.mkdir()
+    (directory / 'queries.sql').write_text(SQL, encoding='utf-8')
+    return directory
+
+
+@pytest.fixture
+def schema_file(tmp_path):
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps({table: sorted(columns) for table, columns in SCHEMA.items()}), encoding='utf-8')
+    return path
+
+
+def test_parse_queries_quarantines_parse_errors_and_commands(sql_dir):
+    failures = []
+    results = parse_queries(read_sql_file(str(sql_dir / 'queries.sql')), SCHEMA, failures=failures, verbose=False)
+
+    # 隔離した文も結果に含め、トークンから抽出したテーブル名を使う
+    assert [result['DML'] for result in results] == ['SELECT', 'UNKNOWN', 'UNKNOWN', 'DELETE']
+    assert results[2]['Tables'] == ['orders', 'users']
+    assert results[2]['Columns'] == {}
+
+    assert [(failure['Statement'], failure['Error'].split(':')[0]) for failure in failures] == \
+        [(2, 'UnsupportedStatement'), (3, 'ParseError')]
+    assert failures[0]['Offset'] == SQL.index('VACUUM')
+    assert failures[1]['Tables'] == ['orders', 'users']
+    assert failures[1]['SQL'].startswith('SELEC broken')
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('WITH x AS (SELECT 1) UPDATE orders SET id = 2 FROM users', {'DML': 'UPDATE', 'Tables': ['orders', 'users'], 'Columns': {}}),
+    ('SELECT extract(year FROM d) FROM a, b AS bb, s.c', {'DML': 'SELECT', 'Tables': ['a', 'b', 'c'], 'Columns': {}}),
+    ('MERGE INTO t USING s ON t.id = s.id WHEN MATCHED THEN DELETE', {'DML': 'UNKNOWN', 'Tables': ['t'], 'Columns': {}}),
+])
+def test_fallback_extract(sql, expected):
+    assert fallback_extract(sql) == expected
+
+
+def test_main_writes_quarantine_report(sql_dir, schema_file, tmp_path):
+    output_dir = tmp_path / 'out'
+    main(str(schema_file), str(sql_dir), str(output_dir))
+
+    report = json.loads((output_dir / parse_sql_queries.QUARANTINE_REPORT).read_text(encoding='utf-8'))
+    assert [(entry['File'], entry['Statement']) for entry in report] == \
+        [(str(sql_dir / 'queries.sql'), 2), (str(sql_dir / 'queries.sql'), 3)]
+    assert report[0]['Error'].startswith('UnsupportedStatement')
+    # 隔離した文も解析結果のファイルに含める
+    assert (output_dir / 'queries_parsed.csv').read_text(encoding='utf-8-sig').count('\n') == 5
+
+
+def test_invalid_bytes_do_not_drop_the_rest_of_the_file(tmp_path):
+    path = tmp_path / 'queries.sql'
+    path.write_bytes(b"SELECT name FROM users;\nSELECT '\xff' FROM orders;\nDELETE FROM orders WHERE id = 1;\n")
+    errors = []
+    failures = []
+    results = parse_queries(read_sql_file(str(path), errors), SCHEMA, failures=failures, verbose=False)
+
+    # 不正なバイトを含む文の前後の文も解析する
+    assert errors == [] and failures == []
+    assert [(result['DML'], result['Tables']) for result in results] == \
+        [('SELECT', ['users']), ('SELECT', ['orders']), ('DELETE', ['orders'])]
+    assert results[0]['Columns'] == {'users': ['name']}
+    assert results[2]['Columns'] == {'orders': ['id']}
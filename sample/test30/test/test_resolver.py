@@ -0,0 +1,82 @@
+import pytest
+from parse_sql_queries import parse_sql
+
+SCHEMA = {
+    'users': frozenset({'id', 'name', 'email'}),
+    'orders': frozenset({'id', 'user_id', 'total'}),
+}
+
+
+def columns_of(sql):
+    return parse_sql(sql, schema_info=SCHEMA)['Columns']
+
+
+def test_cte_referenced_from_from_subquery():
+    result = parse_sql('WITH c AS (SELECT id FROM users) SELECT x.id FROM (SELECT id FROM c) x', schema_info=SCHEMA)
+    assert result['Tables'] == ['c', 'users']
+    # サブクエリのエイリアスのカラムは元のテーブル（ここではCTE）のカラムとする
+    assert result['Columns'] == {'users': ['id'], 'c': ['id']}
+
+
+def test_cte_referenced_from_joined_subquery():
+    columns = columns_of(
+        'WITH c AS (SELECT id, name FROM users) '
+        'SELECT x.name FROM orders o JOIN (SELECT c.name FROM c) x ON x.name = o.total')
+    assert columns == {'users': ['id', 'name'], 'c': ['name'], 'orders': ['total']}
+
+
+def test_from_subquery_does_not_see_sibling_sources():
+    # FROM句のサブクエリの外側のソース（orders）はサブクエリ内の無修飾カラムの候補にならない
+    assert columns_of('SELECT x.id FROM orders o, (SELECT id FROM users) x') == {'users': ['id']}
+
+
+def test_correlated_subquery_resolves_through_outer_scope():
+    columns = columns_of('SELECT u.name FROM users u WHERE EXISTS (SELECT 1 FROM orders o WHERE o.user_id = u.id AND total > 10)')
+    assert columns == {'users': ['id', 'name'], 'orders': ['total', 'user_id']}
+
+
+def test_cte_shadows_table_unless_schema_qualified():
+    assert columns_of('WITH users AS (SELECT 1 AS one) SELECT one FROM users') == {'users': ['one']}
+    assert columns_of('WITH users AS (SELECT 1 AS one) SELECT name FROM public.users') == {'users': ['name']}
+
+
+def test_recursive_cte_sees_itself():
+    assert columns_of('WITH RECURSIVE r (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r WHERE n < 5) SELECT n FROM r') == {'r': ['n']}
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('SELECT id FROM users JOIN orders ON orders.user_id = users.id',
+     {'AMBIGUOUS': ['id'], 'orders': ['user_id'], 'users': ['id']}),
+    ('SELECT email FROM users JOIN orders ON orders.user_id = users.id',
+     {'users': ['email', 'id'], 'orders': ['user_id']}),
+])
+def test_unqualified_columns_across_joins(sql, expected):
+    assert columns_of(sql) == expected
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('SELECT x.uid, x.n FROM (SELECT u.id AS uid, count(*) AS n FROM users u GROUP BY u.id) x WHERE x.uid > 1',
+     {'users': ['id']}),
+    ('SELECT name FROM (SELECT * FROM users) x JOIN orders o ON o.user_id = x.id',
+     {'users': ['id', 'name'], 'orders': ['user_id']}),
+    ('SELECT a, b FROM (SELECT id, email FROM users) x (a, b)',
+     {'users': ['email', 'id']}),
+])
+def test_derived_table_columns_map_to_base_tables(sql, expected):
+    result = parse_sql(sql, schema_info=SCHEMA)
+    assert result['Columns'] == expected
+    assert set(result['Columns']) <= set(result['Tables'])
+
+
+def test_update_set_targets_belong_to_the_updated_table():
+    # payments はスキーマにないため、カラムは逆引き索引の他のテーブルではなく payments のカラムとする
+    assert columns_of('UPDATE payments SET email = 1, total = total + 1 WHERE id = 5') == \
+        {'payments': ['email', 'id', 'total']}
+    assert columns_of('UPDATE orders SET email = u.email FROM users u WHERE u.id = user_id') == \
+        {'orders': ['email', 'user_id'], 'users': ['email', 'id']}
+
+
+def test_base_schema_is_not_modified():
+    schema = dict(SCHEMA)
+    parse_sql('WITH c AS (SELECT id FROM users) SELECT id FROM c', schema_info=schema)
+    assert schema == SCHEMA
@@ -0,0 +1,61 @@
+import json
+import pytest
+from schema_catalog import CATALOG_MAGIC, build_column_index, is_schema_catalog, load_schema_catalog, read_schema, save_schema_catalog
+from parse_sql_queries import load_schema_with_index
+
+SCHEMA = {'users': ['id', 'name'], 'orders': ['id', 'user_id']}
+
+
+def test_build_column_index():
+    assert build_column_index(SCHEMA) == {
+        'id': frozenset({'users', 'orders'}),
+        'name': frozenset({'users'}),
+        'user_id': frozenset({'orders'}),
+    }
+
+
+def test_catalog_round_trip(tmp_path):
+    path = tmp_path / 'schema.catalog'
+    save_schema_catalog(SCHEMA, str(path))
+
+    assert is_schema_catalog(str(path))
+    assert read_schema(str(path)) == SCHEMA
+    column_sets, column_index = load_schema_catalog(str(path))
+    assert column_sets == {table: frozenset(columns) for table, columns in SCHEMA.items()}
+    assert column_index == build_column_index(SCHEMA)
+
+
+def test_catalog_and_json_load_the_same_schema(tmp_path):
+    catalog = tmp_path / 'schema.catalog'
+    schema_json = tmp_path / 'schema.json'
+    save_schema_catalog(SCHEMA, str(catalog))
+    schema_json.write_text(json.dumps(SCHEMA), encoding='utf-8')
+
+    assert not is_schema_catalog(str(schema_json))
+    assert load_schema_with_index(str(catalog)) == load_schema_with_index(str(schema_json))
+
+
+def test_load_rejects_non_catalog(tmp_path):
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps(SCHEMA), encoding='utf-8')
+    with pytest.raises(ValueError):
+        load_schema_catalog(str(path))
+
+
+def test_load_rejects_other_catalog_versions(tmp_path):
+    path = tmp_path / 'schema.catalog'
+    save_schema_catalog(SCHEMA, str(path))
+    data = path.read_bytes()
+    # 旧形式（pickle）を含め、バージョンが異なるカタログは中身を読まずに拒否する
+    path.write_bytes(CATALOG_MAGIC + bytes([1]) + data[len(CATALOG_MAGIC) + 1:])
+    assert is_schema_catalog(str(path))
+    with pytest.raises(ValueError, match='バージョン'):
+        load_schema_catalog(str(path))
+
+
+def test_load_rejects_truncated_catalog(tmp_path):
+    path = tmp_path / 'schema.catalog'
+    save_schema_catalog(SCHEMA, str(path))
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        load_schema_catalog(str(path))
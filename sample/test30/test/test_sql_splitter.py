@@ -0,0 +1,56 @@
+import io
+import pytest
+from sql_splitter import split_sql_stream, iter_sql_statements
+
+SQL = """SELECT 'a;b' AS x, "c;d" FROM t; -- note; here
+INSERT INTO t VALUES (E'it\\'s;', $$ body; $$, $tag$ x;$$ $tag$);
+/* outer /* nested; */ still; */ SELECT 1;
+SELECT `q;`, price$ FROM u WHERE name = '日本語;'-- trailing
+;;
+"""
+
+EXPECTED = [
+    (0, """SELECT 'a;b' AS x, "c;d" FROM t"""),
+    (47, "INSERT INTO t VALUES (E'it\\'s;', $$ body; $$, $tag$ x;$$ $tag$)"),
+    (145, 'SELECT 1'),
+    (155, "SELECT `q;`, price$ FROM u WHERE name = '日本語;'"),
+]
+
+
+def split(sql, chunk_size):
+    return list(split_sql_stream(io.BytesIO(sql.encode('utf-8')), chunk_size))
+
+
+def test_split_sql_stream():
+    assert split(SQL, 1 << 20) == EXPECTED
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 24))
+def test_split_sql_stream_at_every_chunk_boundary(chunk_size):
+    # 引用符・コメント・ドル引用・マルチバイト文字・';' がチャンクの境界をまたいでも同じ結果になる
+    assert split(SQL, chunk_size) == EXPECTED
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4])
+def test_separator_at_buffer_edge(chunk_size):
+    assert split('a;bc;d', chunk_size) == [(0, 'a'), (2, 'bc'), (5, 'd')]
+
+
+def test_identifier_dollar_is_not_a_dollar_quote():
+    assert split('SELECT a$b FROM t; SELECT 2', 4) == [(0, 'SELECT a$b FROM t'), (19, 'SELECT 2')]
+
+
+def test_unterminated_quote_runs_to_end_of_file():
+    assert split("SELECT 1; SELECT 'open; SELECT 2", 3) == [(0, 'SELECT 1'), (10, "SELECT 'open; SELECT 2")]
+
+
+def test_invalid_bytes_are_replaced_per_statement():
+    data = b"SELECT 1; SELECT '\xff\xfe' FROM t; SELECT 2"
+    assert list(split_sql_stream(io.BytesIO(data), 4)) == \
+        [(0, 'SELECT 1'), (10, "SELECT '\ufffd\ufffd' FROM t"), (30, 'SELECT 2')]
+
+
+def test_iter_sql_statements_reads_file(tmp_path):
+    path = tmp_path / 'queries.sql'
+    path.write_bytes(SQL.encode('utf-8'))
+    assert list(iter_sql_statements(str(path), chunk_size=7)) == EXPECTED
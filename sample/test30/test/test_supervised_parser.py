@@ -0,0 +1,100 @@
+import time
+import pytest
+import supervised_parser
+from supervised_parser import SupervisedParser
+from parse_sql_queries import extract_statement, parse_queries, read_sql_file
+
+SCHEMA = {'users': frozenset({'id', 'name'}), 'orders': frozenset({'id', 'user_id'})}
+
+
+# ワーカープロセスで実行する関数（モジュールの関数として定義する）
+def echo(sql, suffix=''):
+    if sql == 'sleep':
+        time.sleep(30)
+    if sql == 'fail':
+        raise ValueError('bad statement\nsecond line')
+    return sql + suffix
+
+
+def allocate(sql):
+    if sql == 'allocate':
+        return len(bytearray(1024 * 1024 * 1024))
+    return sql
+
+
+def sleepy_extract(sql, dialect, schema_info, column_index):
+    if 'pg_sleep' in sql:
+        time.sleep(30)
+    return extract_statement(sql, dialect, schema_info, column_index)
+
+
+@pytest.fixture
+def parsers():
+    created = []
+
+    def create(*args, **kwargs):
+        parser = SupervisedParser(*args, **kwargs)
+        created.append(parser)
+        return parser
+
+    yield create
+    for parser in created:
+        parser.close()
+
+
+def test_run_returns_result_and_errors(parsers):
+    parser = parsers(echo, ('!',))
+    assert parser.run('a') == ('a!', None)
+    assert parser.run('fail') == (None, 'ValueError: bad statement')
+    # 通常の例外ではワーカープロセスを起動し直さない
+    assert parser.run('b') == ('b!', None)
+    assert parser.restarts == 0
+
+
+def test_close_lets_worker_exit(parsers):
+    parser = parsers(echo)
+    parser.run('a')
+    process = parser.process
+    start = time.perf_counter()
+    parser.close()
+    # パイプを閉じるとワーカープロセスは EOF を受け取って自分で終了する（強制終了しない）
+    assert process.exitcode == 0
+    assert time.perf_counter() - start < 0.9
+
+
+def test_timeout_kills_and_restarts_worker(parsers):
+    parser = parsers(echo, timeout=0.5)
+    assert parser.run('a') == ('a', None)
+    first_pid = parser.process.pid
+    start = time.perf_counter()
+    assert parser.run('sleep') == (None, 'Timeout: 解析が 0.5 秒を超えました')
+    assert time.perf_counter() - start < 5
+    assert parser.process is None and parser.restarts == 1
+
+    assert parser.run('b') == ('b', None)
+    assert parser.process.pid != first_pid
+
+
+@pytest.mark.skipif(supervised_parser.resource is None, reason='resource module is not available')
+def test_memory_limit_kills_and_restarts_worker(parsers):
+    parser = parsers(allocate, memory_limit=64 * 1024 * 1024)
+    assert parser.run('a') == ('a', None)
+    result, error = parser.run('allocate')
+    assert result is None
+    assert error.startswith(('MemoryError', 'WorkerError'))
+    assert parser.restarts == 1
+    assert parser.run('b') == ('b', None)
+
+
+def test_timed_out_statement_is_quarantined(parsers, tmp_path):
+    path = tmp_path / 'queries.sql'
+    path.write_text('SELECT name FROM users;\nSELECT pg_sleep(10) FROM orders;\nSELECT id FROM orders;\n', encoding='utf-8')
+    parser = parsers(sleepy_extract, ('postgres', SCHEMA, None), timeout=1)
+
+    failures = []
+    results = parse_queries(read_sql_file(str(path), parser=parser), SCHEMA, failures=failures, verbose=False)
+    assert [result['Tables'] for result in results] == [['users'], ['orders'], ['orders']]
+    assert results[0]['Columns'] == {'users': ['name']}
+    assert [(failure['Statement'], failure['Error'], failure['Tables']) for failure in failures] == \
+        [(2, 'Timeout: 解析が 1 秒を超えました', ['orders'])]
+    assert parser.restarts == 1